@@ -1,11 +1,148 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from apps.accounts.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+from apps.accounts.models import AuthToken, User
 from datetime import datetime, timedelta
-import jwt, random, string
+from hashlib import sha256
+from threading import Lock
+from uuid import uuid4
+import copy, jwt, logging, random, string, time
+
+logger = logging.getLogger(__name__)
 
 ALGORITHM = "HS256"
 
 
+class UserCache:
+    """
+    In-process cache of authenticated users keyed by a hash of their access token, so most
+    requests don't query the database. Entries expire after `ttl` seconds and hold the
+    user's version, a stamp in the shared "auth" cache replaced whenever the user is saved
+    or deleted, or their tokens change (login, logout, refresh). An entry of an older
+    version is a miss, so a change made in any process reaches the others on their next
+    request.
+    """
+
+    prefix = "user-version:"
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}  # token hash -> (expiry, version, user)
+        self.keys = {}  # user id -> token hashes
+        self.lock = Lock()
+
+    def key(self, token):
+        return sha256(token.encode()).hexdigest()
+
+    def version_key(self, user_id):
+        return f"{self.prefix}{user_id}"
+
+    def get(self, token, version):
+        key = self.key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry:
+                return None
+            expiry, entry_version, user = entry
+            if expiry < time.monotonic() or entry_version != version:
+                self._remove(key, user.id)
+                return None
+        # Each request gets its own copy so changes made to it don't leak into the cache
+        return copy.copy(user)
+
+    def set(self, token, user, version):
+        key = self.key(token)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, version, copy.copy(user))
+            self.keys.setdefault(user.id, set()).add(key)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            for key in self.keys.pop(user_id, ()):
+                self.entries.pop(key, None)
+
+        def stamp():
+            try:
+                caches["auth"].set(
+                    self.version_key(user_id), uuid4().hex, timeout=self.ttl * 2
+                )
+            except Exception as e:
+                # Revoked stateless tokens would stay valid in the other processes
+                if settings.AUTH_STATELESS_JWT:
+                    raise
+                logger.error(f"Failed to stamp the cached user {user_id}: {e!r}")
+
+        # After the commit, so other processes can't cache the old row as the new version.
+        # The stamp outlives the entries cached before it
+        transaction.on_commit(stamp)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys.clear()
+
+    def _remove(self, key, user_id):
+        self.entries.pop(key, None)
+        keys = self.keys.get(user_id)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self.keys[user_id]
+
+
+class TokenDenylist:
+    """
+    IDs (jti) of revoked access tokens, kept until the tokens expire.
+    Stored in the "auth" cache, which every process shares (see check_shared_store).
+    """
+
+    prefix = "jwt-denylist:"
+
+    def key(self, jti):
+        return f"{self.prefix}{jti}"
+
+    def add(self, jti, exp):
+        ttl = int(exp - time.time())
+        if ttl > 0:
+            caches["auth"].set(self.key(jti), 1, timeout=ttl)
+
+
+def token_state(jti, user_id):
+    # Whether a stateless token is revoked and its user's cached version, in one round trip.
+    # Without a jti, only the version is read
+    denylist_key = token_denylist.key(jti) if jti else None
+    version_key = user_cache.version_key(user_id)
+    found = caches["auth"].get_many([key for key in (denylist_key, version_key) if key])
+    return denylist_key in found, found.get(version_key)
+
+
+def check_shared_store():
+    # Revoking a stateless token in one process must reach the others
+    if not settings.AUTH_STATELESS_JWT:
+        return
+    backend = settings.CACHES.get("auth", {}).get("BACKEND", "")
+    if not backend or backend.endswith(("LocMemCache", "DummyCache")):
+        raise ImproperlyConfigured(
+            "AUTH_STATELESS_JWT needs an 'auth' cache shared by every process (e.g Redis)"
+        )
+
+
+user_cache = UserCache(ttl=settings.AUTH_USER_CACHE_SECONDS)
+token_denylist = TokenDenylist()
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.id)
+
+
+post_save.connect(invalidate_cached_user, sender=User)
+post_delete.connect(invalidate_cached_user, sender=User)
+
+
 class Authentication:
     # generate random string
     def get_random(length: int):
@@ -16,7 +153,7 @@ class Authentication:
         expire = datetime.utcnow() + timedelta(
             minutes=int(settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         )
-        to_encode = {"exp": expire, **payload}
+        to_encode = {"exp": expire, "jti": uuid4().hex, **payload}
         encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
 
@@ -39,12 +176,154 @@ class Authentication:
             decoded = False
         return decoded
 
+    # add an access token's ID to the denylist until it expires, the token table is
+    # checked instead when tokens aren't stateless
+    def revoke_access_token(token: str):
+        if not token or not settings.AUTH_STATELESS_JWT:
+            return
+        try:
+            decoded = jwt.decode(
+                token,
+                settings.SECRET_KEY,
+                algorithms=[ALGORITHM],
+                options={"verify_exp": False},
+            )
+        except jwt.InvalidTokenError:
+            return
+        if "jti" in decoded:
+            token_denylist.add(decoded["jti"], decoded["exp"])
+
+    def hash_token(token: str):
+        return sha256(token.encode()).hexdigest()
+
+    # new access and refresh tokens of a user, and the access token's ID
+    def create_tokens(user):
+        jti = uuid4().hex
+        access = Authentication.create_access_token(
+            {"user_id": str(user.id), "username": user.username, "jti": jti}
+        )
+        return access, Authentication.create_refresh_token(), jti
+
+    # add the ID of a stored token row's access token to the denylist until it expires
+    def revoke_auth_token(auth_token: AuthToken):
+        if not settings.AUTH_STATELESS_JWT:
+            return
+        expiry = auth_token.updated_at + timedelta(
+            minutes=int(settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
+        token_denylist.add(auth_token.access_jti, expiry.timestamp())
+
+    # create tokens for a user's device, replacing the device's previous ones
+    def issue_tokens(user, device: str):
+        if settings.AUTH_STATELESS_JWT:
+            # Previous access tokens stay valid until revoked
+            previous = AuthToken.objects.get_or_none(user=user, device=device)
+            if previous:
+                Authentication.revoke_auth_token(previous)
+        access, refresh, jti = Authentication.create_tokens(user)
+        auth_token = AuthToken(
+            user=user,
+            device=device,
+            access_hash=Authentication.hash_token(access),
+            refresh_hash=Authentication.hash_token(refresh),
+            access_jti=jti,
+        )
+        # Single upsert on the (user, device) index
+        AuthToken.objects.bulk_create(
+            [auth_token],
+            update_conflicts=True,
+            unique_fields=["user", "device"],
+            update_fields=["access_hash", "refresh_hash", "access_jti", "updated_at"],
+        )
+        user_cache.invalidate(user.id)
+        return access, refresh
+
+    # rotate the tokens of a device by its refresh token, None if it's invalid or expired
+    def rotate_tokens(refresh: str):
+        refresh_hash = Authentication.hash_token(refresh)
+        auth_token = AuthToken.objects.select_related("user").get_or_none(
+            refresh_hash=refresh_hash
+        )
+        if not auth_token or not Authentication.decode_jwt(refresh):
+            return None
+        access, refresh, jti = Authentication.create_tokens(auth_token.user)
+        # Compare and swap, so of concurrent refreshes with the same token only one wins
+        rotated = AuthToken.objects.filter(
+            id=auth_token.id, refresh_hash=refresh_hash
+        ).update(
+            access_hash=Authentication.hash_token(access),
+            refresh_hash=Authentication.hash_token(refresh),
+            access_jti=jti,
+            updated_at=timezone.now(),
+        )
+        if not rotated:
+            return None
+        Authentication.revoke_auth_token(auth_token)
+        user_cache.invalidate(auth_token.user_id)
+        return access, refresh
+
+    # drop the tokens of the device a user's access token belongs to
+    def delete_tokens(user, access: str):
+        Authentication.revoke_access_token(access)
+        AuthToken.objects.filter(
+            user=user, access_hash=Authentication.hash_token(access)
+        ).delete()
+        user_cache.invalidate(user.id)
+
+    def user_queryset():
+        return User.objects.select_related(
+            "city", "city__region", "city__country", "avatar"
+        )
+
+    def is_stateless(decoded: dict):
+        return settings.AUTH_STATELESS_JWT and "jti" in decoded
+
+    # filters for the user of a token checked against the token table
+    def user_lookup(token: str, decoded: dict):
+        return {
+            "id": decoded["user_id"],
+            "tokens__access_hash": Authentication.hash_token(token),
+        }
+
+    # the user of a token, from the cache unless the user or their tokens changed since.
+    # On a miss, stateless tokens load the user by id (they were checked against the
+    # denylist), the others are checked against the token table
+    def cached_user(token: str, decoded: dict):
+        stateless = Authentication.is_stateless(decoded)
+        if stateless:
+            lookup = {"id": decoded["user_id"]}
+        else:
+            lookup = Authentication.user_lookup(token, decoded)
+        try:
+            revoked, version = token_state(
+                decoded["jti"] if stateless else None, decoded["user_id"]
+            )
+        except Exception as e:
+            if stateless:
+                raise
+            # The token table is enough to authenticate, the cache only saves the query
+            logger.error(f"Auth cache unavailable: {e!r}")
+            return Authentication.user_queryset().get_or_none(**lookup)
+        if revoked:
+            return None
+        user = user_cache.get(token, version)
+        if not user:
+            user = Authentication.user_queryset().get_or_none(**lookup)
+            if user:
+                user_cache.set(token, user, version)
+        return user
+
     def decodeAuthorization(token: str):
         token = token[7:]
         decoded = Authentication.decode_jwt(token)
         if not decoded:
             return None
-        user = User.objects.select_related(
-            "city", "city__region", "city__country", "avatar"
-        ).get_or_none(id=decoded["user_id"], access=token)
-        return user
+        return Authentication.cached_user(token, decoded)
+
+    # async version of decodeAuthorization, for callers already on the event loop
+    async def adecodeAuthorization(token: str):
+        token = token[7:]
+        decoded = Authentication.decode_jwt(token)
+        if not decoded:
+            return None
+        return await sync_to_async(Authentication.cached_user)(token, decoded)
@@ -1,95 +1,62 @@
+from django.conf import settings
 from django.template.loader import render_to_string
-from django.core.mail import EmailMessage
-from asgiref.sync import sync_to_async
+from apps.common.jobs import aenqueue
 from . import models as accounts_models
-import random, threading, asyncio
+import random
 
 
-class EmailThread(threading.Thread):
-    def __init__(self, email):
-        self.email = email
-        threading.Thread.__init__(self)
+async def send_email(subject, template, context, to):
+    # Sent by the job worker (see apps.common.jobs)
+    body = render_to_string(template, context)
+    await aenqueue("send_email", {"subject": subject, "body": body, "to": to})
 
-    def run(self):
-        self.email.send()
 
+async def send_otp_email(user, subject, template):
+    # The email is rendered by the job worker, so the otp isn't kept in the job
+    await aenqueue(
+        "send_otp_email",
+        {"user_id": str(user.id), "subject": subject, "template": template},
+    )
 
-async def mail_send(subject, body, to):
-    # Alternate way to send email in background
-    print("Working...")
-    email_message = EmailMessage(subject=subject, body=body, to=to)
-    email_message.content_subtype = "html"
-    async_email_send = sync_to_async(email_message.send)
-    loop = asyncio.get_event_loop()
-    loop.create_task(async_email_send())
-    print("Worked")
+
+async def set_otp(user, code):
+    otp = await accounts_models.Otp.objects.aget_or_none(user=user)
+    if not otp:
+        otp = await accounts_models.Otp.objects.acreate(user=user, code=code)
+    else:
+        otp.code = code
+        await otp.asave()
+    # Clean up the otp once it expires
+    await aenqueue(
+        "delete_expired_otp",
+        {"otp_id": str(otp.id)},
+        delay=int(settings.EMAIL_OTP_EXPIRE_SECONDS) + 1,
+    )
 
 
 class Util:
     async def send_activation_otp(user):
-        subject = "Verify your email"
-        code = random.randint(100000, 999999)
-        message = render_to_string(
-            "email-activation.html",
-            {
-                "name": user.full_name,
-                "otp": code,
-            },
-        )
-        otp = await accounts_models.Otp.objects.aget_or_none(user=user)
-        if not otp:
-            await accounts_models.Otp.objects.acreate(user=user, code=code)
-        else:
-            otp.code = code
-            await otp.asave()
-
-        email_message = EmailMessage(subject=subject, body=message, to=[user.email])
-        email_message.content_subtype = "html"
-        EmailThread(email_message).start()
+        await set_otp(user, random.randint(100000, 999999))
+        await send_otp_email(user, "Verify your email", "email-activation.html")
 
     async def send_password_change_otp(user):
-        subject = "Your account password reset email"
-        code = random.randint(100000, 999999)
-        message = render_to_string(
-            "password-reset.html",
-            {
-                "name": user.full_name,
-                "otp": code,
-            },
+        await set_otp(user, random.randint(100000, 999999))
+        await send_otp_email(
+            user, "Your account password reset email", "password-reset.html"
         )
-        otp = await accounts_models.Otp.objects.aget_or_none(user=user)
-        if not otp:
-            await accounts_models.Otp.objects.acreate(user=user, code=code)
-        else:
-            otp.code = code
-            await otp.asave()
-
-        email_message = EmailMessage(subject=subject, body=message, to=[user.email])
-        email_message.content_subtype = "html"
-
-        EmailThread(email_message).start()
 
-    def password_reset_confirmation(user):
-        subject = "Password Reset Successful!"
-        message = render_to_string(
+    async def password_reset_confirmation(user):
+        await send_email(
+            "Password Reset Successful!",
             "password-reset-success.html",
-            {
-                "name": user.full_name,
-            },
+            {"name": user.full_name},
+            [user.email],
         )
-        email_message = EmailMessage(subject=subject, body=message, to=[user.email])
-        email_message.content_subtype = "html"
-        EmailThread(email_message).start()
 
-    @staticmethod
-    def welcome_email(user):
-        subject = "Account verified!"
-        message = render_to_string(
+    async def welcome_email(user):
+        await send_email(
+            "Account verified!",
             "welcome.html",
-            {
-                "name": user.full_name,
-            },
+            {"name": user.full_name},
+            [user.email],
         )
-        email_message = EmailMessage(subject=subject, body=message, to=[user.email])
-        email_message.content_subtype = "html"
-        EmailThread(email_message).start()
@@ -0,0 +1,24 @@
+from django.template.loader import render_to_string
+from apps.common.jobs import job, send_email
+from .models import Otp
+
+
+@job("delete_expired_otp")
+def delete_expired_otp(payload):
+    otp = Otp.objects.get_or_none(id=payload["otp_id"])
+    # A resent otp is fresh again, its own cleanup job comes later
+    if otp and otp.check_expiration():
+        otp.delete()
+
+
+@job("send_otp_email")
+def send_otp_email(payload):
+    otp = Otp.objects.select_related("user").get_or_none(user_id=payload["user_id"])
+    # Already used up
+    if not otp:
+        return
+    user = otp.user
+    body = render_to_string(
+        payload["template"], {"name": user.full_name, "otp": otp.code}
+    )
+    send_email({"subject": payload["subject"], "body": body, "to": [user.email]})
@@ -4,6 +4,7 @@ from django.core.validators import validate_email
 from django.utils.translation import gettext_lazy as _
 
 from apps.common.managers import GetOrNoneQuerySet
+from .passwords import password_hasher
 
 
 class CustomUserManager(BaseUserManager):
@@ -50,6 +51,8 @@ class CustomUserManager(BaseUserManager):
         user = self.model(
             first_name=first_name, last_name=last_name, email=email, **extra_fields
         )
+        # Only called off the event loop (createsuperuser, admin, scripts), so hashing here
+        # blocks no other request. Requests go through acreate_user and the hashing pool
         user.set_password(password)
         extra_fields.setdefault("is_staff", False)
         extra_fields.setdefault("is_superuser", False)
@@ -64,7 +67,7 @@ class CustomUserManager(BaseUserManager):
             first_name=first_name, last_name=last_name, email=email, **extra_fields
         )
 
-        user.set_password(password)
+        await password_hasher.set_password(user, password)
         extra_fields.setdefault("is_staff", False)
         extra_fields.setdefault("is_superuser", False)
         await user.asave(using=self._db)
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:52
+
+import apps.accounts.models
+import apps.common.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_user_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="username",
+            field=apps.common.models.IdSlugField(
+                id_format=apps.common.models.base36,
+                max_length=100,
+                populate_from=apps.accounts.models.slugify_two_fields,
+                unique=True,
+                verbose_name="Username",
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_deterministic_slugs"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="user",
+            name="access",
+        ),
+        migrations.RemoveField(
+            model_name="user",
+            name="refresh",
+        ),
+        migrations.CreateModel(
+            name="AuthToken",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("device", models.CharField(max_length=100)),
+                ("access_hash", models.CharField(max_length=64, unique=True)),
+                ("refresh_hash", models.CharField(max_length=64, unique=True)),
+                ("access_jti", models.CharField(max_length=32)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tokens",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="authtoken",
+            constraint=models.UniqueConstraint(
+                fields=("user", "device"), name="unique_user_device_token"
+            ),
+        ),
+    ]
@@ -1,14 +1,14 @@
 import uuid
 
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
-from apps.common.models import BaseModel, File
+from apps.common.models import BaseModel, File, IdSlugField, base36
 from django.conf import settings
 from apps.common.file_processors import FileProcessor
 from .managers import CustomUserManager
-from autoslug import AutoSlugField
 
 
 def slugify_two_fields(self):
@@ -21,8 +21,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     )
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
-    username = AutoSlugField(
-        _("Username"), populate_from=slugify_two_fields, unique=True, always_update=True
+    username = IdSlugField(
+        _("Username"), populate_from=slugify_two_fields, id_format=base36, unique=True
     )
     email = models.EmailField(verbose_name=(_("Email address")), unique=True)
     avatar = models.ForeignKey(File, on_delete=models.SET_NULL, null=True, blank=True)
@@ -41,10 +41,6 @@ class User(AbstractBaseUser, PermissionsMixin):
     )
     dob = models.DateField(verbose_name=(_("Date of Birth")), null=True, blank=True)
 
-    # Tokens
-    access = models.TextField(editable=False, unique=True, null=True)
-    refresh = models.TextField(editable=False, unique=True, null=True)
-
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["first_name", "last_name"]
 
@@ -53,10 +49,42 @@ class User(AbstractBaseUser, PermissionsMixin):
     class Meta:
         verbose_name = _("User")
         verbose_name_plural = _("Users")
+        # Trigram indexes for people search (see apps.profiles.views.ProfilesView)
+        indexes = [
+            GinIndex(
+                fields=[field],
+                opclasses=["gin_trgm_ops"],
+                name=f"user_{field}_trgm_idx",
+            )
+            for field in ("first_name", "last_name", "username")
+        ]
 
     def __str__(self):
         return self.full_name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_name = instance.get_name()
+        return instance
+
+    def get_name(self):
+        # None if the names were deferred, to avoid loading them
+        if {"first_name", "last_name"} & self.get_deferred_fields():
+            return None
+        return (self.first_name, self.last_name)
+
+    def save(self, *args, **kwargs):
+        # Derive the username again only when the name has changed
+        loaded_name = getattr(self, "_loaded_name", None)
+        if loaded_name and loaded_name != self.get_name():
+            self.username = None
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "username"}
+        super().save(*args, **kwargs)
+        self._loaded_name = self.get_name()
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -83,3 +111,26 @@ class Otp(BaseModel):
         if diff.total_seconds() > int(settings.EMAIL_OTP_EXPIRE_SECONDS):
             return True
         return False
+
+
+class AuthToken(BaseModel):
+    """
+    The current access and refresh tokens of a user on one device, stored as hashes.
+    Logins and refreshes only rewrite this narrow row, not the user's.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tokens")
+    device = models.CharField(max_length=100)
+    access_hash = models.CharField(max_length=64, unique=True)
+    refresh_hash = models.CharField(max_length=64, unique=True)
+    access_jti = models.CharField(max_length=32)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "device"], name="unique_user_device_token"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} ------ {self.device}"
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from apps.common.error import ErrorCode
+from apps.common.exceptions import RequestError
+from threading import Lock
+import asyncio
+
+
+class PasswordHasher:
+    """
+    Hashes and checks passwords on a dedicated, size-limited thread pool so the
+    slow key derivation never blocks the event loop.
+    Once `max_pending` jobs are running or waiting, new ones are rejected with a 503
+    instead of queueing up behind a burst of logins.
+    """
+
+    def __init__(self, max_workers, max_pending):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hasher"
+        )
+        self.max_pending = max_pending
+        self.pending = 0
+        self.lock = Lock()
+
+    async def run(self, func, *args):
+        with self.lock:
+            if self.pending >= self.max_pending:
+                raise RequestError(
+                    err_code=ErrorCode.SERVER_BUSY,
+                    err_msg="Too many requests, try again shortly",
+                    status_code=503,
+                )
+            self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    async def check_password(self, user, password):
+        # Like user.check_password, but a hash upgrade is saved from the request side,
+        # so the pool threads never open database connections
+        upgrade = []
+        valid = await self.run(check_password, password, user.password, upgrade.append)
+        if upgrade:
+            await self.set_password(user, password)
+            user._password = None  # Not a password change
+            await user.asave(update_fields=["password"])
+        return valid
+
+    async def set_password(self, user, password):
+        await self.run(user.set_password, password)
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASHER_WORKERS,
+    max_pending=settings.PASSWORD_HASHER_MAX_PENDING,
+)
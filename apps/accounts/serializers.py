@@ -52,6 +52,7 @@ class SetNewPasswordSerializer(VerifyOtpSerializer):
 
 class LoginSerializer(ResendOtpSerializer):
     password = serializers.CharField()
+    device = serializers.CharField(max_length=100, default="default")
 
 
 class RefreshSerializer(serializers.Serializer):
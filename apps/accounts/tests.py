@@ -1,7 +1,14 @@
 from rest_framework.test import APITestCase
-from apps.accounts.auth import Authentication
+from apps.accounts.auth import Authentication, check_shared_store, user_cache
 from apps.common.utils import TestUtil
-from apps.accounts.models import Otp
+from apps.accounts.models import AuthToken, Otp, User
+from apps.accounts.passwords import password_hasher
+from apps.common.jobs import enqueue, run_pending_jobs
+from apps.common.models import Job
+from django.core import mail
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
 from unittest import mock
 
 from apps.common.error import ErrorCode
@@ -90,6 +97,39 @@ class TestAccounts(APITestCase):
             {"status": "success", "message": "Account verification successful"},
         )
 
+    @override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+    def test_emails_are_sent_by_the_job_worker(self):
+        new_user = self.new_user
+
+        # Verify the otp email is queued instead of sent in the request
+        response = self.client.post(
+            self.resend_verification_email_url, {"email": new_user.email}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            set(Job.objects.values_list("name", flat=True)),
+            {"send_otp_email", "delete_expired_otp"},
+        )
+        otp = Otp.objects.get(user=new_user)
+        self.assertNotIn(str(otp.code), str(Job.objects.values_list("payload")))
+
+        # Verify the worker sends due emails and leaves later jobs queued
+        run_pending_jobs()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [new_user.email])
+        self.assertEqual(mail.outbox[0].subject, "Verify your email")
+        self.assertIn(str(otp.code), mail.outbox[0].body)
+        self.assertEqual(Job.objects.get().name, "delete_expired_otp")
+
+        # Verify failed jobs are retried later, until they run out of attempts
+        job = enqueue("unknown_job")
+        with override_settings(JOBS_MAX_ATTEMPTS=2, JOBS_BACKOFF_SECONDS=0):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.attempts, job.status), (2, "FAILED"))
+        self.assertIn("unknown_job", job.last_error)
+
     def test_resend_verification_email(self):
         new_user = self.new_user
         user_in = {"email": new_user.email}
@@ -271,10 +311,85 @@ class TestAccounts(APITestCase):
             },
         )
 
+        # Verify saving the user without a name change keeps the username
+        username = new_user.username
+        new_user.refresh_from_db()
+        self.assertEqual(new_user.username, username)
+        user = User.objects.get(id=new_user.id)
+        user.first_name = "Renamed"
+        user.save(update_fields=["first_name"])
+        user.refresh_from_db()
+        self.assertNotEqual(user.username, username)
+        self.assertTrue(user.username.startswith("renamed-name-"))
+
+    def test_login_when_password_hasher_is_busy(self):
+        verified_user = self.verified_user
+        credentials = {"email": verified_user.email, "password": "testpassword"}
+
+        # Ensures logins are shed once the hashing queue is full
+        with mock.patch.object(password_hasher, "max_pending", 0):
+            response = self.client.post(self.login_url, credentials)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(
+            response.json(),
+            {
+                "status": "failure",
+                "code": ErrorCode.SERVER_BUSY,
+                "message": "Too many requests, try again shortly",
+            },
+        )
+        self.assertEqual(password_hasher.pending, 0)
+
+        response = self.client.post(self.login_url, credentials)
+        self.assertEqual(response.status_code, 201)
+
+    def test_login_upgrades_password_hash(self):
+        verified_user = self.verified_user
+        hashers = ["django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher"]
+        with override_settings(PASSWORD_HASHERS=hashers):
+            verified_user.set_password("testpassword")
+            verified_user.save()
+
+        # Ensures an outdated hash is upgraded on login
+        credentials = {"email": verified_user.email, "password": "testpassword"}
+        response = self.client.post(self.login_url, credentials)
+        self.assertEqual(response.status_code, 201)
+        verified_user.refresh_from_db()
+        self.assertFalse(verified_user.password.startswith("pbkdf2_sha1$"))
+        self.assertTrue(verified_user.check_password("testpassword"))
+
+    def test_login_on_several_devices(self):
+        verified_user = self.verified_user
+        credentials = {"email": verified_user.email, "password": "testpassword"}
+
+        # Ensures each device gets its own tokens
+        bearers = {}
+        for device in ("phone", "laptop"):
+            response = self.client.post(
+                self.login_url, {**credentials, "device": device}
+            )
+            self.assertEqual(response.status_code, 201)
+            access = response.json()["data"]["access"]
+            bearers[device] = {"HTTP_AUTHORIZATION": f"Bearer {access}"}
+        self.assertEqual(verified_user.tokens.count(), 2)
+
+        # Ensures logging out on one device keeps the other logged in
+        response = self.client.get(self.logout_url, **bearers["phone"])
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.logout_url, **bearers["phone"])
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(verified_user.tokens.get().device, "laptop")
+
+        # Ensures logging in again on a device replaces its tokens
+        response = self.client.post(self.login_url, {**credentials, "device": "laptop"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(verified_user.tokens.count(), 1)
+        response = self.client.get(self.logout_url, **bearers["laptop"])
+        self.assertEqual(response.status_code, 401)
+
     def test_refresh_token(self):
         verified_user = self.verified_user
-        verified_user.refresh = Authentication.create_refresh_token()
-        verified_user.save()
+        _, refresh = TestUtil.auth_tokens(verified_user)
 
         # Test for invalid refresh token (invalid or expired)
         response = self.client.post(
@@ -292,9 +407,7 @@ class TestAccounts(APITestCase):
 
         # Test for valid refresh token
         mock.patch("apps.accounts.auth.Authentication.decode_jwt", return_value=True)
-        response = self.client.post(
-            self.refresh_url, {"refresh": verified_user.refresh}
-        )
+        response = self.client.post(self.refresh_url, {"refresh": refresh})
         self.assertEqual(response.status_code, 201)
         self.assertEqual(
             response.json(),
@@ -305,6 +418,27 @@ class TestAccounts(APITestCase):
             },
         )
 
+        # Test a used refresh token is rejected
+        response = self.client.post(self.refresh_url, {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+
+        # Test only one of two concurrent refreshes with the same token succeeds
+        _, refresh = TestUtil.auth_tokens(verified_user)
+        create_tokens = Authentication.create_tokens
+        raced = {}
+
+        def create_tokens_after_another_refresh(user):
+            if "tokens" not in raced:
+                raced["tokens"] = None
+                raced["tokens"] = Authentication.rotate_tokens(refresh)
+            return create_tokens(user)
+
+        with mock.patch.object(
+            Authentication, "create_tokens", create_tokens_after_another_refresh
+        ):
+            self.assertIsNone(Authentication.rotate_tokens(refresh))
+        self.assertIsNotNone(raced["tokens"])
+
     def test_logout(self):
         auth_token = TestUtil.auth_token(self.verified_user)
 
@@ -317,6 +451,10 @@ class TestAccounts(APITestCase):
             {"status": "success", "message": "Logout successful"},
         )
 
+        # Ensures the token of a logged out user is rejected, even once cached
+        response = self.client.get(self.logout_url, **bearer)
+        self.assertEqual(response.status_code, 401)
+
         # Ensures if unauthorized user cannot log out
         self.bearer = {"HTTP_AUTHORIZATION": f"invalid_token"}
         response = self.client.get(self.logout_url, **self.bearer)
@@ -329,3 +467,77 @@ class TestAccounts(APITestCase):
                 "message": "Auth Token is Invalid or Expired!",
             },
         )
+
+    @override_settings(
+        CACHES={
+            alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+            for alias in ("default", "auth")
+        },
+    )
+    def test_cached_user(self):
+        bearer = f"Bearer {TestUtil.auth_token(self.verified_user)}"
+
+        # Ensures a warm token is authenticated without a query
+        self.assertEqual(Authentication.decodeAuthorization(bearer), self.verified_user)
+        with self.assertNumQueries(0):
+            user = Authentication.decodeAuthorization(bearer)
+        self.assertEqual(user, self.verified_user)
+
+        # Ensures the token is rejected once logged out
+        with self.captureOnCommitCallbacks(execute=True):
+            Authentication.delete_tokens(user, bearer[7:])
+        self.assertIsNone(Authentication.decodeAuthorization(bearer))
+
+        # Even when logged out in another process, which only replaces the version
+        bearer = f"Bearer {TestUtil.auth_token(self.verified_user)}"
+        Authentication.decodeAuthorization(bearer)
+        AuthToken.objects.filter(user=user).delete()
+        caches["auth"].set(user_cache.version_key(user.id), "changed elsewhere")
+        self.assertIsNone(Authentication.decodeAuthorization(bearer))
+
+    @override_settings(
+        AUTH_STATELESS_JWT=True,
+        # A single test process shares a local memory cache
+        CACHES={
+            alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+            for alias in ("default", "auth")
+        },
+    )
+    def test_logout_with_stateless_tokens(self):
+        auth_token = TestUtil.auth_token(self.verified_user)
+        bearer = {"HTTP_AUTHORIZATION": f"Bearer {auth_token}"}
+
+        # Ensures a valid token is accepted
+        response = self.client.get(self.logout_url, **bearer)
+        self.assertEqual(response.status_code, 200)
+
+        # Ensures the revoked token is rejected after logout
+        response = self.client.get(self.logout_url, **bearer)
+        self.assertEqual(response.status_code, 401)
+
+        # A stateless process needs a shared store for revoked tokens
+        with override_settings(CACHES={}):
+            with self.assertRaises(ImproperlyConfigured):
+                check_shared_store()
+
+        # Ensures refreshing revokes the previous access token
+        auth_token, refresh = TestUtil.auth_tokens(self.verified_user)
+        bearer = {"HTTP_AUTHORIZATION": f"Bearer {auth_token}"}
+        response = self.client.post(self.refresh_url, {"refresh": refresh})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(self.logout_url, **bearer)
+        self.assertEqual(response.status_code, 401)
+
+        # Cached users are reloaded once changed in any process
+        bearer = f"Bearer {TestUtil.auth_token(self.verified_user)}"
+        user = Authentication.decodeAuthorization(bearer)
+        User.objects.filter(id=user.id).update(first_name="Changed")
+        self.assertEqual(Authentication.decodeAuthorization(bearer).first_name, "Test")
+        version_key = user_cache.version_key(user.id)
+        caches["auth"].set(version_key, "changed elsewhere")
+        self.assertEqual(
+            Authentication.decodeAuthorization(bearer).first_name, "Changed"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertNotEqual(caches["auth"].get(version_key), "changed elsewhere")
@@ -1,10 +1,12 @@
 from adrf.views import APIView
+from asgiref.sync import sync_to_async
 from apps.accounts.auth import Authentication
 
 from apps.common.error import ErrorCode
 from apps.common.utils import IsAuthenticatedCustom
 
 from .emails import Util
+from .passwords import password_hasher
 
 from .models import Otp, User
 from .serializers import (
@@ -116,7 +118,7 @@ class VerifyEmailView(APIView):
         await otp.adelete()
 
         # Send welcome email
-        Util.welcome_email(user)
+        await Util.welcome_email(user)
         return CustomResponse.success(
             message="Account verification successful", status_code=200
         )
@@ -231,11 +233,11 @@ class SetNewPasswordView(APIView):
                 err_code=ErrorCode.EXPIRED_OTP, err_msg="Expired Otp", status_code=498
             )
 
-        user.set_password(password)
+        await password_hasher.set_password(user, password)
         await user.asave()
 
         # Send password reset success email
-        Util.password_reset_confirmation(user)
+        await Util.password_reset_confirmation(user)
         return CustomResponse.success(message="Password reset successful")
 
 
@@ -244,7 +246,10 @@ class LoginView(APIView):
 
     @extend_schema(
         summary="Login a user",
-        description="This endpoint generates new access and refresh tokens for authentication",
+        description="""
+            This endpoint generates new access and refresh tokens for authentication.
+            Pass a device name to stay logged in on several devices, each device's previous tokens are replaced.
+        """,
         responses={
             201: LoginResponseSerializer,
             422: ErrorDataResponseSerializer,
@@ -261,7 +266,7 @@ class LoginView(APIView):
         password = data["password"]
 
         user = await User.objects.aget_or_none(email=email)
-        if not user or not user.check_password(password):
+        if not user or not await password_hasher.check_password(user, password):
             raise RequestError(
                 err_code=ErrorCode.INVALID_CREDENTIALS,
                 err_msg="Invalid credentials",
@@ -275,15 +280,13 @@ class LoginView(APIView):
                 status_code=401,
             )
 
-        # Create tokens and store in jwt model
-        user.access = Authentication.create_access_token(
-            {"user_id": str(user.id), "username": user.username}
+        # Create tokens and store their hashes for the device
+        access, refresh = await sync_to_async(Authentication.issue_tokens)(
+            user, data["device"]
         )
-        user.refresh = Authentication.create_refresh_token()
-        await user.asave()
         return CustomResponse.success(
             message="Login successful",
-            data={"access": user.access, "refresh": user.refresh},
+            data={"access": access, "refresh": refresh},
             status_code=201,
         )
 
@@ -307,24 +310,18 @@ class RefreshTokensView(APIView):
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
-        token = data["refresh"]
-        user = await User.objects.aget_or_none(refresh=token)
-        if not user or not Authentication.decode_jwt(token):
+        tokens = await sync_to_async(Authentication.rotate_tokens)(data["refresh"])
+        if not tokens:
             raise RequestError(
                 err_code=ErrorCode.INVALID_TOKEN,
                 err_msg="Refresh token is invalid or expired",
                 status_code=401,
             )
 
-        user.access = Authentication.create_access_token(
-            {"user_id": str(user.id), "username": user.username}
-        )
-        user.refresh = Authentication.create_refresh_token()
-        await user.asave()
-
+        access, refresh = tokens
         return CustomResponse.success(
             message="Tokens refresh successful",
-            data={"access": user.access, "refresh": user.refresh},
+            data={"access": access, "refresh": refresh},
             status_code=201,
         )
 
@@ -335,7 +332,7 @@ class LogoutView(APIView):
 
     @extend_schema(
         summary="Logout a user",
-        description="This endpoint logs a user out from our application",
+        description="This endpoint logs a user out from our application, on the device of the access token",
         responses={
             200: SuccessResponseSerializer,
             401: ErrorResponseSerializer,
@@ -343,7 +340,6 @@ class LogoutView(APIView):
         tags=tags,
     )
     async def get(self, request):
-        user = request.user
-        user.access = user.refresh = None
-        await user.asave()
+        token = request.META["HTTP_AUTHORIZATION"][7:]
+        await sync_to_async(Authentication.delete_tokens)(request.user, token)
         return CustomResponse.success(message="Logout successful")
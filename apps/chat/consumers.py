@@ -1,12 +1,14 @@
 from django.conf import settings
 from apps.chat.models import Chat, Message
+from apps.chat.receipts import receipts_buffer
 from apps.accounts.models import User
 from apps.chat.serializers import MessageSerializer
 from apps.chat.socket_serializers import SocketMessageSerializer
 from apps.common.consumers import BaseConsumer
 from apps.common.error import ErrorCode
 from uuid import UUID
-import os, json, websockets
+from apps.common.socket_publisher import socket_publisher
+import os, json
 
 
 class ChatConsumer(BaseConsumer):
@@ -17,6 +19,7 @@ class ChatConsumer(BaseConsumer):
         ]  # ID is either the chat id or recipient id if its the first message of a dm
         self.room_name = f"chat_{id}"
         self.room_group_name = f"chat_{id}"
+        self.member_ids = set()
         await self.accept()
 
         if err.get("message"):  # Check for auth errors
@@ -46,8 +49,27 @@ class ChatConsumer(BaseConsumer):
                     "message": "Not allowed to send deletion socket",
                 },
             )
+        if status in ("READ", "DELIVERED"):
+            chat = self.scope.get("chat")
+            if not chat or user_id not in self.member_ids:
+                return await self.send_error_message(
+                    {
+                        "type": "invalid_member",
+                        "message": "You're not a member of this chat",
+                    }
+                )
+            # Written later with the member's other receipts, then published
+            return await receipts_buffer.add(chat.id, user, status, data["id"])
+
         message_data = data
         if status != "DELETED":
+            if self.scope.get("chat") and user_id not in self.member_ids:
+                return await self.send_error_message(
+                    {
+                        "type": "invalid_member",
+                        "message": "You're not a member of this chat",
+                    }
+                )
             message = await Message.objects.select_related(
                 "sender", "sender__avatar", "file"
             ).aget_or_none(id=data["id"])
@@ -69,8 +91,10 @@ class ChatConsumer(BaseConsumer):
             data.pop("id")
             message_data = message_data | data
 
+        # Serialize once here rather than in every receiving consumer
         await self.channel_layer.group_send(
-            self.room_group_name, {"type": "chat_message", "message": message_data}
+            self.room_group_name,
+            {"type": "chat_message", "text": json.dumps(message_data)},
         )
 
     async def get_objects(self, id):
@@ -78,7 +102,7 @@ class ChatConsumer(BaseConsumer):
         user = self.scope["user"]
         chat, obj_user = None, None
         if user.id != id:
-            chat = await Chat.objects.prefetch_related("users").aget_or_none(id=id)
+            chat = await Chat.objects.aget_or_none(id=id)
             if not chat:
                 obj_user = await User.objects.aget_or_none(username=id)
         else:
@@ -97,9 +121,7 @@ class ChatConsumer(BaseConsumer):
                     {"type": "invalid_input", "message": "Invalid ID"}
                 )
                 return await self.close(code=1001)
-            if (
-                chat and user not in chat.users.all() and user.id != chat.owner_id
-            ):  # If chat but user is not a member
+            if chat and not await self.is_member(chat, user):
                 await self.send_error_message(
                     {
                         "type": "invalid_member",
@@ -110,34 +132,49 @@ class ChatConsumer(BaseConsumer):
         # Add group and channel name to channel layer
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 
+    async def is_member(self, chat, user):
+        # The chat's members, loaded once for the connection and kept current by
+        # chat_members_removed events
+        self.member_ids = {chat.owner_id}
+        async for user_id in Chat.users.through.objects.filter(
+            chat_id=chat.id
+        ).values_list("user_id", flat=True):
+            self.member_ids.add(user_id)
+        return user.id in self.member_ids
+
+    async def chat_members_removed(self, event):
+        # Sent when users are removed from a group chat
+        user = self.scope["user"]
+        if isinstance(user, User) and str(user.id) in event["user_ids"]:
+            self.member_ids.discard(user.id)
+            await self.send_error_message(
+                {
+                    "type": "invalid_member",
+                    "message": "You're not a member of this chat",
+                }
+            )
+            await self.close(code=1001)
+
     async def chat_message(self, event):
-        message = event["message"]
         obj_user = self.scope.get("obj_user")
         user = self.scope["user"]
 
         if obj_user:
             # Ensure that reading messages from a user id can only be done by the owner
             if user == obj_user:
-                await self.send(text_data=json.dumps(message))
+                await self.send(text_data=event["text"])
         else:
-            await self.send(text_data=json.dumps(message))
+            await self.send(text_data=event["text"])
 
 
-async def send_message_deletion_in_socket(
-    secured: bool, host: str, chat_id: UUID, message_id: UUID
-):
+async def send_message_deletion_in_socket(chat_id: UUID, message_id: UUID):
     if os.environ.get("ENVIRONMENT") == "TESTING":
         return
-    websocket_scheme = "wss://" if secured else "ws://"
-    uri = f"{websocket_scheme}{host}/api/v1/ws/chats/{chat_id}/"
     chat_data = {
         "id": str(message_id),
         "status": "DELETED",
     }
-    headers = [
-        ("Authorization", settings.SOCKET_SECRET),
-    ]
-    async with websockets.connect(uri, extra_headers=headers) as websocket:
-        # Send the chat to the WebSocket server
-        await websocket.send(json.dumps(chat_data))
-        await websocket.close()
+    # Publish to the chat group through the channel layer
+    await socket_publisher.publish(
+        f"chat_{chat_id}", {"type": "chat_message", "text": json.dumps(chat_data)}
+    )
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0019_alter_message_text"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["chat", "created_at", "id"],
+                name="message_chat_created_at_id_idx",
+            ),
+        ),
+    ]
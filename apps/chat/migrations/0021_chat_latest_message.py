@@ -0,0 +1,39 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:27
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def set_latest_messages(apps, schema_editor):
+    Chat = apps.get_model("chat", "Chat")
+    Message = apps.get_model("chat", "Message")
+    Chat.objects.update(
+        latest_message=Subquery(
+            Message.objects.filter(chat=OuterRef("pk"))
+            .order_by("-created_at", "-id")
+            .values("id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0020_message_message_chat_created_at_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chat",
+            name="latest_message",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="chat.message",
+            ),
+        ),
+        migrations.RunPython(set_latest_messages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.3 on 2026-10-17 23:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("chat", "0021_chat_latest_message"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChatCursor",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("read_at", models.DateTimeField(blank=True, null=True)),
+                ("unread_count", models.PositiveIntegerField(default=0)),
+                (
+                    "chat",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cursors",
+                        to="chat.chat",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chat_cursors",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="chatcursor",
+            constraint=models.UniqueConstraint(
+                fields=("user", "chat"), name="unique_chat_cursor"
+            ),
+        ),
+        # Existing members start with everything read
+        migrations.RunSQL(
+            """
+            INSERT INTO chat_chatcursor (id, created_at, updated_at, chat_id, user_id, read_at, unread_count)
+            SELECT gen_random_uuid(), now(), now(), id, owner_id, now(), 0 FROM chat_chat
+            UNION ALL
+            SELECT gen_random_uuid(), now(), now(), chat_id, user_id, now(), 0 FROM chat_chat_users
+            ON CONFLICT DO NOTHING
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
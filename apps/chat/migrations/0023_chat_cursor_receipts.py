@@ -0,0 +1,53 @@
+# Generated by Django 4.2.3 on 2026-10-17 23:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0022_chat_cursor"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chatcursor",
+            name="delivered_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="chatcursor",
+            name="last_delivered_message",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="chat.message",
+            ),
+        ),
+        migrations.AddField(
+            model_name="chatcursor",
+            name="last_read_message",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="chat.message",
+            ),
+        ),
+        # Cursors marked as read on creation point to the chat's latest message
+        migrations.RunSQL(
+            """
+            UPDATE chat_chatcursor SET
+                last_read_message_id = chat_chat.latest_message_id,
+                last_delivered_message_id = chat_chat.latest_message_id,
+                delivered_at = chat_chatcursor.read_at
+            FROM chat_chat
+            WHERE chat_chat.id = chat_chatcursor.chat_id AND chat_chatcursor.read_at IS NOT NULL
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,11 +1,22 @@
-from django.db import models
-from django.db.models import CheckConstraint, Q
-from django.db.models.signals import m2m_changed
+from django.db import models, transaction
+from django.db.models import (
+    CheckConstraint,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    UniqueConstraint,
+)
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.utils import timezone
 from apps.accounts.models import User
 from apps.chat.validators import validate_chat_users_m2m
 from apps.common.file_processors import FileProcessor
 
 from apps.common.models import BaseModel, File
+from apps.common.sync import record_changes
 
 # Create your models here.
 
@@ -19,6 +30,14 @@ class Chat(BaseModel):
     users = models.ManyToManyField(User)
     description = models.CharField(max_length=1000, null=True, blank=True)
     image = models.ForeignKey(File, on_delete=models.SET_NULL, null=True, blank=True)
+    latest_message = models.ForeignKey(
+        "Message",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+    )  # Denormalized, so chat lists don't need to load messages
 
     def __str__(self):
         return str(self.id)
@@ -59,6 +78,87 @@ def users_changed(sender, instance, **kwargs):
 m2m_changed.connect(users_changed, sender=Chat.users.through)
 
 
+class ChatCursor(BaseModel):
+    """
+    A member's read and delivered positions in a chat, and the count of messages from
+    others after the read one. The count is kept up to date on writes, so unread badges
+    are a single row read. The positions only move forward (see apps.chat.receipts).
+    """
+
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name="cursors")
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="chat_cursors"
+    )
+    last_read_message = models.ForeignKey(
+        "Message", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    read_at = models.DateTimeField(null=True, blank=True)  # Of the last read message
+    last_delivered_message = models.ForeignKey(
+        "Message", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.chat_id} ------ {self.user_id}"
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=["user", "chat"], name="unique_chat_cursor"),
+        ]
+
+
+def chat_saved(sender, instance, created, **kwargs):
+    if created:
+        ChatCursor.objects.bulk_create(
+            [ChatCursor(chat=instance, user_id=instance.owner_id)],
+            ignore_conflicts=True,
+        )
+    record_changes("CHAT", "UPSERT", [instance.id], chat_id=instance.id)
+
+
+def chat_deleted(sender, instance, **kwargs):
+    # Tombstones go to each member, as the chat's own changes are gone with it
+    user_ids = {
+        instance.owner_id,
+        *instance.users.values_list("id", flat=True),
+    }
+    record_changes("CHAT", "DELETE", [instance.id], user_ids=user_ids)
+
+
+def members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Every member has a cursor, from joining the chat to leaving it
+    if action == "post_clear" and not reverse:
+        instance.cursors.exclude(user_id=instance.owner_id).delete()
+    if action not in ("post_add", "post_remove"):
+        return
+    pairs = [(id, instance.id) if reverse else (instance.id, id) for id in pk_set]
+    if action == "post_add":
+        ChatCursor.objects.bulk_create(
+            [
+                ChatCursor(chat_id=chat_id, user_id=user_id)
+                for chat_id, user_id in pairs
+            ],
+            ignore_conflicts=True,
+        )
+    else:
+        filters = Q()
+        for chat_id, user_id in pairs:
+            filters |= Q(chat_id=chat_id, user_id=user_id)
+        ChatCursor.objects.filter(filters).delete()
+    # The chat appears in, or disappears from, the synced chats of these users
+    op = "UPSERT" if action == "post_add" else "DELETE"
+    if reverse:
+        record_changes("CHAT", op, pk_set, user_ids=[instance.id])
+    else:
+        record_changes("CHAT", op, [instance.id], user_ids=pk_set)
+
+
+post_save.connect(chat_saved, sender=Chat)
+pre_delete.connect(chat_deleted, sender=Chat)
+m2m_changed.connect(members_changed, sender=Chat.users.through)
+
+
 class Message(BaseModel):
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name="messages")
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name="messages")
@@ -66,9 +166,54 @@ class Message(BaseModel):
     file = models.ForeignKey(File, on_delete=models.SET_NULL, null=True, blank=True)
 
     def save(self, *args, **kwargs):
-        if self._state.adding:
-            self.chat.save()
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            record_changes("MESSAGE", "UPSERT", [self.id], chat_id=self.chat_id)
+            if not adding:
+                return
+            # Bump the chat and set this as its latest message, unless a newer one is
+            # already. A message of a concurrent transaction that isn't visible yet counts
+            # as newer, so the latest message never goes back
+            older = Message.objects.filter(
+                Q(created_at__lt=self.created_at)
+                | Q(created_at=self.created_at, id__lt=self.id),
+                id=OuterRef("latest_message_id"),
+            )
+            if Chat.objects.filter(
+                Q(latest_message=None) | Q(Exists(older)), id=self.chat_id
+            ).update(latest_message=self, updated_at=timezone.now()):
+                self.chat.latest_message = self
+                record_changes("CHAT", "UPSERT", [self.chat_id], chat_id=self.chat_id)
+            # Unread by the other members
+            ChatCursor.objects.filter(chat_id=self.chat_id).exclude(
+                user_id=self.sender_id
+            ).update(unread_count=F("unread_count") + 1)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # No longer unread by the members who hadn't read it, and were in the chat
+            # when it was sent
+            ChatCursor.objects.filter(
+                Q(read_at=None) | Q(read_at__lt=self.created_at),
+                chat_id=self.chat_id,
+                created_at__lte=self.created_at,
+            ).exclude(user_id=self.sender_id).update(
+                unread_count=Greatest(F("unread_count") - 1, 0)
+            )
+            record_changes("MESSAGE", "DELETE", [self.id], chat_id=self.chat_id)
+            id, chat_id = self.id, self.chat_id
+            deleted = super().delete(*args, **kwargs)
+            # Fall back to the previous message if this was the latest, unless a newer
+            # one was sent meanwhile. Not a chat activity, so updated_at stays
+            previous = Message.objects.filter(chat_id=chat_id).order_by(
+                "-created_at", "-id"
+            )
+            if Chat.objects.filter(
+                Q(latest_message=None) | Q(latest_message_id=id), id=chat_id
+            ).update(latest_message=Subquery(previous.values("id")[:1])):
+                record_changes("CHAT", "UPSERT", [chat_id], chat_id=chat_id)
+            return deleted
 
     @property
     def get_file(self):
@@ -83,3 +228,9 @@ class Message(BaseModel):
 
     class Meta:
         get_latest_by = "created_at"
+        indexes = [
+            models.Index(
+                fields=["chat", "created_at", "id"],
+                name="message_chat_created_at_id_idx",
+            ),
+        ]
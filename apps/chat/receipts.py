@@ -0,0 +1,153 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    F,
+    PositiveIntegerField,
+    Q,
+    Subquery,
+    When,
+)
+from django.db.models.functions import Coalesce
+from apps.chat.models import ChatCursor, Message
+from apps.chat.utils import publish_chat_unread_counts
+from apps.common.socket_publisher import socket_publisher
+import asyncio, json, logging, os
+
+logger = logging.getLogger(__name__)
+
+
+def cursor_updates(chat_id, user_id, message_ids, field, at_field):
+    # Condition and fields moving a cursor position to the latest of the messages
+    latest = Message.objects.filter(chat_id=chat_id, id__in=message_ids).order_by(
+        "-created_at", "-id"
+    )
+    at = Subquery(latest.values("created_at")[:1])
+    moves = Q(Exists(latest)) & (Q(**{at_field: None}) | Q(**{f"{at_field}__lt": at}))
+    updates = {
+        field: Case(
+            When(moves, then=Subquery(latest.values("id")[:1])), default=F(field)
+        ),
+        at_field: Case(When(moves, then=at), default=F(at_field)),
+    }
+    if at_field == "read_at":
+        # Messages sent since the read one stay unread
+        newer = (
+            Message.objects.filter(chat_id=chat_id, created_at__gt=at)
+            .exclude(sender_id=user_id)
+            .order_by()
+            .values("chat_id")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        updates["unread_count"] = Case(
+            When(moves, then=Coalesce(Subquery(newer), 0)),
+            default=F("unread_count"),
+            output_field=PositiveIntegerField(),
+        )
+    return moves, updates
+
+
+def write_receipts(chat_id, user_id, read_ids=(), delivered_ids=()):
+    """
+    Moves the member's cursors forward to the latest of the read and delivered messages,
+    in one UPDATE. A read message is delivered too. Unknown messages are ignored.
+    Returns whether the cursor moved.
+    """
+    delivered_ids = {*delivered_ids, *read_ids}
+    if not delivered_ids:
+        return False
+    moves, updates = cursor_updates(
+        chat_id, user_id, delivered_ids, "last_delivered_message", "delivered_at"
+    )
+    if read_ids:
+        read_moves, read_updates = cursor_updates(
+            chat_id, user_id, read_ids, "last_read_message", "read_at"
+        )
+        moves |= read_moves
+        updates |= read_updates
+    return bool(
+        ChatCursor.objects.filter(moves, chat_id=chat_id, user_id=user_id).update(
+            **updates
+        )
+    )
+
+
+async def mark_chat_read(chat, user):
+    # Moves the user's cursors to the chat's latest message, returns whether they moved
+    if not chat.latest_message_id:
+        return False
+    return await sync_to_async(write_receipts)(
+        chat.id, user.id, read_ids=[chat.latest_message_id]
+    )
+
+
+async def publish_receipts(chat_id, user):
+    # Lets the other members show how far the user has read, and updates the user's badge
+    if os.environ.get("ENVIRONMENT") == "TESTING":
+        return
+    cursor = await ChatCursor.objects.aget_or_none(chat_id=chat_id, user_id=user.id)
+    if not cursor:
+        return
+    data = {"status": "RECEIPT", "username": user.username}
+    for field in ("last_read_message_id", "last_delivered_message_id"):
+        id = getattr(cursor, field)
+        data[field] = str(id) if id else None
+    await socket_publisher.publish(
+        f"chat_{chat_id}",
+        {"type": "chat_message", "text": json.dumps(data)},
+        key=f"receipt_{user.id}",
+    )
+    await publish_chat_unread_counts(chat_id, user_ids=[user.id])
+
+
+class ReceiptsBuffer:
+    """
+    Buffers the read and delivered receipts sent to chat sockets. The first receipt of a
+    member in a chat schedules a write `delay` seconds later, and the ones arriving until
+    then join it, so a burst of receipts (e.g scrolling through a chat) is one UPDATE.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.pending = {}  # (chat id, user id) -> (user, read ids, delivered ids)
+        self.tasks = set()
+
+    async def add(self, chat_id, user, status, message_id):
+        key = (chat_id, user.id)
+        entry = self.pending.get(key)
+        if not entry:
+            entry = self.pending[key] = (user, set(), set())
+            task = asyncio.get_running_loop().create_task(self.write_later(key))
+            # Keep a reference, so the task isn't garbage collected before it runs
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        entry[1 if status == "READ" else 2].add(message_id)
+
+    async def write_later(self, key):
+        await asyncio.sleep(self.delay)
+        await self.write(key)
+
+    async def write(self, key):
+        entry = self.pending.pop(key, None)
+        if not entry:  # Flushed already
+            return
+        chat_id, user_id = key
+        user, read_ids, delivered_ids = entry
+        try:
+            if await sync_to_async(write_receipts)(
+                chat_id, user_id, read_ids, delivered_ids
+            ):
+                await publish_receipts(chat_id, user)
+        except Exception as e:
+            logger.error(f"Failed to write receipts of {user_id} in {chat_id}: {e!r}")
+
+    async def flush(self):
+        # Writes every pending receipt now
+        for key in list(self.pending):
+            await self.write(key)
+
+
+receipts_buffer = ReceiptsBuffer(delay=settings.CHAT_RECEIPTS_DELAY)
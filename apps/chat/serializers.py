@@ -23,6 +23,10 @@ class ChatSerializer(serializers.Serializer):
         source="get_image", default="https://img.url", read_only=True
     )
     latest_message = serializers.SerializerMethodField(default=latest_message_data)
+    # The current user's cursors in the chat
+    last_read_message_id = serializers.UUIDField(default=None, read_only=True)
+    last_delivered_message_id = serializers.UUIDField(default=None, read_only=True)
+    unread_count = serializers.IntegerField(default=0, read_only=True)
     created_at = serializers.DateTimeField(
         default_timezone=pytz.timezone("UTC"), read_only=True
     )
@@ -34,9 +38,8 @@ class ChatSerializer(serializers.Serializer):
         return get_user(obj.owner)
 
     def get_latest_message(self, obj) -> dict:
-        lmessages = obj.lmessages
-        if len(lmessages) > 0:
-            message = lmessages[0]
+        message = obj.latest_message
+        if message:
             return {
                 "sender": get_user(message.sender),
                 "text": message.text,
@@ -100,10 +103,20 @@ class MessagesResponseDataSchema(PaginatedResponseDataSerializer):
     items = MessageSerializer(many=True)
 
 
+class ChatCursorSerializer(serializers.Serializer):
+    user = serializers.SerializerMethodField(default=user_data)
+    last_read_message_id = serializers.UUIDField()
+    last_delivered_message_id = serializers.UUIDField()
+
+    def get_user(self, obj) -> dict:
+        return get_user(obj.user)
+
+
 class MessagesSerializer(serializers.Serializer):
     chat = ChatSerializer()
     messages = MessagesResponseDataSchema()
     users = serializers.SerializerMethodField(default=[user_data])
+    cursors = ChatCursorSerializer(source="chat.member_cursors", many=True)
 
     def get_users(self, obj) -> list:
         return [get_user(user) for user in obj["chat"].recipients]
@@ -186,6 +199,29 @@ class GroupChatSerializer(serializers.Serializer):
         return attrs
 
 
+class ChatUnreadCountSerializer(serializers.Serializer):
+    chat_id = serializers.UUIDField()
+    unread_count = serializers.IntegerField()
+
+
+class ChatsUnreadCountsSerializer(serializers.Serializer):
+    total = serializers.IntegerField()
+    chats = ChatUnreadCountSerializer(many=True)
+
+
+class ChatsSyncDeletedSerializer(serializers.Serializer):
+    chats = serializers.ListField(child=serializers.UUIDField())
+    messages = serializers.ListField(child=serializers.UUIDField())
+
+
+class ChatsSyncSerializer(serializers.Serializer):
+    token = serializers.CharField()
+    has_more = serializers.BooleanField()
+    chats = ChatSerializer(many=True)
+    messages = MessageSerializer(many=True)
+    deleted = ChatsSyncDeletedSerializer()
+
+
 # RESPONSE SERIALIZERS
 
 
@@ -233,3 +269,11 @@ class GroupChatCreateResponseDataSerializer(GroupChatSerializer):
 
 class GroupChatCreateResponseSerializer(SuccessResponseSerializer):
     data = GroupChatCreateResponseDataSerializer()
+
+
+class ChatsUnreadCountsResponseSerializer(SuccessResponseSerializer):
+    data = ChatsUnreadCountsSerializer()
+
+
+class ChatsSyncResponseSerializer(SuccessResponseSerializer):
+    data = ChatsSyncSerializer()
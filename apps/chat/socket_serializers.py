@@ -4,6 +4,8 @@ MESSAGE_STATUS = (
     ("CREATED", "CREATED"),
     ("UPDATED", "UPDATED"),
     ("DELETED", "DELETED"),
+    ("READ", "READ"),  # Receipts, buffered and written to the member's chat cursor
+    ("DELIVERED", "DELIVERED"),
 )
 
 
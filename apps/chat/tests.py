@@ -1,15 +1,25 @@
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from unittest import mock
-from apps.chat.models import Chat, Message
+from apps.accounts.models import User
+from apps.chat.models import Chat, ChatCursor, Message
+from apps.chat.receipts import ReceiptsBuffer, write_receipts
 from apps.chat.utils import get_user
+from apps.common.sync import encode_sync_token
 from apps.common.utils import TestUtil
 from apps.common.error import ErrorCode
-import uuid, os
+from datetime import timedelta
+import asyncio, uuid, os
 
 
 class TestChat(APITestCase):
     os.environ["ENVIRONMENT"] = "TESTING"
     chats_url = "/api/v1/chats/"
+    unread_counts_url = "/api/v1/chats/unread-counts/"
+    sync_url = "/api/v1/chats/sync/"
     messages_url = "/api/v1/chats/messages/"
     groups_url = "/api/v1/chats/groups/group/"
 
@@ -91,6 +101,10 @@ class TestChat(APITestCase):
             },
         )
 
+        # Verify the chat's latest message was updated
+        chat.refresh_from_db()
+        self.assertEqual(str(chat.latest_message_id), response.json()["data"]["id"])
+
         # You can test for other error responses yourself
 
     def test_retrieve_chat_messages(self):
@@ -110,9 +124,17 @@ class TestChat(APITestCase):
             },
         )
 
-        # Verify the request succeeds with valid chat ID
+        # Verify a plain fetch leaves the cursors as they are
         response = self.client.get(f"{self.chats_url}{chat.id}/", **self.bearer)
         self.assertEqual(response.status_code, 200)
+        cursor = ChatCursor.objects.get(chat=chat, user=self.verified_user)
+        self.assertIsNone(cursor.last_read_message_id)
+
+        # Verify the request succeeds with valid chat ID, and marks the chat as read
+        response = self.client.get(
+            f"{self.chats_url}{chat.id}/?mark_read=true", **self.bearer
+        )
+        self.assertEqual(response.status_code, 200)
         self.assertEqual(
             response.json(),
             {
@@ -131,6 +153,9 @@ class TestChat(APITestCase):
                             "text": message.text,
                             "file": message.get_file,
                         },
+                        "last_read_message_id": str(message.id),
+                        "last_delivered_message_id": str(message.id),
+                        "unread_count": 0,
                         "created_at": mock.ANY,
                         "updated_at": mock.ANY,
                     },
@@ -151,10 +176,69 @@ class TestChat(APITestCase):
                         ],
                     },
                     "users": [get_user(other_user)],
+                    "cursors": mock.ANY,
+                },
+            },
+        )
+
+        # Fetching the latest messages moved the user's cursors only
+        cursors = {
+            cursor["user"]["username"]: cursor
+            for cursor in response.json()["data"]["cursors"]
+        }
+        self.assertEqual(
+            cursors,
+            {
+                self.verified_user.username: {
+                    "user": get_user(self.verified_user),
+                    "last_read_message_id": str(message.id),
+                    "last_delivered_message_id": str(message.id),
                 },
+                other_user.username: {
+                    "user": get_user(other_user),
+                    "last_read_message_id": None,
+                    "last_delivered_message_id": None,
+                },
+            },
+        )
+
+    def test_retrieve_chat_messages_around_a_message(self):
+        chat = self.chat
+        message = self.message
+        newer_message = Message.objects.create(
+            chat=chat, sender=self.another_verified_user, text="Hi"
+        )
+        url = f"{self.chats_url}{chat.id}/"
+
+        # Verify the request fails with an unknown message ID
+        response = self.client.get(f"{url}?before={uuid.uuid4()}", **self.bearer)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            response.json(),
+            {
+                "status": "failure",
+                "code": ErrorCode.NON_EXISTENT,
+                "message": "Chat has no message with that ID",
             },
         )
 
+        # Verify the request fails with both anchors
+        response = self.client.get(
+            f"{url}?before={newer_message.id}&after={message.id}", **self.bearer
+        )
+        self.assertEqual(response.status_code, 422)
+
+        # Verify older and newer messages are fetched around the anchor
+        response = self.client.get(f"{url}?before={newer_message.id}", **self.bearer)
+        self.assertEqual(response.status_code, 200)
+        items = response.json()["data"]["messages"]["items"]
+        self.assertEqual([item["id"] for item in items], [str(message.id)])
+
+        response = self.client.get(f"{url}?after={message.id}", **self.bearer)
+        self.assertEqual(response.status_code, 200)
+        items = response.json()["data"]["messages"]["items"]
+        self.assertEqual([item["id"] for item in items], [str(newer_message.id)])
+
     def test_update_group_chat(self):
         chat = self.group_chat
         other_user = self.another_verified_user
@@ -287,9 +371,11 @@ class TestChat(APITestCase):
         )
 
         # Verify the requests suceeds with valid message id
-        response = self.client.delete(
-            f"{self.messages_url}{message.id}/", **self.bearer
+        latest = Message.objects.create(
+            chat=message.chat, sender=self.verified_user, text="Latest"
         )
+        chat = Chat.objects.get(id=message.chat_id)
+        response = self.client.delete(f"{self.messages_url}{latest.id}/", **self.bearer)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(
             response.json(),
@@ -299,6 +385,235 @@ class TestChat(APITestCase):
             },
         )
 
+        # The chat falls back to the previous message, without moving up the inbox
+        updated_at = chat.updated_at
+        chat.refresh_from_db()
+        self.assertEqual(chat.latest_message, message)
+        self.assertEqual(chat.updated_at, updated_at)
+
+    def test_unread_counts(self):
+        chat = self.chat
+        group_chat = self.group_chat
+        user = self.verified_user
+
+        # Messages from others are unread, own messages aren't
+        response = self.client.get(self.unread_counts_url, **self.other_user_bearer)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "status": "success",
+                "message": "Unread messages counts fetched",
+                "data": {
+                    "total": 1,
+                    "chats": [{"chat_id": str(chat.id), "unread_count": 1}],
+                },
+            },
+        )
+        response = self.client.get(self.unread_counts_url, **self.bearer)
+        self.assertEqual(response.json()["data"], {"total": 0, "chats": []})
+
+        response = self.client.post(
+            self.chats_url,
+            data={"chat_id": group_chat.id, "text": "Hello group"},
+            **self.bearer,
+        )
+        group_message_id = response.json()["data"]["id"]
+        response = self.client.get(self.unread_counts_url, **self.other_user_bearer)
+        self.assertEqual(response.json()["data"]["total"], 2)
+
+        # Fetching the latest messages of a chat reads it, when asked to
+        self.client.get(
+            f"{self.chats_url}{chat.id}/?mark_read=true", **self.other_user_bearer
+        )
+        response = self.client.get(self.unread_counts_url, **self.other_user_bearer)
+        self.assertEqual(
+            response.json()["data"],
+            {
+                "total": 1,
+                "chats": [{"chat_id": str(group_chat.id), "unread_count": 1}],
+            },
+        )
+
+        # Deleting an unread message uncounts it
+        self.client.delete(f"{self.messages_url}{group_message_id}/", **self.bearer)
+        response = self.client.get(self.unread_counts_url, **self.other_user_bearer)
+        self.assertEqual(response.json()["data"]["total"], 0)
+
+        # Messages sent before a member joined were never counted for them
+        earlier = Message.objects.create(chat=group_chat, sender=user, text="Earlier")
+        new_member = User.objects.create_user(
+            first_name="New",
+            last_name="Member",
+            email="newmember@example.com",
+            password="newmember123",
+        )
+        group_chat.users.add(new_member)
+        Message.objects.create(chat=group_chat, sender=user, text="Later")
+        earlier.delete()
+        cursor = ChatCursor.objects.get(chat=group_chat, user=new_member)
+        self.assertEqual(cursor.unread_count, 1)
+        call_command("rebuild_unread_counts")
+        cursor.refresh_from_db()
+        self.assertEqual(cursor.unread_count, 1)
+
+        # Drifted counts are reconciled from the messages
+        ChatCursor.objects.filter(chat=chat).update(unread_count=5)
+        call_command("rebuild_unread_counts")
+        cursors = ChatCursor.objects.filter(chat=chat)
+        self.assertEqual([cursor.unread_count for cursor in cursors], [0, 0])
+
+    def test_read_receipts(self):
+        chat = self.chat
+        user = self.verified_user
+        other_user = self.another_verified_user
+        messages = [self.message] + [
+            Message.objects.create(chat=chat, sender=user, text=f"Message {i}")
+            for i in range(3)
+        ]
+        buffer = ReceiptsBuffer(delay=0)
+
+        async def send_receipts():
+            for message in (messages[1], messages[2], messages[0]):
+                await buffer.add(chat.id, other_user, "READ", str(message.id))
+            await buffer.add(chat.id, other_user, "DELIVERED", str(messages[3].id))
+            await asyncio.gather(*buffer.tasks)
+
+        # A burst of receipts is one write, and the cursors move to the latest messages
+        with self.assertNumQueries(1):
+            async_to_sync(send_receipts)()
+        cursor = ChatCursor.objects.get(chat=chat, user=other_user)
+        self.assertEqual(cursor.last_read_message, messages[2])
+        self.assertEqual(cursor.last_delivered_message, messages[3])
+        self.assertEqual(cursor.unread_count, 1)
+
+        # Cursors never move back
+        self.assertFalse(write_receipts(chat.id, other_user.id, [messages[0].id]))
+
+        # Fetch the messages since a cursor
+        url = f"{self.chats_url}{chat.id}/"
+        response = self.client.get(f"{url}?since=read", **self.other_user_bearer)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(
+            [item["id"] for item in data["messages"]["items"]], [str(messages[3].id)]
+        )
+        self.assertEqual(data["chat"]["last_read_message_id"], str(messages[2].id))
+        self.assertEqual(data["chat"]["unread_count"], 1)
+
+        response = self.client.get(f"{url}?since=delivered", **self.other_user_bearer)
+        self.assertEqual(response.json()["data"]["messages"]["items"], [])
+
+        # Without a cursor, every message is new
+        ChatCursor.objects.filter(chat=chat, user=other_user).delete()
+        response = self.client.get(f"{url}?since=read", **self.other_user_bearer)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["data"]["messages"]["items"]), 4)
+
+        response = self.client.get(f"{url}?since=invalid", **self.other_user_bearer)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            response.json(),
+            {
+                "status": "failure",
+                "code": ErrorCode.INVALID_VALUE,
+                "message": "Invalid 'since' value",
+            },
+        )
+
+    @override_settings(SYNC_LAG_SECONDS=0)
+    def test_sync_chats(self):
+        chat = self.chat
+        group_chat = self.group_chat
+        other_user = self.another_verified_user
+
+        # Without a token, syncing starts from now
+        response = self.client.get(self.sync_url, **self.bearer)
+        self.assertEqual(response.status_code, 200)
+        resp = response.json()
+        self.assertEqual(resp["message"], "Chats synced")
+        token = resp["data"].pop("token")
+        self.assertEqual(
+            resp["data"],
+            {
+                "has_more": False,
+                "chats": [],
+                "messages": [],
+                "deleted": {"chats": [], "messages": []},
+            },
+        )
+
+        # New, edited and deleted messages, and left chats since the token
+        response = self.client.post(
+            self.chats_url, data={"chat_id": chat.id, "text": "Hello"}, **self.bearer
+        )
+        message_id = response.json()["data"]["id"]
+        self.client.put(
+            f"{self.messages_url}{message_id}/", data={"text": "Hi"}, **self.bearer
+        )
+        deleted_message_id = str(self.message.id)
+        self.message.delete()
+        group_chat.users.remove(other_user)
+
+        response = self.client.get(f"{self.sync_url}?token={token}", **self.bearer)
+        data = response.json()["data"]
+        self.assertFalse(data["has_more"])
+        self.assertEqual([item["id"] for item in data["chats"]], [str(chat.id)])
+        self.assertEqual(data["chats"][0]["latest_message"]["text"], "Hi")
+        self.assertEqual(
+            [(item["id"], item["text"]) for item in data["messages"]],
+            [(message_id, "Hi")],
+        )
+        self.assertEqual(
+            data["deleted"], {"chats": [], "messages": [deleted_message_id]}
+        )
+
+        # The removed member gets a tombstone of the chat
+        response = self.client.get(
+            f"{self.sync_url}?token={token}", **self.other_user_bearer
+        )
+        data = response.json()["data"]
+        self.assertEqual(data["deleted"]["chats"], [str(group_chat.id)])
+        self.assertEqual([item["id"] for item in data["chats"]], [str(chat.id)])
+
+        # Nothing changed since the returned token
+        response = self.client.get(
+            f"{self.sync_url}?token={data['token']}", **self.other_user_bearer
+        )
+        data = response.json()["data"]
+        self.assertEqual((data["chats"], data["messages"]), ([], []))
+
+        # Pages of changes
+        with override_settings(SYNC_PAGE_SIZE=1):
+            response = self.client.get(f"{self.sync_url}?token={token}", **self.bearer)
+            data = response.json()["data"]
+            self.assertTrue(data["has_more"])
+            self.assertEqual(len(data["messages"]), 1)
+            self.assertNotEqual(data["token"], token)
+
+        # Recent changes are sent, but the token stays before them
+        with override_settings(SYNC_PAGE_SIZE=1, SYNC_LAG_SECONDS=60):
+            response = self.client.get(f"{self.sync_url}?token={token}", **self.bearer)
+            data = response.json()["data"]
+            self.assertFalse(data["has_more"])
+            self.assertEqual(len(data["messages"]), 1)
+            self.assertEqual(data["token"], token)
+
+        # Invalid and expired tokens
+        response = self.client.get(f"{self.sync_url}?token=invalid", **self.bearer)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            response.json(),
+            {
+                "status": "failure",
+                "code": ErrorCode.INVALID_VALUE,
+                "message": "Invalid sync token",
+            },
+        )
+        token = encode_sync_token(timezone.now() - timedelta(days=31), uuid.uuid4())
+        response = self.client.get(f"{self.sync_url}?token={token}", **self.bearer)
+        self.assertEqual(response.status_code, 410)
+
     def test_create_group_chat(self):
         other_user = self.another_verified_user
         chat_data = {
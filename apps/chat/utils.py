@@ -1,9 +1,13 @@
-from django.db.models import Q
+from django.db.models import F, FilteredRelation, Q
+from django.db.models.functions import Coalesce
 from apps.accounts.models import User
+from apps.chat.models import ChatCursor
 from apps.common.error import ErrorCode
 from apps.common.exceptions import RequestError
 from apps.common.models import File
+from apps.common.socket_publisher import socket_publisher
 from asgiref.sync import sync_to_async
+import os
 
 
 # Create file object
@@ -15,16 +19,29 @@ async def create_file(file_type=None):
 
 
 # Update group chat users m2m
-def update_group_chat_users(instance, action, data):
+async def update_group_chat_users(instance, action, data):
     if len(data) > 0:
         if action == "add":
-            instance.users.add(*data)
+            await instance.users.aadd(*data)
         elif action == "remove":
-            instance.users.remove(*data)
+            await instance.users.aremove(*data)
+            await send_chat_members_removal_in_socket(
+                instance.id, [user.id for user in data]
+            )
         else:
             raise ValueError("Invalid Action")
 
 
+async def send_chat_members_removal_in_socket(chat_id, user_ids):
+    if os.environ.get("ENVIRONMENT") == "TESTING":
+        return
+    # Lets the removed users' open connections drop their cached membership
+    await socket_publisher.publish(
+        f"chat_{chat_id}",
+        {"type": "chat_members_removed", "user_ids": [str(id) for id in user_ids]},
+    )
+
+
 # Handle errors for users m2m
 def handle_lerrors(err):
     errA = err.get("usernames_to_add")
@@ -90,7 +107,43 @@ async def usernames_to_add_and_remove_validations(
         )
 
     if users_to_add:
-        await sync_to_async(update_group_chat_users)(chat, "add", users_to_add)
+        await update_group_chat_users(chat, "add", users_to_add)
     if users_to_remove:
-        await sync_to_async(update_group_chat_users)(chat, "remove", users_to_remove)
+        await update_group_chat_users(chat, "remove", users_to_remove)
     return chat
+
+
+def with_cursor(chats, user):
+    # The user's cursor fields, through one join on the (user, chat) unique index
+    return chats.annotate(
+        cursor=FilteredRelation("cursors", condition=Q(cursors__user_id=user.id))
+    ).annotate(
+        last_read_message_id=F("cursor__last_read_message_id"),
+        last_delivered_message_id=F("cursor__last_delivered_message_id"),
+        unread_count=Coalesce(F("cursor__unread_count"), 0),
+    )
+
+
+# Unread messages: counted per member on the chat cursors (see ChatCursor)
+async def publish_chat_unread_counts(chat_id, user_ids=None, exclude_user_id=None):
+    # Pushed to the members' notification groups, which are open outside of the chat too
+    if os.environ.get("ENVIRONMENT") == "TESTING":
+        return
+    from apps.profiles.utils import notification_group
+
+    cursors = ChatCursor.objects.filter(chat_id=chat_id)
+    if user_ids is not None:
+        cursors = cursors.filter(user_id__in=user_ids)
+    if exclude_user_id:
+        cursors = cursors.exclude(user_id=exclude_user_id)
+    async for user_id, unread_count in cursors.values_list("user_id", "unread_count"):
+        data = {
+            "status": "UNREAD_COUNT",
+            "chat_id": str(chat_id),
+            "unread_count": unread_count,
+        }
+        await socket_publisher.publish(
+            notification_group(user_id),
+            {"type": "unread_count", "data": data},
+            key=f"unread_count_{chat_id}",
+        )
@@ -2,15 +2,22 @@ from django.db.models import Q, Prefetch
 from adrf.views import APIView
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from asgiref.sync import sync_to_async
+from datetime import datetime, timezone
+from uuid import UUID
 from apps.chat.consumers import send_message_deletion_in_socket
-from apps.chat.models import Chat, Message
+from apps.chat.models import Chat, ChatCursor, Message
+from apps.chat.receipts import mark_chat_read, publish_receipts
 from apps.chat.utils import (
     create_file,
+    publish_chat_unread_counts,
     update_group_chat_users,
     usernames_to_add_and_remove_validations,
+    with_cursor,
 )
 from apps.common.exceptions import RequestError
 from apps.common.error import ErrorCode
+from apps.common.models import Change
+from apps.common.sync import read_changes
 from apps.common.serializers import SuccessResponseSerializer
 from apps.common.responses import CustomResponse
 
@@ -26,6 +33,10 @@ from .serializers import (
     ChatSerializer,
     ChatsResponseDataSerializer,
     ChatsResponseSerializer,
+    ChatsSyncResponseSerializer,
+    ChatsSyncSerializer,
+    ChatsUnreadCountsResponseSerializer,
+    ChatsUnreadCountsSerializer,
     GroupChatCreateResponseDataSerializer,
     GroupChatCreateResponseSerializer,
     GroupChatSerializer,
@@ -38,6 +49,27 @@ from .serializers import (
 
 tags = ["Chats"]
 
+latest_message_related = (
+    "latest_message",
+    "latest_message__sender",
+    "latest_message__sender__avatar",
+    "latest_message__file",
+)
+
+
+# Bounds of "since" fetches for cursors that don't point to a message
+CURSOR_START = datetime(1970, 1, 1, tzinfo=timezone.utc)
+CURSOR_END_ID = UUID(int=2**128 - 1)
+
+
+def get_user_chats(user):
+    chats = (
+        Chat.objects.filter(Q(owner=user) | Q(users__id=user.id))
+        .select_related("owner", "owner__avatar", "image", *latest_message_related)
+        .distinct()
+    )
+    return with_cursor(chats, user)
+
 
 class ChatsView(APIView):
     serializer_class = ChatSerializer
@@ -46,23 +78,8 @@ class ChatsView(APIView):
     paginator_class.page_size = 200
     permission_classes = (IsAuthenticatedCustom,)
 
-    async def get_queryset(self, user):
-        chats = (
-            Chat.objects.filter(Q(owner=user) | Q(users__id=user.id))
-            .select_related("owner", "owner__avatar", "image")
-            .prefetch_related(
-                Prefetch(
-                    "messages",
-                    queryset=Message.objects.select_related(
-                        "sender", "sender__avatar", "file"
-                    ).order_by("-created_at"),
-                    to_attr="lmessages",
-                )
-            )
-            .distinct()
-        )
-        chats = await sync_to_async(list)(chats)
-        return chats
+    def get_queryset(self, user):
+        return get_user_chats(user)
 
     @extend_schema(
         summary="Retrieve User Chats",
@@ -83,8 +100,8 @@ class ChatsView(APIView):
     )
     async def get(self, request):
         user = request.user
-        chats = await self.get_queryset(user)
-        paginated_data = self.paginator_class.paginate_queryset(chats, request)
+        chats = self.get_queryset(user)
+        paginated_data = await self.paginator_class.apaginate_queryset(chats, request)
         serializer = ChatsResponseDataSerializer(paginated_data)
         return CustomResponse.success(message="Chats fetched", data=serializer.data)
 
@@ -161,6 +178,7 @@ class ChatsView(APIView):
         message = await Message.objects.acreate(
             chat=chat, sender=user, text=data.get("text"), file=file
         )
+        await publish_chat_unread_counts(chat.id, exclude_user_id=user.id)
         serializer = MessageCreateResponseDataSerializer(
             message, context={"file_upload_status": file_upload_status}
         )
@@ -169,32 +187,121 @@ class ChatsView(APIView):
         )
 
 
+class ChatsUnreadCountsView(APIView):
+    permission_classes = (IsAuthenticatedCustom,)
+
+    @extend_schema(
+        summary="Retrieve Unread Messages Counts",
+        description="""
+            This endpoint retrieves the number of unread messages in each of the current user chats, for badges.
+            Only chats with unread messages are listed.
+            Each chat's count is also pushed to the notifications socket whenever it changes:
+                {"status": "UNREAD_COUNT", "chat_id": "fe4e0235-80fc-4c94-b15e-3da63226f8ab", "unread_count": 3}
+        """,
+        tags=tags,
+        responses=ChatsUnreadCountsResponseSerializer,
+    )
+    async def get(self, request):
+        chats = [
+            {"chat_id": chat_id, "unread_count": unread_count}
+            async for chat_id, unread_count in ChatCursor.objects.filter(
+                user_id=request.user.id, unread_count__gt=0
+            ).values_list("chat_id", "unread_count")
+        ]
+        serializer = ChatsUnreadCountsSerializer(
+            {"total": sum(chat["unread_count"] for chat in chats), "chats": chats}
+        )
+        return CustomResponse.success(
+            message="Unread messages counts fetched", data=serializer.data
+        )
+
+
+class ChatsSyncView(APIView):
+    permission_classes = (IsAuthenticatedCustom,)
+
+    @extend_schema(
+        summary="Sync Chats",
+        description="""
+            This endpoint retrieves the chats and messages changed since a sync token, to catch up after reconnecting
+            instead of reloading the chats and their messages.
+            Call it without a token after loading the chats, to get the token to sync from.
+            Then call it with the token from the last response, until has_more is false.
+            Chats and messages appear with their current data, or in deleted when they're gone (or you left the chat).
+            The messages of a deleted chat are gone with it and aren't listed.
+            A token older than the sync retention period expires with a 410 error, reload the chats then.
+        """,
+        tags=tags,
+        responses=ChatsSyncResponseSerializer,
+        parameters=[
+            OpenApiParameter(
+                name="token",
+                description="The sync token from the last sync response",
+                required=False,
+                type=str,
+            )
+        ],
+    )
+    async def get(self, request):
+        user = request.user
+        chat_ids = Chat.objects.filter(Q(owner=user) | Q(users__id=user.id)).values(
+            "id"
+        )
+        changes = Change.objects.filter(Q(chat_id__in=chat_ids) | Q(user_id=user.id))
+        objects, token, has_more = await read_changes(changes, request.GET.get("token"))
+        chat_ops, message_ops = objects["CHAT"], objects["MESSAGE"]
+        chats = messages = []
+        if chat_ops["UPSERT"]:
+            chats = await sync_to_async(list)(
+                get_user_chats(user).filter(id__in=chat_ops["UPSERT"])
+            )
+        if message_ops["UPSERT"]:
+            messages = await sync_to_async(list)(
+                Message.objects.filter(
+                    id__in=message_ops["UPSERT"], chat_id__in=chat_ids
+                )
+                .select_related("sender", "sender__avatar", "file")
+                .order_by("created_at", "id")
+            )
+        serializer = ChatsSyncSerializer(
+            {
+                "token": token,
+                "has_more": has_more,
+                "chats": chats,
+                "messages": messages,
+                "deleted": {
+                    "chats": chat_ops["DELETE"],
+                    "messages": message_ops["DELETE"],
+                },
+            }
+        )
+        return CustomResponse.success(message="Chats synced", data=serializer.data)
+
+
 class ChatView(APIView):
     serializer_class = MessagesSerializer
     permission_classes = (IsAuthenticatedCustom,)
     paginator_class = CustomPagination()
     paginator_class.page_size = 400
+    paginator_class.allow_cursor = True
 
     async def get_object(self, user, chat_id):
-        chat = (
-            await Chat.objects.filter(Q(owner=user) | Q(users__id=user.id))
-            .select_related("owner", "owner__avatar", "image")
+        chats = (
+            Chat.objects.filter(Q(owner=user) | Q(users__id=user.id))
+            .select_related("owner", "owner__avatar", "image", *latest_message_related)
             .prefetch_related(
-                Prefetch(
-                    "messages",
-                    queryset=Message.objects.select_related(
-                        "sender", "sender__avatar", "file"
-                    ).order_by("-created_at"),
-                    to_attr="lmessages",
-                ),
                 Prefetch(
                     "users",
                     queryset=User.objects.select_related("avatar"),
                     to_attr="recipients",
                 ),
+                Prefetch(
+                    "cursors",
+                    queryset=ChatCursor.objects.select_related("user", "user__avatar"),
+                    to_attr="member_cursors",
+                ),
             )
-            .aget_or_none(id=chat_id)
         )
+        chat = await with_cursor(chats, user).aget_or_none(id=chat_id)
         if not chat:
             raise RequestError(
                 err_code=ErrorCode.NON_EXISTENT,
@@ -203,22 +310,151 @@ class ChatView(APIView):
             )
         return chat
 
+    async def get_anchor(self, chat, message_id):
+        try:
+            message_id = UUID(message_id)
+        except ValueError:
+            raise RequestError(
+                err_code=ErrorCode.INVALID_VALUE,
+                err_msg="Invalid message ID",
+                status_code=404,
+            )
+        message = await Message.objects.filter(chat_id=chat.id).aget_or_none(
+            id=message_id
+        )
+        if not message:
+            raise RequestError(
+                err_code=ErrorCode.NON_EXISTENT,
+                err_msg="Chat has no message with that ID",
+                status_code=404,
+            )
+        return message
+
+    def get_cursor_anchor(self, chat, user, since):
+        if since not in ("read", "delivered"):
+            raise RequestError(
+                err_code=ErrorCode.INVALID_VALUE,
+                err_msg="Invalid 'since' value",
+                status_code=404,
+            )
+        cursor = next((c for c in chat.member_cursors if c.user_id == user.id), None)
+        if not cursor:
+            # Nothing read or delivered yet
+            return Message(id=CURSOR_END_ID, created_at=CURSOR_START)
+        # A deleted cursor message leaves its time, so skip the messages sent at that time
+        message_id = getattr(cursor, f"last_{since}_message_id") or CURSOR_END_ID
+        created_at = getattr(cursor, f"{since}_at") or CURSOR_START
+        return Message(id=message_id, created_at=created_at)
+
     @extend_schema(
         summary="Retrieve messages from a Chat",
         description="""
             This endpoint retrieves all messages in a chat.
+            With mark_read=true, fetching the latest messages (first page) also marks the chat as read.
         """,
         tags=tags,
         responses=ChatResponseSerializer,
+        parameters=[
+            OpenApiParameter(
+                name="page",
+                description="Retrieve a particular page of messages. Defaults to 1",
+                required=False,
+                type=int,
+            ),
+            OpenApiParameter(
+                name="cursor",
+                description="""
+                    Opt in to cursor pagination. Leave empty for the first page, then use the next or prev cursor from the response
+                """,
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="before",
+                description="Retrieve the messages sent before the message with this ID",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="after",
+                description="Retrieve the messages sent after the message with this ID",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="mark_read",
+                description="Mark the chat as read, with the first page of the latest messages. Defaults to false",
+                required=False,
+                type=bool,
+            ),
+            OpenApiParameter(
+                name="since",
+                description="""
+                    Retrieve the messages sent after your cursor: 'read' for your last read message, 'delivered' for your last delivered one
+                """,
+                required=False,
+                type=str,
+            ),
+        ],
     )
     async def get(self, request, *args, **kwargs):
         user = request.user
         chat = await self.get_object(user, kwargs["chat_id"])
-        messages = await sync_to_async(list)(chat.lmessages)
-        paginated_data = self.paginator_class.paginate_queryset(messages, request)
+        messages = (
+            Message.objects.filter(chat_id=chat.id)
+            .select_related("sender", "sender__avatar", "file")
+            .order_by("-created_at")
+        )
+        before = request.GET.get("before")
+        after = request.GET.get("after")
+        if before and after:
+            raise RequestError(
+                err_code=ErrorCode.INVALID_ENTRY,
+                err_msg="Use either 'before' or 'after', not both",
+                status_code=422,
+            )
+        since = request.GET.get("since")
+        if since and (before or after):
+            raise RequestError(
+                err_code=ErrorCode.INVALID_ENTRY,
+                err_msg="Use either 'since' or 'before' and 'after', not both",
+                status_code=422,
+            )
+        if before or after:
+            anchor = await self.get_anchor(chat, before or after)
+            paginated_data = await self.paginator_class.apaginate_queryset_from(
+                messages, request, anchor, reverse=bool(after)
+            )
+        elif since:
+            anchor = self.get_cursor_anchor(chat, user, since)
+            paginated_data = await self.paginator_class.apaginate_queryset_from(
+                messages, request, anchor, reverse=True
+            )
+        else:
+            paginated_data = await self.paginator_class.apaginate_queryset(
+                messages, request
+            )
+            first_page = (
+                not request.GET.get("cursor") and request.GET.get("page", "1") == "1"
+            )
+            # Only on request, so prefetches and retries don't move the cursors
+            if first_page and request.GET.get("mark_read") == "true":
+                if await mark_chat_read(chat, user):
+                    self.set_read(chat, user)
+                    await publish_receipts(chat.id, user)
         serializer = self.serializer_class({"chat": chat, "messages": paginated_data})
         return CustomResponse.success(message="Messages fetched", data=serializer.data)
 
+    def set_read(self, chat, user):
+        # Reflect the moved cursor in the response
+        latest_message_id = chat.latest_message_id
+        chat.last_read_message_id = chat.last_delivered_message_id = latest_message_id
+        chat.unread_count = 0
+        for cursor in chat.member_cursors:
+            if cursor.user_id == user.id:
+                cursor.last_read_message_id = latest_message_id
+                cursor.last_delivered_message_id = latest_message_id
+
     @extend_schema(
         summary="Update a Group Chat",
         description="""
@@ -365,18 +601,17 @@ class MessageView(APIView):
         message_id = kwargs["message_id"]
         message = await self.get_object(message_id, user)
         chat = message.chat
-        messages_count = await chat.messages.acount()
+        other_messages = chat.messages.exclude(id=message.id)
 
         # Send message deletion in socket
-        await send_message_deletion_in_socket(
-            request.is_secure(), request.get_host(), chat.id, message_id
-        )
+        await send_message_deletion_in_socket(chat.id, message_id)
 
         # Delete message and chat if its the last message in the dm being deleted
-        if messages_count == 1 and chat.ctype == "DM":
+        if chat.ctype == "DM" and not await other_messages.aexists():
             await chat.adelete()  # Message deletes if chat gets deleted (CASCADE)
         else:
-            await message.adelete()
+            await message.adelete()  # Falls the chat back to the previous message
+            await publish_chat_unread_counts(chat.id, exclude_user_id=user.id)
         return CustomResponse.success(message="Message deleted")
 
 
@@ -430,7 +665,7 @@ class ChatGroupCreateView(APIView):
         # Create Chat
         chat = await Chat.objects.acreate(**data)
         chat.recipients = users_to_add
-        await sync_to_async(update_group_chat_users)(chat, "add", users_to_add)
+        await update_group_chat_users(chat, "add", users_to_add)
 
         serializer = GroupChatCreateResponseDataSerializer(
             chat, context={"file_upload_status": file_upload_status, "request": request}
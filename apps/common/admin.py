@@ -1,9 +1,19 @@
 from django.contrib import admin
 from django.utils.safestring import mark_safe
 from cities_light.models import SubRegion
+from apps.common.models import Job
 
 admin.site.site_header = mark_safe(
     '<strong style="font-weight:bold;">SOCIALNET ADMIN</strong>'
 )
 
 admin.site.unregister(SubRegion)
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "attempts", "run_at", "created_at")
+    list_filter = ("name", "status")
+    readonly_fields = ("last_error",)
+
+
+admin.site.register(Job, JobAdmin)
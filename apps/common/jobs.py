@@ -0,0 +1,155 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+from apps.common.models import Job
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Job name -> handler taking the job's payload. Apps register theirs in a `jobs` module
+handlers = {}
+
+
+def job(name):
+    def register(func):
+        handlers[name] = func
+        return func
+
+    return register
+
+
+def enqueue(name, payload=None, delay=0):
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+async def aenqueue(name, payload=None, delay=0):
+    return await sync_to_async(enqueue)(name, payload, delay)
+
+
+class Mailer:
+    """
+    Sends emails over one SMTP connection kept open for the life of the worker,
+    instead of a new connection per email.
+    """
+
+    def __init__(self):
+        self.connection = None
+
+    def send(self, message):
+        if not self.connection:
+            self.connection = get_connection()
+            self.connection.open()
+        message.connection = self.connection
+        try:
+            message.send()
+        except Exception:
+            # Reconnect on the next email
+            self.close()
+            raise
+
+    def close(self):
+        if self.connection:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+
+mailer = Mailer()
+
+
+@job("send_email")
+def send_email(payload):
+    email_message = EmailMessage(
+        subject=payload["subject"], body=payload["body"], to=payload["to"]
+    )
+    email_message.content_subtype = "html"
+    mailer.send(email_message)
+
+
+class JobWorker:
+    """
+    Runs due jobs in batches. Each batch is claimed with SELECT .. FOR UPDATE SKIP LOCKED
+    and leased for `lease_seconds`, so any number of workers can share the table without
+    running a job twice, and the jobs of a worker that died run again once it's over.
+    Failed jobs are retried with exponential backoff, up to `max_attempts` runs.
+    """
+
+    def __init__(self, batch_size, max_attempts, backoff_seconds, lease_seconds):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        autodiscover_modules("jobs")
+
+    def run(self, job):
+        handler = handlers.get(job.name)
+        if not handler:
+            raise LookupError(f"No handler for '{job.name}' jobs")
+        # The job is deleted with the handler's writes, so they're never made twice
+        with transaction.atomic():
+            handler(job.payload)
+            Job.objects.filter(id=job.id).delete()
+
+    def claim(self):
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = list(
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(status="PENDING", run_at__lte=now)
+                .order_by("run_at")[: self.batch_size]
+            )
+            Job.objects.filter(id__in=[job.id for job in jobs]).update(
+                run_at=now + timedelta(seconds=self.lease_seconds),
+                attempts=F("attempts") + 1,
+            )
+        for job in jobs:
+            job.attempts += 1
+        return jobs
+
+    def run_batch(self):
+        # Jobs run once the claim is committed, so slow ones (like SMTP sends)
+        # don't hold the row locks
+        jobs = self.claim()
+        failed = []
+        for job in jobs:
+            try:
+                self.run(job)
+            except Exception as e:
+                logger.error(f"Job {job.name} ({job.id}) failed: {e!r}")
+                job.last_error = repr(e)
+                if job.attempts >= self.max_attempts:
+                    job.status = "FAILED"
+                else:
+                    delay = self.backoff_seconds * 2 ** (job.attempts - 1)
+                    job.run_at = timezone.now() + timedelta(seconds=delay)
+                failed.append(job)
+        Job.objects.bulk_update(failed, ["last_error", "status", "run_at"])
+        return len(jobs)
+
+    def close(self):
+        mailer.close()
+
+
+def run_pending_jobs():
+    # Runs every due job in this process, for tests and one-off use
+    worker = JobWorker(
+        batch_size=settings.JOBS_BATCH_SIZE,
+        max_attempts=settings.JOBS_MAX_ATTEMPTS,
+        backoff_seconds=settings.JOBS_BACKOFF_SECONDS,
+        lease_seconds=settings.JOBS_LEASE_SECONDS,
+    )
+    try:
+        while worker.run_batch():
+            pass
+    finally:
+        worker.close()
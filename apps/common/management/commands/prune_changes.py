@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.common.models import Change
+from datetime import timedelta
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Delete the sync changes older than SYNC_RETENTION_DAYS, whose tokens have expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, **options) -> None:
+        batch_size = options["batch_size"]
+        cutoff = timezone.now() - timedelta(days=settings.SYNC_RETENTION_DAYS)
+        logger.info("Pruning sync changes")
+        pruned = 0
+        while True:
+            ids = list(
+                Change.objects.filter(created_at__lt=cutoff)
+                .order_by("created_at")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted, _ = Change.objects.filter(id__in=ids).delete()
+            pruned += deleted
+        logger.info(f"{pruned} sync changes pruned")
@@ -0,0 +1,128 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import (
+    Count,
+    DateTimeField,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from apps.accounts.models import User
+from apps.chat.models import ChatCursor, Message
+from apps.profiles.models import Notification, NotificationReadMark
+from datetime import datetime, timezone
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def get_notification_counts(user_ids):
+    # Unread notifications per user, ADMIN broadcasts aside as they're counted at read time
+    read_by = Notification.read_by.through.objects.filter(
+        notification_id=OuterRef("notification_id"), user_id=OuterRef("user_id")
+    )
+    return dict(
+        Notification.receivers.through.objects.filter(user_id__in=user_ids)
+        .exclude(notification__ntype="ADMIN")
+        .filter(
+            Q(user__notifications_read_mark__read_at=None)
+            | Q(
+                notification__created_at__gt=F("user__notifications_read_mark__read_at")
+            )
+        )
+        .exclude(Exists(read_by))
+        .order_by()
+        .values("user_id")
+        .annotate(total=Count("id"))
+        .values_list("user_id", "total")
+    )
+
+
+def reconcile_notifications_batch(user_ids):
+    with transaction.atomic():
+        marks = {
+            mark.user_id: mark
+            for mark in NotificationReadMark.objects.select_for_update().filter(
+                user_id__in=user_ids
+            )
+        }
+        counts = get_notification_counts(user_ids)
+        changed = []
+        for user_id in user_ids:
+            actual = counts.get(user_id, 0)
+            mark = marks.get(user_id)
+            if (mark.unread_count if mark else 0) != actual:
+                mark = mark or NotificationReadMark(user_id=user_id)
+                mark.unread_count = actual
+                changed.append(mark)
+        NotificationReadMark.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["unread_count"],
+        )
+    return len(changed)
+
+
+def reconcile_chat_cursors_batch(ids):
+    unread = (
+        Message.objects.filter(
+            chat_id=OuterRef("chat_id"),
+            created_at__gt=Coalesce(
+                OuterRef("read_at"), Value(EPOCH), output_field=DateTimeField()
+            ),
+            # Messages from before the member joined were never counted
+            created_at__gte=OuterRef("created_at"),
+        )
+        .exclude(sender_id=OuterRef("user_id"))
+        .order_by()
+        .values("chat_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    with transaction.atomic():
+        cursors = list(
+            ChatCursor.objects.select_for_update()
+            .filter(id__in=ids)
+            .annotate(actual=Coalesce(Subquery(unread), 0))
+        )
+        changed = []
+        for cursor in cursors:
+            if cursor.unread_count != cursor.actual:
+                cursor.unread_count = cursor.actual
+                changed.append(cursor)
+        ChatCursor.objects.bulk_update(changed, ["unread_count"])
+    return len(changed)
+
+
+class Command(BaseCommand):
+    help = "Rebuild and reconcile the unread notifications and chat messages counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, **options) -> None:
+        batch_size = options["batch_size"]
+        for name, model, reconcile in (
+            ("notifications", User, reconcile_notifications_batch),
+            ("chat messages", ChatCursor, reconcile_chat_cursors_batch),
+        ):
+            logger.info(f"Reconciling unread {name} counts")
+            last_id, fixed = None, 0
+            while True:
+                ids = model.objects.order_by("id")
+                if last_id:
+                    ids = ids.filter(id__gt=last_id)
+                ids = list(ids.values_list("id", flat=True)[:batch_size])
+                if not ids:
+                    break
+                fixed += reconcile(ids)
+                last_id = ids[-1]
+            logger.info(f"{fixed} unread {name} counts fixed")
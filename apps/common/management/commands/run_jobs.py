@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.common.jobs import JobWorker
+import logging, time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs (emails, notification fan-out, cleanups) as they fall due"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.JOBS_BATCH_SIZE)
+        parser.add_argument(
+            "--sleep", type=float, default=1.0, help="Seconds to wait when idle"
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once no job is due"
+        )
+
+    def handle(self, **options) -> None:
+        worker = JobWorker(
+            batch_size=options["batch_size"],
+            max_attempts=settings.JOBS_MAX_ATTEMPTS,
+            backoff_seconds=settings.JOBS_BACKOFF_SECONDS,
+            lease_seconds=settings.JOBS_LEASE_SECONDS,
+        )
+        logger.info("Job worker started")
+        try:
+            while True:
+                count = worker.run_batch()
+                if count:
+                    logger.info(f"{count} jobs run")
+                elif options["once"]:
+                    break
+                else:
+                    time.sleep(options["sleep"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.close()
+        logger.info("Job worker stopped")
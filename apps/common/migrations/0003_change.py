@@ -0,0 +1,73 @@
+# Generated by Django 4.2.3 on 2026-10-17 23:27
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0002_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Change",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("CHAT", "CHAT"),
+                            ("MESSAGE", "MESSAGE"),
+                            ("POST", "POST"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "op",
+                    models.CharField(
+                        choices=[("UPSERT", "UPSERT"), ("DELETE", "DELETE")],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.UUIDField()),
+                ("object_slug", models.CharField(max_length=100, null=True)),
+                ("chat_id", models.UUIDField(null=True)),
+                ("user_id", models.UUIDField(null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("chat_id__isnull", False)),
+                        fields=["chat_id", "created_at", "id"],
+                        name="change_chat_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(("user_id__isnull", False)),
+                        fields=["user_id", "created_at", "id"],
+                        name="change_user_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(("kind", "POST")),
+                        fields=["created_at", "id"],
+                        name="change_post_idx",
+                    ),
+                    models.Index(fields=["created_at"], name="change_created_at_idx"),
+                ],
+            },
+        ),
+    ]
@@ -1,8 +1,58 @@
 import uuid
 
 from django.db import models
+from django.utils import timezone
+from django.utils.text import slugify
 from .managers import GetOrNoneManager
 
+BASE36_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def base36(value):
+    # Shortest slug-safe form of a UUID (25 chars), still one-to-one with it
+    number, digits = value.int, ""
+    while number:
+        number, digit = divmod(number, 36)
+        digits = BASE36_DIGITS[digit] + digits
+    return digits or "0"
+
+
+class IdSlugField(models.SlugField):
+    """
+    Slug of `populate_from(instance)` followed by the instance's id, e.g john-doe-<id>.
+    The id alone makes it unique, so no lookups for a free slug are needed on save.
+    It's set on the first save, clear it to have it derived again.
+    """
+
+    def __init__(self, *args, populate_from=None, id_format=str, **kwargs):
+        self.populate_from = populate_from
+        self.id_format = id_format
+        kwargs.setdefault("max_length", 100)
+        kwargs.setdefault("editable", False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["populate_from"] = self.populate_from
+        if self.id_format is not str:
+            kwargs["id_format"] = self.id_format
+        if not self.editable:
+            del kwargs["editable"]
+        return name, path, args, kwargs
+
+    def make_slug(self, instance):
+        suffix = self.id_format(instance.pk)
+        max_prefix_length = self.max_length - len(suffix) - 1
+        prefix = slugify(self.populate_from(instance))[:max_prefix_length].strip("-")
+        return f"{prefix}-{suffix}" if prefix else suffix
+
+    def pre_save(self, instance, add):
+        value = getattr(instance, self.attname)
+        if not value:
+            value = self.make_slug(instance)
+            setattr(instance, self.attname, value)
+        return value
+
 
 class BaseModel(models.Model):
     id = models.UUIDField(
@@ -22,3 +72,87 @@ class File(BaseModel):
 
     def __str__(self):
         return str(self.id)
+
+
+JOB_STATUS_CHOICES = (
+    ("PENDING", "PENDING"),
+    ("FAILED", "FAILED"),
+)
+
+
+class Job(BaseModel):
+    """
+    A background job run by the `run_jobs` worker (see apps.common.jobs).
+    Jobs are deleted once done, the ones still failing after their retries are kept as FAILED.
+    """
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    status = models.CharField(
+        max_length=20, choices=JOB_STATUS_CHOICES, default="PENDING"
+    )
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["run_at"],
+                condition=models.Q(status="PENDING"),
+                name="job_pending_run_at_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ------ {self.status}"
+
+
+CHANGE_KIND_CHOICES = (
+    ("CHAT", "CHAT"),
+    ("MESSAGE", "MESSAGE"),
+    ("POST", "POST"),
+)
+
+CHANGE_OP_CHOICES = (
+    ("UPSERT", "UPSERT"),
+    ("DELETE", "DELETE"),
+)
+
+
+class Change(BaseModel):
+    """
+    A write to a synced object, read back by the delta sync endpoints (see apps.common.sync).
+    Chat and message changes are scoped to the chat's members through `chat_id`, or to a
+    single user through `user_id` (e.g a removed member's tombstone). Post changes are public.
+    """
+
+    kind = models.CharField(max_length=20, choices=CHANGE_KIND_CHOICES)
+    op = models.CharField(max_length=20, choices=CHANGE_OP_CHOICES)
+    object_id = models.UUIDField()
+    object_slug = models.CharField(max_length=100, null=True)  # Posts are known by slug
+    chat_id = models.UUIDField(null=True)
+    user_id = models.UUIDField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["chat_id", "created_at", "id"],
+                condition=models.Q(chat_id__isnull=False),
+                name="change_chat_idx",
+            ),
+            models.Index(
+                fields=["user_id", "created_at", "id"],
+                condition=models.Q(user_id__isnull=False),
+                name="change_user_idx",
+            ),
+            models.Index(
+                fields=["created_at", "id"],
+                condition=models.Q(kind="POST"),
+                name="change_post_idx",
+            ),
+            models.Index(fields=["created_at"], name="change_created_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.op} ------ {self.object_id}"
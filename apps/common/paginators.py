@@ -1,14 +1,27 @@
+from asgiref.sync import sync_to_async
 from django.core.paginator import InvalidPage
+from django.db.models import Q
 from rest_framework.pagination import PageNumberPagination
 from apps.common.error import ErrorCode
 
 from apps.common.exceptions import RequestError
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from uuid import UUID
+import json
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = (
         "page_size"  # Optional: allow clients to override the page size
     )
+    cursor_query_param = "cursor"
+    allow_cursor = False  # Set to True on views that support keyset pagination
+
+    def invalid_page(self):
+        return RequestError(
+            err_code=ErrorCode.INVALID_PAGE, err_msg="Invalid Page", status_code=404
+        )
 
     def paginate_queryset(self, queryset, request, view=None):
         """
@@ -25,9 +38,7 @@ class CustomPagination(PageNumberPagination):
         try:
             self.page = paginator.page(page_number)
         except InvalidPage:
-            raise RequestError(
-                err_code=ErrorCode.INVALID_PAGE, err_msg="Invalid Page", status_code=404
-            )
+            raise self.invalid_page()
 
         self.request = request
         return {
@@ -36,3 +47,148 @@ class CustomPagination(PageNumberPagination):
             "current_page": page_number,
             "last_page": paginator.num_pages,
         }
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async version of `paginate_queryset` for querysets.
+        The total is taken with a COUNT query and only the rows of the
+        requested page are fetched (LIMIT/OFFSET), so the whole table is never loaded.
+        """
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        if self.allow_cursor and self.cursor_query_param in request.query_params:
+            cursor = self.decode_cursor(request.query_params[self.cursor_query_param])
+            return await self.apaginate_queryset_by_cursor(queryset, page_size, cursor)
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Count in the database without the select_related joins and ordering
+        paginator.count = await queryset.select_related(None).order_by().acount()
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            page_number = paginator.validate_number(page_number)
+        except InvalidPage:
+            raise self.invalid_page()
+
+        offset = (page_number - 1) * page_size
+        items = await sync_to_async(list)(queryset[offset : offset + page_size])
+        return {
+            "items": items,
+            "per_page": page_size,
+            "current_page": page_number,
+            "last_page": paginator.num_pages,
+        }
+
+    async def apaginate_queryset_from(self, queryset, request, obj, reverse=False):
+        """
+        Keyset page of the rows right before `obj` (older), or right after it if reverse.
+        """
+        page_size = self.get_page_size(request)
+        cursor = (obj.created_at, obj.id, reverse)
+        return await self.apaginate_queryset_by_cursor(queryset, page_size, cursor)
+
+    async def apaginate_queryset_by_cursor(self, queryset, page_size, cursor):
+        """
+        Keyset pagination on (created_at, id), latest first.
+        An empty cursor returns the first page, then clients follow the opaque
+        `next` and `prev` cursors. No count or offset is needed, so every page costs the same.
+        """
+        return await self.apaginate_querysets_by_cursor([queryset], page_size, cursor)
+
+    async def apaginate_querysets_by_cursor(self, querysets, page_size, cursor):
+        """
+        Keyset pagination of the rows of several querysets merged on (created_at, id).
+        Each queryset is read with its own keyset query, then the pages are merged.
+        """
+        reverse = False
+        if cursor:
+            created_at, id, reverse = cursor
+            if reverse:
+                filters = Q(created_at__gte=created_at) & (
+                    Q(created_at__gt=created_at) | Q(id__gt=id)
+                )
+            else:
+                filters = Q(created_at__lte=created_at) & (
+                    Q(created_at__lt=created_at) | Q(id__lt=id)
+                )
+            querysets = [queryset.filter(filters) for queryset in querysets]
+        ordering = ("created_at", "id") if reverse else ("-created_at", "-id")
+
+        # Fetch one extra row to know if there's more in the direction of travel
+        items = []
+        for queryset in querysets:
+            items += await sync_to_async(list)(
+                queryset.order_by(*ordering)[: page_size + 1]
+            )
+        if len(querysets) > 1:
+            items.sort(key=lambda item: (item.created_at, item.id), reverse=not reverse)
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        if reverse:
+            items.reverse()
+        has_next = has_more if not reverse else True
+        has_prev = has_more if reverse else cursor is not None
+
+        return {
+            "items": items,
+            "per_page": page_size,
+            "next": self.encode_cursor(items[-1]) if has_next and items else None,
+            "prev": self.encode_cursor(items[0], True) if has_prev and items else None,
+        }
+
+    async def apaginate_queryset_by_score(self, queryset, request, score_field):
+        """
+        Keyset pagination on an annotated score (e.g a search rank), highest first.
+        Clients follow the opaque `next` cursor, so no count or offset is needed.
+        """
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            score, id = self.decode_score_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{f"{score_field}__lt": score})
+                | Q(**{score_field: score, "id__lt": id})
+            )
+        queryset = queryset.order_by(f"-{score_field}", "-id")
+        items = await sync_to_async(list)(queryset[: page_size + 1])
+        has_next = len(items) > page_size
+        items = items[:page_size]
+        next = None
+        if has_next:
+            next = self.encode_data(
+                {"s": getattr(items[-1], score_field), "i": str(items[-1].id)}
+            )
+        return {"items": items, "per_page": page_size, "next": next}
+
+    def encode_data(self, data):
+        return urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+    def decode_score_cursor(self, cursor):
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode()))
+            return float(data["s"]), UUID(data["i"])
+        except (ValueError, TypeError, KeyError):
+            raise RequestError(
+                err_code=ErrorCode.INVALID_PAGE,
+                err_msg="Invalid Cursor",
+                status_code=404,
+            )
+
+    def encode_cursor(self, obj, reverse=False):
+        data = {"c": obj.created_at.isoformat(), "i": str(obj.id), "r": reverse}
+        return self.encode_data(data)
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode()))
+            return datetime.fromisoformat(data["c"]), UUID(data["i"]), bool(data["r"])
+        except (ValueError, TypeError, KeyError):
+            raise RequestError(
+                err_code=ErrorCode.INVALID_PAGE,
+                err_msg="Invalid Cursor",
+                status_code=404,
+            )
@@ -16,5 +16,9 @@ class ErrorDataResponseSerializer(ErrorResponseSerializer):
 
 class PaginatedResponseDataSerializer(serializers.Serializer):
     per_page = serializers.IntegerField()
-    current_page = serializers.IntegerField()
-    last_page = serializers.IntegerField()
+    # Page number pagination
+    current_page = serializers.IntegerField(required=False)
+    last_page = serializers.IntegerField(required=False)
+    # Cursor pagination
+    next = serializers.CharField(required=False)
+    prev = serializers.CharField(required=False)
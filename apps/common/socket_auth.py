@@ -2,7 +2,6 @@ import json
 
 from django.conf import settings
 from apps.accounts.auth import Authentication
-from asgiref.sync import sync_to_async
 
 
 class SocketAuthMiddleware:
@@ -26,7 +25,7 @@ class SocketAuthMiddleware:
             ):  # If the app is making the connection itself
                 scope["user"] = token
             else:
-                user = await sync_to_async(Authentication.decodeAuthorization)(token)
+                user = await Authentication.adecodeAuthorization(token)
                 scope["user"] = user
                 if not user:
                     error["message"] = "Auth token is invalid or expired"
@@ -0,0 +1,67 @@
+from channels.layers import get_channel_layer
+import asyncio, logging
+
+logger = logging.getLogger(__name__)
+
+
+class SocketPublisher:
+    """
+    Publishes events to channel layer groups straight from the HTTP process.
+    Events are queued and sent in batches by a background task on the running
+    event loop, so requests don't wait on the channel layer.
+    When the queue is full, the event is sent inline instead of being dropped.
+    Queued events sharing a group and a `key` are coalesced into the latest one.
+    """
+
+    def __init__(self, max_size=1000, batch_size=100):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.queues = {}  # event loop -> (queue, worker task)
+
+    def get_queue(self):
+        loop = asyncio.get_running_loop()
+        entry = self.queues.get(loop)
+        if not entry or entry[1].done():
+            # Forget the queues of closed loops
+            self.queues = {k: v for k, v in self.queues.items() if not k.is_closed()}
+            queue = asyncio.Queue(maxsize=self.max_size)
+            entry = (queue, loop.create_task(self.worker(queue)))
+            self.queues[loop] = entry
+        return entry[0]
+
+    async def publish(self, group, event, key=None):
+        try:
+            self.get_queue().put_nowait((group, event, key))
+        except asyncio.QueueFull:
+            await self.send([(group, event)])
+
+    async def publish_now(self, group, event):
+        # For callers whose event loop doesn't outlive the call (e.g sync code)
+        await self.send([(group, event)])
+
+    async def worker(self, queue):
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty() and len(batch) < self.batch_size:
+                batch.append(queue.get_nowait())
+            await self.send(self.coalesce(batch))
+
+    def coalesce(self, batch):
+        # Keeps the first position and the latest event of each (group, key)
+        events = {}
+        for i, (group, event, key) in enumerate(batch):
+            events[(group, key) if key else i] = (group, event)
+        return list(events.values())
+
+    async def send(self, batch):
+        channel_layer = get_channel_layer()
+        results = await asyncio.gather(
+            *(channel_layer.group_send(group, event) for group, event in batch),
+            return_exceptions=True,
+        )
+        for (group, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to publish to {group}: {result!r}")
+
+
+socket_publisher = SocketPublisher()
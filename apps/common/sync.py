@@ -0,0 +1,100 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from apps.common.error import ErrorCode
+from apps.common.exceptions import RequestError
+from apps.common.models import CHANGE_KIND_CHOICES, Change
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+from uuid import UUID
+import json
+
+MIN_ID = UUID(int=0)
+
+
+def record_changes(kind, op, object_ids, chat_id=None, user_ids=None, slugs=None):
+    """Logs a write to each object, for each user if `user_ids` is given, in one INSERT."""
+    slugs = slugs or {}
+    Change.objects.bulk_create(
+        [
+            Change(
+                kind=kind,
+                op=op,
+                object_id=object_id,
+                object_slug=slugs.get(object_id),
+                chat_id=chat_id,
+                user_id=user_id,
+            )
+            for object_id in object_ids
+            for user_id in (user_ids or [None])
+        ]
+    )
+
+
+def encode_sync_token(created_at, id):
+    data = {"c": created_at.isoformat(), "i": str(id)}
+    return urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def decode_sync_token(token):
+    try:
+        data = json.loads(urlsafe_b64decode(token.encode()))
+        created_at, id = datetime.fromisoformat(data["c"]), UUID(data["i"])
+    except (ValueError, TypeError, KeyError):
+        raise RequestError(
+            err_code=ErrorCode.INVALID_VALUE,
+            err_msg="Invalid sync token",
+            status_code=404,
+        )
+    if created_at < timezone.now() - timedelta(days=settings.SYNC_RETENTION_DAYS):
+        raise RequestError(
+            err_code=ErrorCode.INVALID_VALUE,
+            err_msg="Sync token expired, reload the data to get a new one",
+            status_code=410,
+        )
+    return created_at, id
+
+
+async def read_changes(changes, token):
+    """
+    Keyset page of the changes after the token, in the order they were made.
+    Returns the latest op of each changed object, as {kind: {"UPSERT": ids, "DELETE": ids}},
+    the token to sync from next time and whether there are more changes already.
+    Without a token, there's nothing to return yet and syncing starts from now.
+    """
+    now = timezone.now()
+    safe_at = now - timedelta(seconds=settings.SYNC_LAG_SECONDS)
+    objects = {kind: {"UPSERT": [], "DELETE": []} for kind, _ in CHANGE_KIND_CHOICES}
+    if not token:
+        return objects, encode_sync_token(safe_at, MIN_ID), False
+
+    created_at, id = decode_sync_token(token)
+    changes = changes.filter(
+        Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=id)
+    ).order_by("created_at", "id")
+    page_size = settings.SYNC_PAGE_SIZE
+    rows = await sync_to_async(list)(
+        changes.values_list(
+            "created_at", "id", "kind", "op", "object_id", "object_slug"
+        )[: page_size + 1]
+    )
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    latest = {}  # (kind, object id) -> (op, slug), of the last change of each object
+    for _, _, kind, op, object_id, slug in rows:
+        latest[(kind, object_id)] = (op, slug)
+    for (kind, object_id), (op, slug) in latest.items():
+        objects[kind][op].append(slug if op == "DELETE" and slug else object_id)
+
+    # Recent changes are held back from the token and sent again next time,
+    # as a change made before them may not be committed yet
+    next_token = token
+    for row in reversed(rows):
+        if row[0] <= safe_at:
+            next_token = encode_sync_token(row[0], row[1])
+            break
+    # The changes after a recent one are recent too, none to page through yet
+    has_more = has_more and rows[-1][0] <= safe_at
+    return objects, next_token, has_more
@@ -7,7 +7,10 @@ from apps.common.error import ErrorCode
 from uuid import UUID
 
 
-def get_user(bearer):
+def get_user(bearer, request=None):
+    # Reuse the user already resolved for this request, if any
+    if request is not None and getattr(request, "_auth_bearer", None) == bearer:
+        return request.user
     user = Authentication.decodeAuthorization(bearer)
     if not user:
         raise RequestError(
@@ -15,6 +18,8 @@ def get_user(bearer):
             err_msg="Auth Token is Invalid or Expired!",
             status_code=401,
         )
+    if request is not None:
+        request._auth_bearer = bearer
     return user
 
 
@@ -27,7 +32,7 @@ class IsAuthenticatedCustom(BasePermission):
                 err_msg="Auth Bearer not provided!",
                 status_code=401,
             )
-        user = get_user(http_auth)
+        user = get_user(http_auth, request)
         request.user = user
         if request.user and request.user.is_authenticated:
             return True
@@ -39,11 +44,24 @@ class IsAuthenticatedOrGuestCustom(BasePermission):
         http_auth = request.META.get("HTTP_AUTHORIZATION")
         request.user = None
         if http_auth:
-            user = get_user(http_auth)
+            user = get_user(http_auth, request)
             request.user = user
         return True
 
 
+class IsAuthenticatedOrGuestOptionalCustom(BasePermission):
+    # For public reads: the user of a valid bearer, a guest for a missing, invalid or expired one
+    def has_permission(self, request, view):
+        http_auth = request.META.get("HTTP_AUTHORIZATION")
+        request.user = None
+        if http_auth:
+            try:
+                request.user = get_user(http_auth, request)
+            except RequestError:
+                pass
+        return True
+
+
 def set_dict_attr(obj, data):
     for attr, value in data.items():
         setattr(obj, attr, value)
@@ -84,10 +102,9 @@ class TestUtil:
         user = User.objects.create_user(**create_user_dict)
         return user
 
-    def auth_token(verified_user):
-        verified_user.access = Authentication.create_access_token(
-            {"user_id": str(verified_user.id), "username": verified_user.username}
-        )
-        verified_user.refresh = Authentication.create_refresh_token()
-        verified_user.save()
-        return verified_user.access
+    def auth_tokens(verified_user, device="default"):
+        # Access and refresh tokens
+        return Authentication.issue_tokens(verified_user, device)
+
+    def auth_token(verified_user, device="default"):
+        return TestUtil.auth_tokens(verified_user, device)[0]
@@ -0,0 +1,10 @@
+from apps.common.jobs import job
+from .models import Post
+from .utils import fanout_post_to_friends
+
+
+@job("fanout_post")
+def fanout_post(payload):
+    post = Post.objects.get_or_none(id=payload["post_id"])
+    if post:
+        fanout_post_to_friends(post)
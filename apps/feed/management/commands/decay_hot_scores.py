@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from apps.feed.models import Post
+from apps.feed.utils import HOT_SCORE_FLOOR, hot_score
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Re-decay the hot scores of ranked posts (run periodically)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, **options) -> None:
+        batch_size = options["batch_size"]
+        logger.info("Decaying hot scores")
+        # Only posts still above the floor, in (hot_score, id) index order from the lowest.
+        # Decayed scores only go down, behind the position, so no post is read twice
+        posts = Post.objects.filter(hot_score__gte=HOT_SCORE_FLOOR).order_by(
+            "hot_score", "id"
+        )
+        last, updated = None, 0
+        while True:
+            rows = posts
+            if last:
+                score, id = last
+                rows = rows.filter(
+                    Q(hot_score__gt=score) | Q(hot_score=score, id__gt=id)
+                )
+            rows = list(rows.values_list("hot_score", "id")[:batch_size])
+            if not rows:
+                break
+            ids = [id for _, id in rows]
+            updated += Post.objects.filter(id__in=ids).update(hot_score=hot_score())
+            last = rows[-1]
+        logger.info(f"{updated} hot scores decayed")
@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from apps.feed.models import Comment, Post, Reaction, Reply
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Model: {counter field: related name of the counted rows}
+COUNTERS = {
+    Post: {"reactions_count": "reactions", "comments_count": "comments"},
+    Comment: {"reactions_count": "reactions", "replies_count": "replies"},
+    Reply: {"reactions_count": "reactions"},
+}
+
+
+def get_counts(model, related_name, ids):
+    rel = model._meta.get_field(related_name)
+    fk = f"{rel.field.name}_id"
+    return dict(
+        rel.related_model.objects.filter(**{f"{fk}__in": ids})
+        .order_by()
+        .values(fk)
+        .annotate(total=Count("id"))
+        .values_list(fk, "total")
+    )
+
+
+def get_summaries(model, ids):
+    fk = f"{model.__name__.lower()}_id"
+    summaries = {}
+    rows = (
+        Reaction.objects.filter(**{f"{fk}__in": ids})
+        .order_by()
+        .values(fk, "rtype")
+        .annotate(total=Count("id"))
+        .values_list(fk, "rtype", "total")
+    )
+    for id, rtype, total in rows:
+        summaries.setdefault(id, {})[rtype] = total
+    return summaries
+
+
+def reconcile_batch(model, counters, ids):
+    # Lock the batch so concurrent increments aren't overwritten
+    with transaction.atomic():
+        objs = list(
+            model.objects.select_for_update()
+            .filter(id__in=ids)
+            .only("id", "reactions_summary", *counters.keys())
+        )
+        counts = {
+            field: get_counts(model, related_name, ids)
+            for field, related_name in counters.items()
+        }
+        summaries = get_summaries(model, ids)
+        changed = []
+        for obj in objs:
+            stale = False
+            for field in counters:
+                actual = counts[field].get(obj.id, 0)
+                if getattr(obj, field) != actual:
+                    setattr(obj, field, actual)
+                    stale = True
+            summary = summaries.get(obj.id, {})
+            if {k: v for k, v in obj.reactions_summary.items() if v} != summary:
+                obj.reactions_summary = summary
+                stale = True
+            if stale:
+                changed.append(obj)
+        model.objects.bulk_update(changed, [*counters, "reactions_summary"])
+    return len(changed)
+
+
+class Command(BaseCommand):
+    help = "Rebuild and reconcile the denormalized post, comment and reply counters and reaction summaries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, **options) -> None:
+        batch_size = options["batch_size"]
+        for model, counters in COUNTERS.items():
+            name = model._meta.verbose_name_plural
+            logger.info(f"Reconciling {name} counters")
+            last_id, fixed = None, 0
+            while True:
+                ids = model.objects.order_by("id")
+                if last_id:
+                    ids = ids.filter(id__gt=last_id)
+                ids = list(ids.values_list("id", flat=True)[:batch_size])
+                if not ids:
+                    break
+                fixed += reconcile_batch(model, counters, ids)
+                last_id = ids[-1]
+            logger.info(f"{fixed} {name} fixed")
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from apps.feed.models import TimelineEntry
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def trim_batch(user_ids, size):
+    # Entries past the latest `size` of each user in the batch
+    stale_ids = (
+        TimelineEntry.objects.filter(user_id__in=user_ids)
+        .annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F("user_id"),
+                order_by=[F("created_at").desc(), F("id").desc()],
+            )
+        )
+        .filter(position__gt=size)
+        .values_list("id", flat=True)
+    )
+    deleted, _ = TimelineEntry.objects.filter(id__in=list(stale_ids)).delete()
+    return deleted
+
+
+class Command(BaseCommand):
+    help = "Trim every home timeline to the latest TIMELINE_SIZE entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, **options) -> None:
+        batch_size = options["batch_size"]
+        logger.info("Trimming timelines")
+        last_id, trimmed = None, 0
+        while True:
+            user_ids = (
+                TimelineEntry.objects.order_by("user_id")
+                .values_list("user_id", flat=True)
+                .distinct()
+            )
+            if last_id:
+                user_ids = user_ids.filter(user_id__gt=last_id)
+            user_ids = list(user_ids[:batch_size])
+            if not user_ids:
+                break
+            trimmed += trim_batch(user_ids, settings.TIMELINE_SIZE)
+            last_id = user_ids[-1]
+        logger.info(f"{trimmed} timeline entries trimmed")
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0002_post_post_created_at_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="reactions_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="replies_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="comments_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="reactions_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="reply",
+            name="reactions_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:38
+
+from django.db import migrations, models
+
+# The hot score of apps.feed.utils at the time, inlined so later changes don't affect it
+SET_HOT_SCORES = """
+UPDATE feed_post SET hot_score = (reactions_count + 2 * comments_count + 1)::float
+    / power(EXTRACT(EPOCH FROM now() - created_at) / 3600 + 2, 1.5)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0004_timeline"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="hot_score",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["hot_score", "id"], name="post_hot_score_id_idx"
+            ),
+        ),
+        migrations.RunSQL(SET_HOT_SCORES, migrations.RunSQL.noop),
+    ]
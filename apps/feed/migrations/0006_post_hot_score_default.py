@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0005_post_hot_score"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="post",
+            name="hot_score",
+            field=models.FloatField(default=0.35355339059327373, editable=False),
+        ),
+    ]
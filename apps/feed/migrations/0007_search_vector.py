@@ -0,0 +1,71 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:39
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def search_vector_trigger(table):
+    # Keep search_vector current on every insert and on updates of text
+    return migrations.RunSQL(
+        sql=f"""
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF text, search_vector ON {table}
+            FOR EACH ROW EXECUTE FUNCTION
+            tsvector_update_trigger(search_vector, 'pg_catalog.english', text);
+            UPDATE {table} SET search_vector = to_tsvector('pg_catalog.english', text);
+        """,
+        reverse_sql=f"DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table};",
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0006_post_hot_score_default"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="reply",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        search_vector_trigger("feed_post"),
+        search_vector_trigger("feed_comment"),
+        search_vector_trigger("feed_reply"),
+        migrations.AddIndex(
+            model_name="comment",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="comment_search_vector_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="post_search_vector_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reply",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="reply_search_vector_idx"
+            ),
+        ),
+    ]
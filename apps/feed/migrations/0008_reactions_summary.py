@@ -0,0 +1,28 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0007_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="reactions_summary",
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="reactions_summary",
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="reply",
+            name="reactions_summary",
+            field=models.JSONField(default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:52
+
+import apps.common.models
+import apps.feed.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0008_reactions_summary"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="comment",
+            name="slug",
+            field=apps.common.models.IdSlugField(
+                max_length=100,
+                populate_from=apps.feed.models.author_name,
+                unique=True,
+                verbose_name="slug",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="slug",
+            field=apps.common.models.IdSlugField(
+                max_length=100,
+                populate_from=apps.feed.models.author_name,
+                unique=True,
+                verbose_name="slug",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="reply",
+            name="slug",
+            field=apps.common.models.IdSlugField(
+                max_length=100,
+                populate_from=apps.feed.models.author_name,
+                unique=True,
+                verbose_name="slug",
+            ),
+        ),
+    ]
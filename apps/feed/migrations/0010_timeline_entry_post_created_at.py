@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0009_deterministic_slugs"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="timelineentry",
+            name="created_at",
+            field=models.DateTimeField(),
+        ),
+    ]
@@ -1,10 +1,13 @@
-from autoslug import AutoSlugField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from apps.accounts.models import User
 from django.utils.translation import gettext_lazy as _
 from apps.common.file_processors import FileProcessor
 
-from apps.common.models import BaseModel, File
+from apps.common.models import BaseModel, File, IdSlugField
+from apps.common.sync import record_changes
 
 # Create your models here.
 
@@ -18,17 +21,43 @@ REACTION_CHOICES = (
 )
 
 
+# Hot score of a post without engagement yet (see apps.feed.utils.hot_score)
+HOT_GRAVITY = 1.5
+HOT_SCORE_NEW_POST = 1 / 2**HOT_GRAVITY
+
+
 def slugify_three_fields(self):
+    # Used by the initial migration
     author = self.author
     return f"{author.first_name}-{author.last_name}-{self.id}"
 
 
+def author_name(self):
+    # The author is already loaded by the views creating posts, comments and replies
+    author = self.author
+    return f"{author.first_name}-{author.last_name}"
+
+
 class Post(BaseModel):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="posts")
     text = models.TextField()
-    slug = AutoSlugField(_("slug"), populate_from=slugify_three_fields, unique=True)
+    slug = IdSlugField(_("slug"), populate_from=author_name, unique=True)
     image = models.ForeignKey(File, on_delete=models.SET_NULL, null=True, blank=True)
 
+    # Denormalized counters (see apps.feed.utils)
+    reactions_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    reactions_summary = models.JSONField(default=dict, editable=False)  # rtype: count
+
+    # Full-text search document, kept current by a database trigger (see migrations)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Time-decayed ranking, refreshed on engagement and by decay_hot_scores (see apps.feed.utils)
+    hot_score = models.FloatField(default=HOT_SCORE_NEW_POST, editable=False)
+
+    # False when the post wasn't pushed to friends' timelines (authors with too many friends)
+    fanned_out = models.BooleanField(default=True, editable=False)
+
     def __str__(self):
         return f"{self.author.full_name} ------ {self.text[:10]}..."
 
@@ -45,17 +74,93 @@ class Post(BaseModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="post_created_at_id_idx"),
+            models.Index(fields=["hot_score", "id"], name="post_hot_score_id_idx"),
+            GinIndex(fields=["search_vector"], name="post_search_vector_idx"),
+            models.Index(
+                fields=["author", "created_at", "id"],
+                condition=models.Q(fanned_out=False),
+                name="post_not_fanned_out_idx",
+            ),
+        ]
+
+
+def post_saved(sender, instance, **kwargs):
+    # Counters and scores change through update() and aren't logged
+    record_changes("POST", "UPSERT", [instance.id])
+
+
+def post_deleted(sender, instance, **kwargs):
+    # Clients know posts by slug
+    record_changes("POST", "DELETE", [instance.id], slugs={instance.id: instance.slug})
+
+
+post_save.connect(post_saved, sender=Post)
+post_delete.connect(post_deleted, sender=Post)
+
+
+class TimelineEntry(BaseModel):
+    """A post pushed to a user's home timeline when it was created."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+    # The post's, so timelines are in posting order however late the fan-out ran
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user.full_name} ------ {self.post_id}"
+
+    class Meta:
+        verbose_name_plural = "Timeline entries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_user_timeline_post"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "created_at", "id"], name="timeline_user_created_idx"
+            ),
+        ]
+
+
+def friendship_deleted(sender, instance, **kwargs):
+    # Posts pushed between former friends leave their timelines
+    if instance.status != "ACCEPTED":
+        return
+    TimelineEntry.objects.filter(
+        models.Q(user_id=instance.requester_id, post__author_id=instance.requestee_id)
+        | models.Q(user_id=instance.requestee_id, post__author_id=instance.requester_id)
+    ).delete()
+
+
+post_delete.connect(friendship_deleted, sender="profiles.Friend")
 
 
 class Comment(BaseModel):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
     text = models.TextField()
-    slug = AutoSlugField(_("slug"), populate_from=slugify_three_fields, unique=True)
+    slug = IdSlugField(_("slug"), populate_from=author_name, unique=True)
+
+    # Denormalized counters (see apps.feed.utils)
+    reactions_count = models.PositiveIntegerField(default=0, editable=False)
+    replies_count = models.PositiveIntegerField(default=0, editable=False)
+    reactions_summary = models.JSONField(default=dict, editable=False)
+
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return f"{self.author.full_name} ------ {self.text[:10]}..."
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="comment_search_vector_idx"),
+        ]
+
 
 class Reply(BaseModel):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -63,13 +168,22 @@ class Reply(BaseModel):
         Comment, on_delete=models.CASCADE, related_name="replies"
     )
     text = models.TextField()
-    slug = AutoSlugField(_("slug"), populate_from=slugify_three_fields, unique=True)
+    slug = IdSlugField(_("slug"), populate_from=author_name, unique=True)
+
+    # Denormalized counters (see apps.feed.utils)
+    reactions_count = models.PositiveIntegerField(default=0, editable=False)
+    reactions_summary = models.JSONField(default=dict, editable=False)
+
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return f"{self.author.full_name} ------ {self.text[:10]}..."
 
     class Meta:
         verbose_name_plural = "Replies"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="reply_search_vector_idx"),
+        ]
 
 
 class Reaction(BaseModel):
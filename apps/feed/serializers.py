@@ -21,6 +21,16 @@ def get_user(user):
 # POSTS
 
 user_field = serializers.SerializerMethodField(default=user_data)
+reactions_summary_field = serializers.SerializerMethodField(default={"LIKE": 1})
+# The requesting user's reaction type, annotated by the views (None for guests)
+user_reaction_field = serializers.ChoiceField(
+    choices=REACTION_CHOICES, default=None, read_only=True
+)
+
+
+def get_reactions_summary(obj):
+    # Counts of each reaction type, kept on the row as reactions come and go
+    return {rtype: count for rtype, count in obj.reactions_summary.items() if count}
 
 
 class PostSerializer(serializers.Serializer):
@@ -31,6 +41,8 @@ class PostSerializer(serializers.Serializer):
     )
     reactions_count = serializers.IntegerField(default=0, read_only=True)
     comments_count = serializers.IntegerField(default=0, read_only=True)
+    reactions_summary = reactions_summary_field
+    user_reaction = user_reaction_field
 
     image = serializers.CharField(
         source="get_image", default="https://img.url", read_only=True
@@ -48,6 +60,20 @@ class PostSerializer(serializers.Serializer):
     def get_author(self, obj) -> dict:
         return get_user(obj.author)
 
+    def get_reactions_summary(self, obj) -> dict:
+        return get_reactions_summary(obj)
+
+
+class PostsSyncDeletedSerializer(serializers.Serializer):
+    posts = serializers.ListField(child=serializers.SlugField())
+
+
+class PostsSyncSerializer(serializers.Serializer):
+    token = serializers.CharField()
+    has_more = serializers.BooleanField()
+    posts = PostSerializer(many=True)
+    deleted = PostsSyncDeletedSerializer()
+
 
 # RESPONSE SERIALIZERS
 class PostCreateResponseDataSerializer(PostSerializer):
@@ -58,6 +84,8 @@ class PostCreateResponseDataSerializer(PostSerializer):
         fields.pop("image", None)
         fields.pop("reactions_count", None)
         fields.pop("comments_count", None)
+        fields.pop("reactions_summary", None)
+        fields.pop("user_reaction", None)
         return fields
 
     def get_file_upload_data(self, obj) -> dict:
@@ -86,6 +114,10 @@ class PostCreateResponseSerializer(SuccessResponseSerializer):
     data = PostCreateResponseDataSerializer()
 
 
+class PostsSyncResponseSerializer(SuccessResponseSerializer):
+    data = PostsSyncSerializer()
+
+
 # REACTIONS
 
 
@@ -112,10 +144,15 @@ class ReplySerializer(serializers.Serializer):
     slug = serializers.CharField(read_only=True)
     text = serializers.CharField()
     reactions_count = serializers.IntegerField(default=0, read_only=True)
+    reactions_summary = reactions_summary_field
+    user_reaction = user_reaction_field
 
     def get_author(self, obj) -> dict:
         return get_user(obj.author)
 
+    def get_reactions_summary(self, obj) -> dict:
+        return get_reactions_summary(obj)
+
 
 class CommentSerializer(ReplySerializer):
     replies_count = serializers.IntegerField(default=0, read_only=True)
@@ -148,3 +185,32 @@ class CommentWithRepliesResponseSerializer(SuccessResponseSerializer):
 
 class ReplyResponseSerializer(SuccessResponseSerializer):
     data = ReplySerializer()
+
+
+# SEARCH
+SEARCH_TYPE_CHOICES = (
+    ("POST", "POST"),
+    ("COMMENT", "COMMENT"),
+    ("REPLY", "REPLY"),
+)
+
+
+class SearchResultSerializer(serializers.Serializer):
+    author = user_field
+    slug = serializers.CharField()
+    text = serializers.CharField()
+    headline = serializers.CharField(
+        default="A <b>matching</b> part of the text", read_only=True
+    )
+    created_at = serializers.DateTimeField(default_timezone=pytz.timezone("UTC"))
+
+    def get_author(self, obj) -> dict:
+        return get_user(obj.author)
+
+
+class SearchResponseDataSerializer(PaginatedResponseDataSerializer):
+    results = SearchResultSerializer(source="items", many=True)
+
+
+class SearchResponseSerializer(SuccessResponseSerializer):
+    data = SearchResponseDataSerializer()
@@ -1,6 +1,11 @@
+from django.core.management import call_command
+from django.test import override_settings
 from rest_framework.test import APITestCase
 from unittest import mock
-from apps.feed.models import Post, Reaction, Comment, Reply
+from apps.feed.models import Post, Reaction, Comment, Reply, TimelineEntry
+from apps.accounts.models import User
+from apps.profiles.models import Friend, Notification
+from apps.common.jobs import run_pending_jobs
 from apps.common.utils import TestUtil
 from apps.common.error import ErrorCode
 import uuid, os
@@ -9,9 +14,12 @@ import uuid, os
 class TestFeed(APITestCase):
     os.environ["ENVIRONMENT"] = "TESTING"
     posts_url = "/api/v1/feed/posts/"
+    timeline_url = "/api/v1/feed/timeline/"
     reactions_url = "/api/v1/feed/reactions/"
     comment_url = "/api/v1/feed/comments/"
     reply_url = "/api/v1/feed/replies/"
+    search_url = "/api/v1/feed/search/"
+    sync_url = "/api/v1/feed/posts/sync/"
 
     maxDiff = None
 
@@ -20,6 +28,7 @@ class TestFeed(APITestCase):
         verified_user = TestUtil.verified_user()
         another_verified_user = TestUtil.another_verified_user()
         self.verified_user = verified_user
+        self.another_verified_user = another_verified_user
 
         # post
         post = Post.objects.create(
@@ -49,6 +58,11 @@ class TestFeed(APITestCase):
             author=verified_user, comment=comment, text="Simple reply"
         )
 
+        # counters (fixtures above bypass the views that maintain them)
+        call_command("rebuild_feed_counters")
+        post.refresh_from_db()
+        comment.refresh_from_db()
+
     def test_retrieve_posts(self):
         post = self.post
         response = self.client.get(self.posts_url)
@@ -68,6 +82,8 @@ class TestFeed(APITestCase):
                             "text": post.text,
                             "slug": post.slug,
                             "reactions_count": mock.ANY,
+                            "reactions_summary": mock.ANY,
+                            "user_reaction": None,
                             "comments_count": mock.ANY,
                             "image": None,
                             "created_at": mock.ANY,
@@ -78,6 +94,84 @@ class TestFeed(APITestCase):
             },
         )
 
+        # Verify an invalid or expired token reads as a guest
+        response = self.client.get(
+            self.posts_url, HTTP_AUTHORIZATION="Bearer invalid-token"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["posts"][0]["user_reaction"], None)
+
+        # Test for out of range page
+        response = self.client.get(f"{self.posts_url}?page=2")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            response.json(),
+            {
+                "status": "failure",
+                "code": ErrorCode.INVALID_PAGE,
+                "message": "Invalid Page",
+            },
+        )
+
+    def test_retrieve_posts_by_cursor(self):
+        post = self.post
+        new_post = Post.objects.create(author=self.verified_user, text="Newer post")
+
+        # Test first page
+        response = self.client.get(f"{self.posts_url}?cursor=&page_size=1")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(data["per_page"], 1)
+        self.assertEqual(data["prev"], None)
+        self.assertEqual(data["posts"][0]["slug"], new_post.slug)
+
+        # Test next page
+        response = self.client.get(
+            f"{self.posts_url}?cursor={data['next']}&page_size=1"
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(data["next"], None)
+        self.assertEqual(data["posts"][0]["slug"], post.slug)
+
+        # Test previous page
+        response = self.client.get(
+            f"{self.posts_url}?cursor={data['prev']}&page_size=1"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["posts"][0]["slug"], new_post.slug)
+
+        # Test invalid cursor
+        response = self.client.get(f"{self.posts_url}?cursor=invalid")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            response.json(),
+            {
+                "status": "failure",
+                "code": ErrorCode.INVALID_PAGE,
+                "message": "Invalid Cursor",
+            },
+        )
+
+    def test_retrieve_hot_posts(self):
+        post = self.post
+        newer_post = Post.objects.create(
+            author=self.verified_user, text="A quiet new post"
+        )
+        call_command("decay_hot_scores")
+
+        # Verify the post with more engagement ranks first
+        response = self.client.get(f"{self.posts_url}?order=hot")
+        self.assertEqual(response.status_code, 200)
+        posts = response.json()["data"]["posts"]
+        self.assertEqual([item["slug"] for item in posts], [post.slug, newer_post.slug])
+
+        # Verify the order is validated and can't be combined with a cursor
+        response = self.client.get(f"{self.posts_url}?order=top")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f"{self.posts_url}?order=hot&cursor=")
+        self.assertEqual(response.status_code, 404)
+
     def test_create_post(self):
         post_dict = {"text": "My new Post"}
         response = self.client.post(self.posts_url, data=post_dict, **self.bearer)
@@ -98,6 +192,71 @@ class TestFeed(APITestCase):
             },
         )
 
+    def test_retrieve_timeline(self):
+        friend = Friend.objects.create(
+            requester=self.verified_user,
+            requestee=self.another_verified_user,
+            status="ACCEPTED",
+        )
+
+        # Verify a new post is pushed to the author's timeline, then to friends' by a job
+        response = self.client.post(
+            self.posts_url, data={"text": "For my friends"}, **self.bearer
+        )
+        slug = response.json()["data"]["slug"]
+        response = self.client.get(self.timeline_url, **self.other_user_bearer)
+        self.assertEqual(response.json()["data"]["posts"], [])
+        run_pending_jobs()
+        for bearer in (self.bearer, self.other_user_bearer):
+            response = self.client.get(self.timeline_url, **bearer)
+            self.assertEqual(response.status_code, 200)
+            posts = response.json()["data"]["posts"]
+            self.assertEqual([post["slug"] for post in posts], [slug])
+
+        # Verify entries are dated by the post, however late the job ran
+        entries = TimelineEntry.objects.filter(post__slug=slug)
+        self.assertEqual(
+            set(entries.values_list("created_at", flat=True)),
+            {Post.objects.get(slug=slug).created_at},
+        )
+
+        # Verify posts of authors with too many friends are read instead of pushed
+        with override_settings(TIMELINE_FANOUT_MAX_FRIENDS=0):
+            response = self.client.post(
+                self.posts_url, data={"text": "For everyone"}, **self.bearer
+            )
+            run_pending_jobs()
+        popular_slug = response.json()["data"]["slug"]
+        self.assertFalse(Post.objects.get(slug=popular_slug).fanned_out)
+        response = self.client.get(self.timeline_url, **self.other_user_bearer)
+        posts = response.json()["data"]["posts"]
+        self.assertEqual([post["slug"] for post in posts], [popular_slug, slug])
+
+        # Verify pushed and popular posts are paged together
+        slugs, cursor = [], ""
+        for _ in range(2):
+            response = self.client.get(
+                f"{self.timeline_url}?page_size=1&cursor={cursor}",
+                **self.other_user_bearer,
+            )
+            data = response.json()["data"]
+            slugs += [post["slug"] for post in data["posts"]]
+            cursor = data["next"]
+        self.assertEqual(slugs, [popular_slug, slug])
+        self.assertIsNone(cursor)
+
+        # Verify timelines are trimmed to the latest entries
+        with override_settings(TIMELINE_SIZE=1):
+            call_command("trim_timelines")
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.verified_user).count(), 1
+        )
+
+        # Verify posts leave the timelines of former friends
+        friend.delete()
+        response = self.client.get(self.timeline_url, **self.other_user_bearer)
+        self.assertEqual(response.json()["data"]["posts"], [])
+
     def test_retrieve_post(self):
         post = self.post
 
@@ -126,6 +285,8 @@ class TestFeed(APITestCase):
                     "text": post.text,
                     "slug": post.slug,
                     "reactions_count": mock.ANY,
+                    "reactions_summary": mock.ANY,
+                    "user_reaction": None,
                     "comments_count": mock.ANY,
                     "image": None,
                     "created_at": mock.ANY,
@@ -225,6 +386,35 @@ class TestFeed(APITestCase):
             },
         )
 
+    @override_settings(SYNC_LAG_SECONDS=0)
+    def test_sync_posts(self):
+        post = self.post
+        response = self.client.get(self.sync_url)
+        self.assertEqual(response.status_code, 200)
+        token = response.json()["data"]["token"]
+
+        # Created, edited and deleted posts since the token
+        response = self.client.post(
+            self.posts_url, data={"text": "A new post"}, **self.bearer
+        )
+        slug = response.json()["data"]["slug"]
+        self.client.put(
+            f"{self.posts_url}{slug}/", data={"text": "An edited post"}, **self.bearer
+        )
+        self.client.delete(f"{self.posts_url}{post.slug}/", **self.bearer)
+
+        response = self.client.get(f"{self.sync_url}?token={token}")
+        self.assertEqual(response.status_code, 200)
+        resp = response.json()
+        self.assertEqual(resp["message"], "Posts synced")
+        data = resp["data"]
+        self.assertFalse(data["has_more"])
+        self.assertEqual(
+            [(item["slug"], item["text"]) for item in data["posts"]],
+            [(slug, "An edited post")],
+        )
+        self.assertEqual(data["deleted"], {"posts": [post.slug]})
+
     def test_retrieve_reactions(self):
         post = self.post
         user = self.verified_user
@@ -384,6 +574,114 @@ class TestFeed(APITestCase):
             },
         )
 
+    def test_reactions_summary(self):
+        post = self.post
+        post_url = f"{self.posts_url}{post.slug}/"
+        reaction_url = f"{self.reactions_url}POST/{post.slug}/"
+
+        # Guests get the summary without a reaction of their own
+        response = self.client.get(post_url)
+        self.assertEqual(response.json()["data"]["reactions_summary"], {"LIKE": 1})
+        self.assertEqual(response.json()["data"]["user_reaction"], None)
+
+        response = self.client.get(post_url, **self.bearer)
+        self.assertEqual(response.json()["data"]["user_reaction"], "LIKE")
+
+        # Changing the reaction type moves the count between types
+        self.client.post(reaction_url, data={"rtype": "LOVE"}, **self.bearer)
+        self.client.post(reaction_url, data={"rtype": "LIKE"}, **self.other_user_bearer)
+        response = self.client.get(post_url, **self.bearer)
+        data = response.json()["data"]
+        self.assertEqual(data["reactions_count"], 2)
+        self.assertEqual(data["reactions_summary"], {"LOVE": 1, "LIKE": 1})
+        self.assertEqual(data["user_reaction"], "LOVE")
+
+        # Removing a reaction drops its type from the summary
+        self.client.delete(f"{self.reactions_url}{self.reaction.id}/", **self.bearer)
+        response = self.client.get(post_url, **self.bearer)
+        data = response.json()["data"]
+        self.assertEqual(data["reactions_count"], 1)
+        self.assertEqual(data["reactions_summary"], {"LIKE": 1})
+        self.assertEqual(data["user_reaction"], None)
+
+    def test_notification_aggregation(self):
+        post = self.post
+        other_user = self.another_verified_user
+        third_user = User.objects.create_user(
+            first_name="Third",
+            last_name="User",
+            email="thirduser@example.com",
+            password="thirduser123",
+        )
+        third_user_bearer = {
+            "HTTP_AUTHORIZATION": f"Bearer {TestUtil.auth_token(third_user)}"
+        }
+
+        # Reactions to the same post collapse into one notification
+        reaction_url = f"{self.reactions_url}POST/{post.slug}/"
+        response = self.client.post(
+            reaction_url, data={"rtype": "LIKE"}, **self.other_user_bearer
+        )
+        other_reaction_id = response.json()["data"]["id"]
+        self.client.post(reaction_url, data={"rtype": "WOW"}, **self.other_user_bearer)
+        response = self.client.post(
+            reaction_url, data={"rtype": "LOVE"}, **third_user_bearer
+        )
+        third_reaction_id = response.json()["data"]["id"]
+        notification = Notification.objects.get(ntype="REACTION", post=post)
+        self.assertEqual(notification.actors_count, 2)
+        self.assertEqual(
+            notification.recent_actors, [str(third_user.id), str(other_user.id)]
+        )
+        self.assertEqual(notification.sender, third_user)
+        self.assertEqual(
+            notification.message,
+            f"{third_user.full_name} and 1 other reacted to your post",
+        )
+        self.assertEqual(list(notification.receivers.all()), [self.verified_user])
+
+        # Removing a reaction takes its actor out, the last one deletes the notification
+        self.client.delete(
+            f"{self.reactions_url}{third_reaction_id}/", **third_user_bearer
+        )
+        notification.refresh_from_db()
+        self.assertEqual(notification.actors_count, 1)
+        self.assertEqual(notification.sender, other_user)
+        self.client.delete(
+            f"{self.reactions_url}{other_reaction_id}/", **self.other_user_bearer
+        )
+        self.assertFalse(Notification.objects.filter(id=notification.id).exists())
+
+        # Comments on the same post collapse too, pointing to the latest comment
+        comments_url = f"{self.posts_url}{post.slug}/comments/"
+        self.client.post(comments_url, data={"text": "One"}, **self.other_user_bearer)
+        self.client.post(comments_url, data={"text": "Two"}, **self.other_user_bearer)
+        response = self.client.post(
+            comments_url, data={"text": "Three"}, **third_user_bearer
+        )
+        third_comment_slug = response.json()["data"]["slug"]
+        notification = Notification.objects.get(ntype="COMMENT")
+        self.assertEqual(notification.actors_count, 2)
+        self.assertEqual(notification.comment.slug, third_comment_slug)
+
+        # Deleting the latest comment points the notification back to the one before
+        self.client.delete(
+            f"{self.comment_url}{third_comment_slug}/", **third_user_bearer
+        )
+        notification.refresh_from_db()
+        self.assertEqual(notification.actors_count, 1)
+        self.assertEqual(notification.sender, other_user)
+        self.assertEqual(notification.comment.text, "Two")
+
+        # The author's own comments were never notified, deleting one leaves it as is
+        response = self.client.post(comments_url, data={"text": "Mine"}, **self.bearer)
+        own_comment_slug = response.json()["data"]["slug"]
+        self.client.delete(f"{self.comment_url}{own_comment_slug}/", **self.bearer)
+        updated_at = notification.updated_at
+        notification.refresh_from_db()
+        self.assertEqual(notification.updated_at, updated_at)
+        self.assertEqual(notification.comment.text, "Two")
+
     def test_retrieve_comments(self):
         comment = self.comment
         post = self.post
@@ -423,6 +721,8 @@ class TestFeed(APITestCase):
                             "slug": comment.slug,
                             "text": comment.text,
                             "reactions_count": comment.reactions.count(),
+                            "reactions_summary": mock.ANY,
+                            "user_reaction": None,
                             "replies_count": comment.replies.count(),
                         }
                     ],
@@ -469,11 +769,18 @@ class TestFeed(APITestCase):
                     "slug": mock.ANY,
                     "text": comment_data["text"],
                     "reactions_count": 0,
+                    "reactions_summary": mock.ANY,
+                    "user_reaction": None,
                     "replies_count": 0,
                 },
             },
         )
 
+        # Test that the post comments counter was incremented
+        comments_count = post.comments_count
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, comments_count + 1)
+
     def test_retrieve_comment_with_replies(self):
         reply = self.reply
         comment = reply.comment
@@ -509,6 +816,8 @@ class TestFeed(APITestCase):
                         "slug": comment.slug,
                         "text": comment.text,
                         "reactions_count": comment.reactions.count(),
+                        "reactions_summary": mock.ANY,
+                        "user_reaction": None,
                         "replies_count": comment.replies.count(),
                     },
                     "replies": {
@@ -525,6 +834,8 @@ class TestFeed(APITestCase):
                                 "slug": reply.slug,
                                 "text": reply.text,
                                 "reactions_count": 0,
+                                "reactions_summary": mock.ANY,
+                                "user_reaction": None,
                             }
                         ],
                     },
@@ -571,6 +882,8 @@ class TestFeed(APITestCase):
                     "slug": mock.ANY,
                     "text": reply_data["text"],
                     "reactions_count": 0,
+                    "reactions_summary": mock.ANY,
+                    "user_reaction": None,
                 },
             },
         )
@@ -630,6 +943,8 @@ class TestFeed(APITestCase):
                     "slug": mock.ANY,
                     "text": comment_data["text"],
                     "reactions_count": mock.ANY,
+                    "reactions_summary": mock.ANY,
+                    "user_reaction": None,
                     "replies_count": mock.ANY,
                 },
             },
@@ -711,6 +1026,8 @@ class TestFeed(APITestCase):
                     "slug": reply.slug,
                     "text": reply.text,
                     "reactions_count": reply.reactions.count(),
+                    "reactions_summary": mock.ANY,
+                    "user_reaction": None,
                 },
             },
         )
@@ -770,6 +1087,8 @@ class TestFeed(APITestCase):
                     "slug": mock.ANY,
                     "text": reply_data["text"],
                     "reactions_count": reply.reactions.count(),
+                    "reactions_summary": mock.ANY,
+                    "user_reaction": None,
                 },
             },
         )
@@ -814,3 +1133,80 @@ class TestFeed(APITestCase):
                 "message": "Reply Deleted",
             },
         )
+
+    def test_rebuild_feed_counters(self):
+        post = self.post
+        comment = self.comment
+        Post.objects.filter(id=post.id).update(reactions_count=5, comments_count=5)
+
+        call_command("rebuild_feed_counters", batch_size=1)
+        post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(post.reactions_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(comment.replies_count, 1)
+        self.assertEqual(comment.reactions_count, 0)
+
+    def test_search(self):
+        post = self.post
+        Post.objects.create(author=self.verified_user, text="Nothing to see")
+
+        # Verify the request fails without a search text
+        response = self.client.get(self.search_url)
+        self.assertEqual(response.status_code, 422)
+
+        # Verify matching posts are returned with a highlighted headline
+        response = self.client.get(f"{self.search_url}?q=platforms")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "status": "success",
+                "message": "Results fetched",
+                "data": {
+                    "per_page": 20,
+                    "next": None,
+                    "results": [
+                        {
+                            "author": mock.ANY,
+                            "slug": post.slug,
+                            "text": post.text,
+                            "headline": "This is a nice new <b>platform</b>",
+                            "created_at": mock.ANY,
+                        }
+                    ],
+                },
+            },
+        )
+
+        # Verify the text is escaped in headlines
+        Post.objects.filter(id=post.id).update(
+            text="<img src=x onerror=alert(1)> & a new platform"
+        )
+        response = self.client.get(f"{self.search_url}?q=platforms")
+        self.assertEqual(
+            response.json()["data"]["results"][0]["headline"],
+            "&lt;img src=x onerror=alert(1)&gt; &amp; a new <b>platform</b>",
+        )
+
+        # Verify comments and replies are searchable and kept current on update
+        Reply.objects.filter(id=self.reply.id).update(text="An edited answer")
+        response = self.client.get(f"{self.search_url}?q=answer&type=reply")
+        results = response.json()["data"]["results"]
+        self.assertEqual([item["slug"] for item in results], [self.reply.slug])
+        response = self.client.get(f"{self.search_url}?q=comment&type=comment")
+        results = response.json()["data"]["results"]
+        self.assertEqual([item["slug"] for item in results], [self.comment.slug])
+
+        # Verify results are paged with a cursor
+        Post.objects.create(author=self.verified_user, text="A platform for all")
+        response = self.client.get(f"{self.search_url}?q=platform&page_size=1")
+        data = response.json()["data"]
+        self.assertEqual(len(data["results"]), 1)
+        response = self.client.get(
+            f"{self.search_url}?q=platform&page_size=1&cursor={data['next']}"
+        )
+        next_data = response.json()["data"]
+        self.assertEqual(len(next_data["results"]), 1)
+        self.assertNotEqual(next_data["results"][0]["slug"], data["results"][0]["slug"])
+        self.assertIsNone(next_data["next"])
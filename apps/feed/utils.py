@@ -0,0 +1,164 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case,
+    F,
+    FloatField,
+    Func,
+    JSONField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Greatest, Now, Power, Replace
+from apps.common.jobs import enqueue
+from apps.feed.models import HOT_GRAVITY, Post, Reaction, TimelineEntry
+from apps.profiles.models import Friend
+
+# Hot ranking: engagement points divided by a power of the post's age in hours
+HOT_SCORE_FLOOR = 0.001  # Posts below this are no longer re-decayed
+
+
+def hot_score():
+    age_hours = Func(
+        Now() - F("created_at"),
+        template="EXTRACT(EPOCH FROM %(expressions)s) / 3600",
+        output_field=FloatField(),
+    )
+    points = F("reactions_count") + 2 * F("comments_count") + 1
+    return Cast(points, FloatField()) / Power(age_hours + 2, HOT_GRAVITY)
+
+
+def html_escaped(field):
+    # The field's text escaped like django.utils.html.escape, in the database
+    expression = F(field)
+    for char, entity in (
+        ("&", "&amp;"),
+        ("<", "&lt;"),
+        (">", "&gt;"),
+        ('"', "&quot;"),
+        ("'", "&#x27;"),
+    ):
+        expression = Replace(expression, Value(char), Value(entity))
+    return expression
+
+
+class JSONCounter(Func):
+    """Adds `value` to the count under `key` of a jsonb object column, not below 0."""
+
+    output_field = JSONField()
+
+    def __init__(self, field, key, value):
+        field = F(field) if isinstance(field, str) else field
+        super().__init__(field, Value(key), Value(value))
+
+    def as_sql(self, compiler, connection):
+        field, key, value = (
+            compiler.compile(expression) for expression in self.source_expressions
+        )
+        sql = (
+            f"jsonb_set({field[0]}, ARRAY[{key[0]}]::text[], to_jsonb(GREATEST("
+            f"COALESCE(({field[0]} ->> {key[0]})::int, 0) + {value[0]}, 0)))"
+        )
+        params = (*field[1], *key[1], *field[1], *key[1], *value[1])
+        return sql, params
+
+
+# Denormalized counters maintained on writes, so reads don't need Count() joins
+def update_counter(model, id, field, value, rtype=None):
+    data = {field: Greatest(F(field) + value, 0)}
+    if rtype:
+        data["reactions_summary"] = JSONCounter("reactions_summary", rtype, value)
+    model.objects.filter(id=id).update(**data)
+    if model == Post:
+        # Separate update, so the score sees the new counter
+        Post.objects.filter(id=id).update(hot_score=hot_score())
+
+
+@sync_to_async
+def create_and_count(model, data, counted_model, counted_id, field, rtype=None):
+    with transaction.atomic():
+        obj = model.objects.create(**data)
+        update_counter(counted_model, counted_id, field, 1, rtype)
+    return obj
+
+
+@sync_to_async
+def delete_and_count(obj, counted_model, counted_id, field, rtype=None):
+    with transaction.atomic():
+        obj.delete()
+        update_counter(counted_model, counted_id, field, -1, rtype)
+
+
+@sync_to_async
+def change_reaction_type(reaction, target, rtype):
+    with transaction.atomic():
+        old_rtype = reaction.rtype
+        reaction.rtype = rtype
+        reaction.save(update_fields=["rtype", "updated_at"])
+        target.__class__.objects.filter(id=target.id).update(
+            reactions_summary=JSONCounter(
+                JSONCounter("reactions_summary", old_rtype, -1), rtype, 1
+            )
+        )
+    return reaction
+
+
+# Annotates each row with the user's own reaction type, through the unique (user, target) index
+def with_user_reaction(queryset, user):
+    if not user:
+        return queryset
+    target = queryset.model.__name__.lower()
+    reactions = Reaction.objects.filter(
+        **{target: OuterRef("pk")}, user_id=user.id
+    ).values("rtype")[:1]
+    return queryset.annotate(user_reaction=Subquery(reactions))
+
+
+def friend_ids(user_id):
+    return (
+        Friend.objects.filter(Q(requester_id=user_id) | Q(requestee_id=user_id))
+        .filter(status="ACCEPTED")
+        .annotate(
+            friend_id=Case(
+                When(requester_id=user_id, then=F("requestee")),
+                When(requestee_id=user_id, then=F("requester")),
+            )
+        )
+        .values_list("friend_id", flat=True)
+    )
+
+
+# Push a new post to its author's home timeline now, and to the friends' from the job queue
+@sync_to_async
+def fanout_post(post):
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=post.author_id, post=post, created_at=post.created_at
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        enqueue("fanout_post", {"post_id": str(post.id)})
+
+
+def fanout_post_to_friends(post):
+    user_ids = list(
+        friend_ids(post.author_id)[: settings.TIMELINE_FANOUT_MAX_FRIENDS + 1]
+    )
+    if len(user_ids) > settings.TIMELINE_FANOUT_MAX_FRIENDS:
+        # Too many friends, their timelines read this post from the posts table instead
+        Post.objects.filter(id=post.id).update(fanned_out=False)
+        return
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=id, post=post, created_at=post.created_at)
+            for id in user_ids
+        ],
+        ignore_conflicts=True,
+    )
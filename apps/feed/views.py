@@ -1,14 +1,28 @@
-from django.db.models import Count
+from asgiref.sync import sync_to_async
 from adrf.views import APIView
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
 from drf_spectacular.utils import extend_schema, OpenApiParameter
-from asgiref.sync import sync_to_async
 
 from apps.common.file_types import ALLOWED_IMAGE_TYPES
 from apps.common.paginators import CustomPagination
-from apps.profiles.models import Notification
-from apps.profiles.utils import send_notification_in_socket
+from apps.profiles.utils import (
+    aggregate_notification,
+    publish_notification,
+    withdraw_notification,
+)
 
-from .models import Post, Comment, Reply, Reaction, REACTION_CHOICES
+from .models import Post, Comment, Reply, Reaction, TimelineEntry, REACTION_CHOICES
+from .utils import (
+    change_reaction_type,
+    create_and_count,
+    delete_and_count,
+    fanout_post,
+    friend_ids,
+    html_escaped,
+    with_user_reaction,
+)
 from .serializers import (
     CommentResponseSerializer,
     CommentSerializer,
@@ -22,20 +36,27 @@ from .serializers import (
     PostResponseSerializer,
     PostCreateResponseSerializer,
     PostCreateResponseDataSerializer,
+    PostsSyncResponseSerializer,
+    PostsSyncSerializer,
     ReactionSerializer,
     ReactionsResponseDataSerializer,
     ReactionsResponseSerializer,
     ReplyResponseSerializer,
     ReplySerializer,
+    SEARCH_TYPE_CHOICES,
+    SearchResponseDataSerializer,
+    SearchResponseSerializer,
 )
 
-from apps.common.models import File
+from apps.common.models import Change, File
+from apps.common.sync import read_changes
 from apps.common.error import ErrorCode
 from apps.common.exceptions import RequestError
 from apps.common.serializers import ErrorResponseSerializer, SuccessResponseSerializer
 from apps.common.responses import CustomResponse
 from apps.common.utils import (
     IsAuthenticatedCustom,
+    IsAuthenticatedOrGuestOptionalCustom,
 )
 
 tags = ["Feed"]
@@ -47,6 +68,7 @@ class PostsView(APIView):
     serializer_class = PostSerializer
     post_resp_serializer_class = PostCreateResponseDataSerializer
     paginator_class = CustomPagination()
+    paginator_class.allow_cursor = True
 
     @extend_schema(
         operation_id="posts_list",
@@ -60,18 +82,50 @@ class PostsView(APIView):
                 description="Retrieve a particular page of posts. Defaults to 1",
                 required=False,
                 type=int,
-            )
+            ),
+            OpenApiParameter(
+                name="cursor",
+                description="""
+                    Opt in to cursor pagination. Leave empty for the first page, then use the next or prev cursor from the response.
+                    Not available with the 'hot' order
+                """,
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="order",
+                description="""
+                    Order of the posts. Defaults to new
+                    - new - latest posts first
+                    - hot - trending posts first
+                """,
+                required=False,
+                type=str,
+                enum=["new", "hot"],
+            ),
         ],
     )
     async def get(self, request):
-        posts = await sync_to_async(list)(
-            Post.objects.select_related("author", "author__avatar", "image")
-            .annotate(
-                reactions_count=Count("reactions"), comments_count=Count("comments")
+        order = request.GET.get("order", "new")
+        if order not in ("new", "hot"):
+            raise RequestError(
+                err_code=ErrorCode.INVALID_VALUE,
+                err_msg="Invalid 'order' value",
+                status_code=404,
             )
-            .order_by("-created_at")
-        )
-        paginated_data = self.paginator_class.paginate_queryset(posts, request)
+        posts = Post.objects.select_related("author", "author__avatar", "image")
+        posts = with_user_reaction(posts, request.user)
+        if order == "hot":
+            if self.paginator_class.cursor_query_param in request.GET:
+                raise RequestError(
+                    err_code=ErrorCode.INVALID_VALUE,
+                    err_msg="Cursor pagination isn't available with the 'hot' order",
+                    status_code=404,
+                )
+            posts = posts.order_by("-hot_score", "-id")
+        else:
+            posts = posts.order_by("-created_at")
+        paginated_data = await self.paginator_class.apaginate_queryset(posts, request)
         serializer = PostsResponseDataSerializer(paginated_data)
         return CustomResponse.success(message="Posts fetched", data=serializer.data)
 
@@ -98,6 +152,7 @@ class PostsView(APIView):
 
         data["author"] = request.user
         post = await Post.objects.acreate(**data)
+        await fanout_post(post)
         serializer = self.post_resp_serializer_class(
             post, context={"image_upload_status": image_upload_status}
         )
@@ -106,7 +161,7 @@ class PostsView(APIView):
         )
 
     def get_permissions(self):
-        permissions = []
+        permissions = [IsAuthenticatedOrGuestOptionalCustom()]
         if self.request.method == "POST":
             permissions = [
                 IsAuthenticatedCustom(),
@@ -114,18 +169,117 @@ class PostsView(APIView):
         return permissions
 
 
+class PostsSyncView(APIView):
+    permission_classes = (IsAuthenticatedOrGuestOptionalCustom,)
+
+    @extend_schema(
+        summary="Sync Posts",
+        description="""
+            This endpoint retrieves the posts created, edited or deleted since a sync token, to catch up after reconnecting
+            instead of reloading the posts.
+            Call it without a token after loading the posts, to get the token to sync from.
+            Then call it with the token from the last response, until has_more is false.
+            Posts appear with their current data, or with their slug in deleted when they're gone.
+            Reactions and comments don't mark a post as changed.
+            A token older than the sync retention period expires with a 410 error, reload the posts then.
+        """,
+        tags=tags,
+        responses=PostsSyncResponseSerializer,
+        parameters=[
+            OpenApiParameter(
+                name="token",
+                description="The sync token from the last sync response",
+                required=False,
+                type=str,
+            )
+        ],
+    )
+    async def get(self, request):
+        changes = Change.objects.filter(kind="POST")
+        objects, token, has_more = await read_changes(changes, request.GET.get("token"))
+        post_ops = objects["POST"]
+        posts = []
+        if post_ops["UPSERT"]:
+            posts = Post.objects.filter(id__in=post_ops["UPSERT"]).select_related(
+                "author", "author__avatar", "image"
+            )
+            posts = with_user_reaction(posts, request.user)
+            posts = await sync_to_async(list)(posts.order_by("created_at", "id"))
+        serializer = PostsSyncSerializer(
+            {
+                "token": token,
+                "has_more": has_more,
+                "posts": posts,
+                "deleted": {"posts": post_ops["DELETE"]},
+            }
+        )
+        return CustomResponse.success(message="Posts synced", data=serializer.data)
+
+
+class TimelineView(APIView):
+    serializer_class = PostSerializer
+    paginator_class = CustomPagination()
+    permission_classes = (IsAuthenticatedCustom,)
+
+    async def get_page(self, user, request):
+        """
+        Keyset page of the user's timeline entries, merged with the posts of friends
+        too popular to fan out, then the page's posts are loaded by id.
+        """
+        paginator = self.paginator_class
+        cursor = paginator.decode_cursor(request.GET.get(paginator.cursor_query_param))
+        entries = TimelineEntry.objects.filter(user_id=user.id).only(
+            "id", "created_at", "post_id"
+        )
+        unfanned_posts = Post.objects.filter(
+            fanned_out=False, author_id__in=friend_ids(user.id)
+        ).only("id", "created_at")
+        page = await paginator.apaginate_querysets_by_cursor(
+            [entries, unfanned_posts], paginator.get_page_size(request), cursor
+        )
+        post_ids = [
+            item.post_id if isinstance(item, TimelineEntry) else item.id
+            for item in page["items"]
+        ]
+        posts = with_user_reaction(
+            Post.objects.filter(id__in=post_ids).select_related(
+                "author", "author__avatar", "image"
+            ),
+            user,
+        )
+        posts = {post.id: post async for post in posts}
+        page["items"] = [posts[id] for id in post_ids if id in posts]
+        return page
+
+    @extend_schema(
+        summary="Retrieve Home Timeline",
+        description="This endpoint retrieves cursor paginated responses of the latest posts of the authenticated user and their friends",
+        tags=tags,
+        responses=PostsResponseSerializer,
+        parameters=[
+            OpenApiParameter(
+                name="cursor",
+                description="""
+                    Leave empty for the first page, then use the next or prev cursor from the response
+                """,
+                required=False,
+                type=str,
+            ),
+        ],
+    )
+    async def get(self, request):
+        paginated_data = await self.get_page(request.user, request)
+        serializer = PostsResponseDataSerializer(paginated_data)
+        return CustomResponse.success(message="Posts fetched", data=serializer.data)
+
+
 class PostDetailView(APIView):
     serializer_class = PostSerializer
     put_resp_serializer_class = PostCreateResponseDataSerializer
 
-    async def get_object(self, slug):
-        post = (
-            await Post.objects.select_related("author", "author__avatar", "image")
-            .annotate(
-                reactions_count=Count("reactions"), comments_count=Count("comments")
-            )
-            .aget_or_none(slug=slug)
-        )
+    async def get_object(self, slug, user=None):
+        posts = Post.objects.select_related("author", "author__avatar", "image")
+        post = await with_user_reaction(posts, user).aget_or_none(slug=slug)
         if not post:
             raise RequestError(
                 err_code=ErrorCode.NON_EXISTENT,
@@ -141,7 +295,7 @@ class PostDetailView(APIView):
         responses={200: PostResponseSerializer, 404: ErrorResponseSerializer},
     )
     async def get(self, request, *args, **kwargs):
-        post = await self.get_object(kwargs["slug"])
+        post = await self.get_object(kwargs["slug"], request.user)
         serializer = self.serializer_class(post)
         return CustomResponse.success(
             message="Post Detail fetched", data=serializer.data
@@ -178,7 +332,8 @@ class PostDetailView(APIView):
 
         for attr, value in data.items():
             setattr(post, attr, value)
-        await post.asave()
+        # Only write the edited columns so concurrent counter updates aren't overwritten
+        await post.asave(update_fields=[*data, "updated_at"])
 
         serializer = self.put_resp_serializer_class(
             post, context={"image_upload_status": image_upload_status}
@@ -202,7 +357,7 @@ class PostDetailView(APIView):
         return CustomResponse.success(message="Post deleted")
 
     def get_permissions(self):
-        permissions = []
+        permissions = [IsAuthenticatedOrGuestOptionalCustom()]
         if self.request.method != "GET":
             permissions = [
                 IsAuthenticatedCustom(),
@@ -286,8 +441,8 @@ class ReactionsView(APIView):
         filter = {field_name: obj.id}
         if rtype:
             filter["rtype"] = rtype
-        reactions = await sync_to_async(list)(
-            Reaction.objects.filter(**filter).select_related("user", "user__avatar")
+        reactions = Reaction.objects.filter(**filter).select_related(
+            "user", "user__avatar"
         )
         return reactions
 
@@ -309,7 +464,9 @@ class ReactionsView(APIView):
                 status_code=404,
             )
         reactions = await self.get_queryset(kwargs["focus"], kwargs["slug"], rtype)
-        paginated_data = self.paginator_class.paginate_queryset(reactions, request)
+        paginated_data = await self.paginator_class.apaginate_queryset(
+            reactions, request
+        )
         serializer = ReactionsResponseDataSerializer(paginated_data)
         return CustomResponse.success(message="Reactions fetched", data=serializer.data)
 
@@ -343,37 +500,30 @@ class ReactionsView(APIView):
         reaction = await Reaction.objects.select_related(
             "user", "user__avatar"
         ).aget_or_none(**data)
+        created = not reaction
         if reaction:
-            reaction.rtype = rtype
-            await reaction.asave()
+            if reaction.rtype != rtype:
+                reaction = await change_reaction_type(reaction, obj, rtype)
         else:
             data["rtype"] = rtype
-            reaction = await Reaction.objects.acreate(**data)
+            reaction = await create_and_count(
+                Reaction, data, obj.__class__, obj.id, "reactions_count", rtype
+            )
 
         serializer = self.serializer_class(reaction)
 
-        # Create and Send Notification
-        if obj.author_id != user.id:
-            ndata = {obj_field: obj}
-            notification, created = await Notification.objects.select_related(
-                "sender",
-                "sender__avatar",
-                "post",
-                "comment",
-                "comment__post",
-                "reply",
-                "reply__comment",
-                "reply__comment__post",
-            ).aget_or_create(sender=user, ntype="REACTION", **ndata)
-            if created:
-                await notification.receivers.aadd(obj.author)
-
-                # Send to websocket
-                await send_notification_in_socket(
-                    request.is_secure(),
-                    request.get_host(),
-                    notification,
-                )
+        # Create and Send Notification, a changed reaction type is not new activity
+        if created and obj.author_id != user.id:
+            notification_id, ncreated = await aggregate_notification(
+                "REACTION", reaction, obj.author_id
+            )
+            # Send to websocket
+            await publish_notification(
+                notification_id,
+                "CREATED" if ncreated else "UPDATED",
+                "REACTION",
+                [obj.author_id],
+            )
 
         return CustomResponse.success(
             message="Reaction created", data=serializer.data, status_code=201
@@ -419,22 +569,21 @@ class RemoveReaction(APIView):
 
         # Remove Reaction Notification
         targeted_obj = reaction.targeted_obj
-        targeted_field = f"{targeted_obj.__class__.__name__.lower()}_id"  # (post_id, comment_id or reply_id)
-        data = {
-            "sender": user,
-            "ntype": "REACTION",
-            targeted_field: targeted_obj.id,
-        }
-
-        notification = await Notification.objects.aget_or_none(**data)
-        if notification:
-            # Send to websocket and delete notification
-            await send_notification_in_socket(
-                request.is_secure(), request.get_host(), notification, status="DELETED"
+        withdrawn = await withdraw_notification("REACTION", reaction)
+        if withdrawn:
+            # Send to websocket
+            notification_id, status, receiver_ids = withdrawn
+            await publish_notification(
+                notification_id, status, "REACTION", receiver_ids
             )
-            await notification.adelete()
 
-        await reaction.adelete()
+        await delete_and_count(
+            reaction,
+            targeted_obj.__class__,
+            targeted_obj.id,
+            "reactions_count",
+            reaction.rtype,
+        )
         return CustomResponse.success(message="Reaction deleted")
 
 
@@ -475,14 +624,15 @@ class CommentsView(APIView):
     )
     async def get(self, request, *args, **kwargs):
         post = await self.get_object(kwargs["slug"])
-        comments = await sync_to_async(list)(
+        comments = (
             Comment.objects.filter(post_id=post.id)
             .select_related("author", "author__avatar")
-            .annotate(
-                replies_count=Count("replies"), reactions_count=Count("reactions")
-            )
+            .order_by("-created_at")
+        )
+        comments = with_user_reaction(comments, request.user)
+        paginated_data = await self.paginator_class.apaginate_queryset(
+            comments, request
         )
-        paginated_data = self.paginator_class.paginate_queryset(comments, request)
         serializer = CommentsResponseDataSerializer(paginated_data)
 
         return CustomResponse.success(message="Comments Fetched", data=serializer.data)
@@ -503,21 +653,20 @@ class CommentsView(APIView):
         data = serializer.validated_data
         data.update({"post": post, "author": user})
 
-        comment = await Comment.objects.acreate(**data)
+        comment = await create_and_count(Comment, data, Post, post.id, "comments_count")
         serializer = self.serializer_class(comment)
 
         # Create and Send Notification
         if user.id != post.author_id:
-            notification = await Notification.objects.acreate(
-                sender=user, ntype="COMMENT", comment=comment
+            notification_id, created = await aggregate_notification(
+                "COMMENT", comment, post.author_id
             )
-            await notification.receivers.aadd(post.author)
-
             # Send to websocket
-            await send_notification_in_socket(
-                request.is_secure(),
-                request.get_host(),
-                notification,
+            await publish_notification(
+                notification_id,
+                "CREATED" if created else "UPDATED",
+                "COMMENT",
+                [post.author_id],
             )
 
         return CustomResponse.success(
@@ -525,7 +674,7 @@ class CommentsView(APIView):
         )
 
     def get_permissions(self):
-        permissions = []
+        permissions = [IsAuthenticatedOrGuestOptionalCustom()]
         if self.request.method == "POST":
             permissions = [
                 IsAuthenticatedCustom(),
@@ -548,14 +697,9 @@ class CommentView(APIView):
         ),
     ]
 
-    async def get_object(self, slug):
-        comment = (
-            await Comment.objects.select_related("author", "author__avatar", "post")
-            .annotate(
-                replies_count=Count("replies"), reactions_count=Count("reactions")
-            )
-            .aget_or_none(slug=slug)
-        )
+    async def get_object(self, slug, user=None):
+        comments = Comment.objects.select_related("author", "author__avatar", "post")
+        comment = await with_user_reaction(comments, user).aget_or_none(slug=slug)
         if not comment:
             raise RequestError(
                 err_code=ErrorCode.NON_EXISTENT,
@@ -584,13 +728,14 @@ class CommentView(APIView):
         ],
     )
     async def get(self, request, *args, **kwargs):
-        comment = await self.get_object(kwargs["slug"])
-        replies = await sync_to_async(list)(
+        comment = await self.get_object(kwargs["slug"], request.user)
+        replies = (
             Reply.objects.filter(comment_id=comment.id)
             .select_related("author", "author__avatar")
-            .annotate(reactions_count=Count("reactions"))
+            .order_by("-created_at")
         )
-        paginated_data = self.paginator_class.paginate_queryset(replies, request)
+        replies = with_user_reaction(replies, request.user)
+        paginated_data = await self.paginator_class.apaginate_queryset(replies, request)
         data = {"comment": comment, "replies": paginated_data}
         serializer = self.serializer_class(data)
         return CustomResponse.success(
@@ -616,21 +761,22 @@ class CommentView(APIView):
         data["author"] = request.user
         data["comment"] = comment
 
-        reply = await Reply.objects.acreate(**data)
+        reply = await create_and_count(
+            Reply, data, Comment, comment.id, "replies_count"
+        )
         serializer = ReplySerializer(reply)
 
         # Create and Send Notification
         if user.id != comment.author_id:
-            notification = await Notification.objects.acreate(
-                sender=user, ntype="REPLY", reply=reply
+            notification_id, created = await aggregate_notification(
+                "REPLY", reply, comment.author_id
             )
-            await notification.receivers.aadd(comment.author)
-
             # Send to websocket
-            await send_notification_in_socket(
-                request.is_secure(),
-                request.get_host(),
-                notification,
+            await publish_notification(
+                notification_id,
+                "CREATED" if created else "UPDATED",
+                "REPLY",
+                [comment.author_id],
             )
 
         return CustomResponse.success(
@@ -658,7 +804,7 @@ class CommentView(APIView):
         serializer = CommentSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         comment.text = serializer.validated_data["text"]
-        await comment.asave()
+        await comment.asave(update_fields=["text", "updated_at"])
         serializer = CommentSerializer(comment)
         return CustomResponse.success(message="Comment Updated", data=serializer.data)
 
@@ -682,21 +828,17 @@ class CommentView(APIView):
             )
 
         # Remove Comment Notification
-        notification = await Notification.objects.aget_or_none(
-            sender=user, ntype="COMMENT", comment_id=comment.id
-        )
-        if notification:
-            # Send to websocket and delete notification
-            await send_notification_in_socket(
-                request.is_secure(), request.get_host(), notification, status="DELETED"
-            )
-            await notification.adelete()
+        withdrawn = await withdraw_notification("COMMENT", comment)
+        if withdrawn:
+            # Send to websocket
+            notification_id, status, receiver_ids = withdrawn
+            await publish_notification(notification_id, status, "COMMENT", receiver_ids)
 
-        await comment.adelete()
+        await delete_and_count(comment, Post, comment.post_id, "comments_count")
         return CustomResponse.success(message="Comment Deleted")
 
     def get_permissions(self):
-        permissions = []
+        permissions = [IsAuthenticatedOrGuestOptionalCustom()]
         if self.request.method != "GET":
             permissions = [
                 IsAuthenticatedCustom(),
@@ -718,12 +860,9 @@ class ReplyView(APIView):
         ),
     ]
 
-    async def get_object(self, slug):
-        reply = (
-            await Reply.objects.select_related("author", "author__avatar")
-            .annotate(reactions_count=Count("reactions"))
-            .aget_or_none(slug=slug)
-        )
+    async def get_object(self, slug, user=None):
+        replies = Reply.objects.select_related("author", "author__avatar")
+        reply = await with_user_reaction(replies, user).aget_or_none(slug=slug)
         if not reply:
             raise RequestError(
                 err_code=ErrorCode.NON_EXISTENT,
@@ -742,7 +881,7 @@ class ReplyView(APIView):
         parameters=common_param,
     )
     async def get(self, request, *args, **kwargs):
-        reply = await self.get_object(kwargs["slug"])
+        reply = await self.get_object(kwargs["slug"], request.user)
         serializer = self.serializer_class(reply)
         return CustomResponse.success(message="Reply Fetched", data=serializer.data)
 
@@ -766,7 +905,7 @@ class ReplyView(APIView):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         reply.text = serializer.validated_data["text"]
-        await reply.asave()
+        await reply.asave(update_fields=["text", "updated_at"])
         serializer = self.serializer_class(reply)
         return CustomResponse.success(message="Reply Updated", data=serializer.data)
 
@@ -790,23 +929,102 @@ class ReplyView(APIView):
             )
 
         # Remove Reply Notification
-        notification = await Notification.objects.aget_or_none(
-            sender=user, ntype="REPLY", reply_id=reply.id
-        )
-        if notification:
-            # Send to websocket and delete notification
-            await send_notification_in_socket(
-                request.is_secure(), request.get_host(), notification, status="DELETED"
-            )
-            await notification.adelete()
+        withdrawn = await withdraw_notification("REPLY", reply)
+        if withdrawn:
+            # Send to websocket
+            notification_id, status, receiver_ids = withdrawn
+            await publish_notification(notification_id, status, "REPLY", receiver_ids)
 
-        await reply.adelete()
+        await delete_and_count(reply, Comment, reply.comment_id, "replies_count")
         return CustomResponse.success(message="Reply Deleted")
 
     def get_permissions(self):
-        permissions = []
+        permissions = [IsAuthenticatedOrGuestOptionalCustom()]
         if self.request.method != "GET":
             permissions = [
                 IsAuthenticatedCustom(),
             ]
         return permissions
+
+
+# SEARCH
+
+
+class SearchView(APIView):
+    paginator_class = CustomPagination()
+    paginator_class.page_size = 20
+    search_models = {"POST": Post, "COMMENT": Comment, "REPLY": Reply}
+
+    def get_queryset(self, stype, q):
+        query = SearchQuery(q, search_type="websearch", config="english")
+        # The @@ match uses the GIN index, the headline is only built for returned rows.
+        # Headlines are HTML, so the text is escaped before the matches are highlighted
+        return (
+            self.search_models[stype]
+            .objects.filter(search_vector=query)
+            .select_related("author", "author__avatar")
+            .annotate(
+                # Double precision, so the rank round-trips exactly through cursors
+                rank=Cast(SearchRank(F("search_vector"), query), FloatField()),
+                headline=SearchHeadline(
+                    html_escaped("text"),
+                    query,
+                    config="english",
+                    start_sel="<b>",
+                    stop_sel="</b>",
+                ),
+            )
+        )
+
+    @extend_schema(
+        summary="Search Posts, Comments or Replies",
+        description="""
+            This endpoint retrieves the posts, comments or replies that best match a search, most relevant first
+            Each result's headline is an HTML escaped part of its text, with the matches in <b> tags
+        """,
+        tags=tags,
+        responses=SearchResponseSerializer,
+        parameters=[
+            OpenApiParameter(
+                name="q",
+                description="The search text. Supports quoted phrases, 'or' and -exclusions",
+                required=True,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="type",
+                description="What to search. Defaults to POST",
+                required=False,
+                type=str,
+                enum=[choice[0] for choice in SEARCH_TYPE_CHOICES],
+            ),
+            OpenApiParameter(
+                name="cursor",
+                description="Retrieve the next page of results with the next cursor from the response",
+                required=False,
+                type=str,
+            ),
+        ],
+    )
+    async def get(self, request):
+        q = request.GET.get("q", "").strip()
+        if not q:
+            raise RequestError(
+                err_code=ErrorCode.INVALID_ENTRY,
+                err_msg="Invalid Entry",
+                status_code=422,
+                data={"q": "Enter a search text"},
+            )
+        stype = request.GET.get("type", "POST").upper()
+        if stype not in self.search_models:
+            raise RequestError(
+                err_code=ErrorCode.INVALID_VALUE,
+                err_msg="Invalid 'type' value",
+                status_code=404,
+            )
+        results = self.get_queryset(stype, q)
+        paginated_data = await self.paginator_class.apaginate_queryset_by_score(
+            results, request, "rank"
+        )
+        serializer = SearchResponseDataSerializer(paginated_data)
+        return CustomResponse.success(message="Results fetched", data=serializer.data)
@@ -1,4 +1,4 @@
-import asyncio
+from asgiref.sync import async_to_sync
 from django.contrib import admin
 from django.http.request import HttpRequest
 
@@ -27,20 +27,11 @@ class NotificationAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         obj.from_admin_site = True
         obj.ntype = "ADMIN"
-        obj.host = request.get_host()
-        obj.secured = request.is_secure()
         super().save_model(request, obj, form, change)
 
     def delete_model(self, request: HttpRequest, obj: Notification) -> None:
         # Send socket notification
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        loop.run_until_complete(
-            send_notification_in_socket(
-                request.is_secure(), request.get_host(), obj, status="DELETED"
-            )
-        )
+        async_to_sync(send_notification_in_socket)(obj, status="DELETED", wait=True)
         super().delete_model(request, obj)
 
 
@@ -1,51 +1,36 @@
-from django.conf import settings
 from apps.accounts.models import User
 from apps.common.consumers import BaseConsumer
-from apps.common.error import ErrorCode
+from apps.profiles.utils import NOTIFICATIONS_BROADCAST_GROUP, notification_group
 import json
 
 
 class NotificationConsumer(BaseConsumer):
     async def connect(self):
         err = self.scope["error"]
+        self.notification_groups = []
         await self.accept()
 
         if err.get("message"):  # Check for auth errors
             await self.send_error_message(err)
             return await self.close(code=4001)
-        self.room_name = "notifications"
-        self.room_group_name = "notifications"
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 
-    async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-
-    async def receive(self, text_data):
+        # Join the user's own group and the ADMIN broadcast group
+        self.notification_groups.append(NOTIFICATIONS_BROADCAST_GROUP)
         user = self.scope["user"]
-        if user != settings.SOCKET_SECRET:
-            await self.send_error_message(
-                {
-                    "type": ErrorCode.NOT_ALLOWED,
-                    "message": "You're not allowed to send data",
-                }
-            )
-            return await self.close(code=1001)
-
-        data = json.loads(text_data)
+        if isinstance(user, User):
+            self.notification_groups.append(notification_group(user.id))
+        for group in self.notification_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
 
-        # Send notification data
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {"type": "notification_message", "notification_data": data},
-        )
+    async def disconnect(self, close_code):
+        for group in self.notification_groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
 
     async def notification_message(self, event):
-        notification_data = event["notification_data"]
-        user = self.scope["user"]
+        # Events only reach the groups of their receivers, so no lookup is needed
+        if isinstance(self.scope["user"], User):
+            await self.send(text_data=json.dumps(event["notification_data"]))
 
-        if isinstance(user, User) and (
-            notification_data["ntype"] == "ADMIN"
-            or await user.notifications.filter(id=notification_data["id"]).aexists()
-        ):
-            # Ensure that only receivers of the notification can read it.
-            await self.send(text_data=json.dumps(notification_data))
+    async def unread_count(self, event):
+        # Unread notifications and chat messages counts, sent to the user's group only
+        await self.send(text_data=json.dumps(event["data"]))
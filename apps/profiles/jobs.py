@@ -0,0 +1,19 @@
+from asgiref.sync import async_to_sync
+from apps.common.jobs import job
+from .models import Notification
+from .utils import send_notification_in_socket
+
+
+@job("publish_admin_notification")
+def publish_admin_notification(payload):
+    notification = Notification.objects.get_or_none(id=payload["notification_id"])
+    if notification:
+        async_to_sync(send_notification_in_socket)(notification, wait=True)
+
+
+@job("prune_notification_reads")
+def prune_notification_reads(payload):
+    # Single reads covered by the user's read mark are no longer needed
+    Notification.read_by.through.objects.filter(
+        user_id=payload["user_id"], notification__created_at__lte=payload["read_at"]
+    ).delete()
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("profiles", "0022_remove_notification_host_remove_notification_secured"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["created_at", "id"], name="notification_created_at_id_idx"
+            ),
+        ),
+        # Receivers lookup for a user's notifications (auto-created m2m table)
+        migrations.RunSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS notification_receivers_user_notification_idx "
+                "ON profiles_notification_receivers (user_id, notification_id);"
+            ),
+            reverse_sql=(
+                "DROP INDEX IF EXISTS notification_receivers_user_notification_idx;"
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.3 on 2026-10-17 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles", "0024_notification_read_mark"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("ntype", "ADMIN")),
+                fields=["created_at"],
+                name="notification_admin_idx",
+            ),
+        ),
+    ]
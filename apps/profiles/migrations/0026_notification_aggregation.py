@@ -0,0 +1,34 @@
+# Generated by Django 4.2.3 on 2026-10-17 23:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles", "0025_notification_admin_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="actors_count",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="group_key",
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="recent_actors",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        # Existing notifications have a single actor, their sender
+        migrations.RunSQL(
+            "UPDATE profiles_notification SET recent_actors = jsonb_build_array(sender_id::text) "
+            "WHERE sender_id IS NOT NULL",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.3 on 2026-10-17 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles", "0026_notification_aggregation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notificationreadmark",
+            name="unread_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="notificationreadmark",
+            name="read_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
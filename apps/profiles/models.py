@@ -1,4 +1,3 @@
-import asyncio
 from django.db import models
 from django.db.models import (
     Q,
@@ -9,11 +8,12 @@ from django.db.models import (
 from django.db.models.functions import Least, Greatest
 from apps.accounts.models import User
 
+from apps.common.jobs import enqueue
 from apps.common.models import BaseModel
 from apps.feed.models import Comment, Post, Reply
 from django.utils.translation import gettext_lazy as _
 
-from apps.profiles.utils import get_notification_message, send_notification_in_socket
+from apps.profiles.utils import get_notification_message
 from django.utils.safestring import mark_safe
 from django.db.models.signals import post_save
 
@@ -93,6 +93,11 @@ class Notification(BaseModel):
     )  # For replies and reactions
 
     text = models.CharField(max_length=100, null=True)  # For admin notifications only
+
+    # Aggregation: one row per type, target and time window (see apps.profiles.utils)
+    group_key = models.CharField(max_length=100, null=True, blank=True, unique=True)
+    actors_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)  # Latest first
     read_by = models.ManyToManyField(
         User, related_name="notifications_read", blank=True
     )
@@ -110,6 +115,16 @@ class Notification(BaseModel):
     # Set constraints
     class Meta:
         _space = "&ensp;&ensp;&nbsp;&nbsp;&nbsp;&nbsp;"
+        indexes = [
+            models.Index(
+                fields=["created_at", "id"], name="notification_created_at_id_idx"
+            ),
+            models.Index(
+                fields=["created_at"],
+                condition=Q(ntype="ADMIN"),
+                name="notification_admin_idx",
+            ),
+        ]
         constraints = [
             CheckConstraint(
                 check=(Q(post__isnull=False, comment=None, reply=None))
@@ -149,21 +164,28 @@ class Notification(BaseModel):
         # Validations later to ensure the read_by users are part of the receivers
 
 
-def set_receivers_m2m(sender, instance, created, *args, **kwargs):
-    if created and instance.ntype == "ADMIN":
-        instance.receivers.set(User.objects.all())
-        if hasattr(instance, "from_admin_site"):
-            # Send socket notification
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+def publish_admin_notification(sender, instance, created, *args, **kwargs):
+    # ADMIN notifications are broadcasts without receivers (see apps.profiles.utils.received_by)
+    if created and instance.ntype == "ADMIN" and hasattr(instance, "from_admin_site"):
+        # The socket notification is sent by the job worker
+        enqueue("publish_admin_notification", {"notification_id": str(instance.id)})
+
 
-            loop.run_until_complete(
-                send_notification_in_socket(
-                    instance.secured,
-                    instance.host,
-                    instance,
-                )
-            )
+post_save.connect(publish_admin_notification, sender=Notification)
 
 
-post_save.connect(set_receivers_m2m, sender=Notification)
+class NotificationReadMark(BaseModel):
+    """
+    Everything a user received up to `read_at` counts as read, so marking all
+    notifications as read is one write. Later notifications are read one by one (read_by).
+    Also keeps the user's count of unread notifications, ADMIN broadcasts aside.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name="notifications_read_mark"
+    )
+    read_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} ------ {self.read_at}"
@@ -85,6 +85,7 @@ class NotificationSerializer(serializers.Serializer):
     post_slug = serializers.CharField(allow_null=True, read_only=True)
     comment_slug = serializers.CharField(allow_null=True, read_only=True)
     reply_slug = serializers.CharField(allow_null=True, read_only=True)
+    actors_count = serializers.IntegerField(default=1, read_only=True)
     is_read = serializers.BooleanField(default=False, read_only=True)
     mark_all_as_read = serializers.BooleanField(write_only=True, default=False)
 
@@ -103,6 +104,10 @@ class NotificationSerializer(serializers.Serializer):
         return attrs
 
 
+class NotificationsUnreadCountSerializer(serializers.Serializer):
+    unread_count = serializers.IntegerField()
+
+
 # RESPONSE SERIALIZERS
 class ProfilesResponseDataSerializer(PaginatedResponseDataSerializer):
     users = ProfileSerializer(source="items", many=True)
@@ -126,3 +131,7 @@ class NotificationsResponseDataSerializer(PaginatedResponseDataSerializer):
 
 class NotificationsResponseSerializer(SuccessResponseSerializer):
     data = NotificationsResponseDataSerializer()
+
+
+class NotificationsUnreadCountResponseSerializer(SuccessResponseSerializer):
+    data = NotificationsUnreadCountSerializer()
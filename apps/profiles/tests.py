@@ -1,20 +1,27 @@
+from asgiref.sync import async_to_sync
 from rest_framework.test import APITestCase
 from unittest import mock
 from apps.accounts.models import User
+from apps.common.jobs import run_pending_jobs
+from apps.common.models import base36
 from apps.common.utils import TestUtil
 from apps.common.error import ErrorCode
+from apps.feed.models import Post
 from apps.profiles.models import Friend, Notification
+from apps.profiles.utils import read_notification
 from cities_light.models import City, Country, Region
 from django.utils.text import slugify
 import uuid
 
 
 class TestProfile(APITestCase):
+    profiles_url = "/api/v1/profiles/"
     cities_url = "/api/v1/profiles/cities/"
     profile_url = "/api/v1/profiles/profile/"
     friends_url = "/api/v1/profiles/friends/"
     friend_requests_url = "/api/v1/profiles/friends/requests/"
     notifications_url = "/api/v1/profiles/notifications/"
+    unread_count_url = "/api/v1/profiles/notifications/unread-counts/"
 
     maxDiff = None
 
@@ -23,6 +30,7 @@ class TestProfile(APITestCase):
         verified_user = TestUtil.verified_user()
         another_verified_user = TestUtil.another_verified_user()
         self.verified_user = verified_user
+        self.another_verified_user = another_verified_user
 
         # auth
         auth_token = TestUtil.auth_token(verified_user)
@@ -45,6 +53,26 @@ class TestProfile(APITestCase):
             requester=verified_user, requestee=another_verified_user, status="ACCEPTED"
         )
 
+    def test_search_users(self):
+        # Verify users are matched by name despite a typo
+        response = self.client.get(f"{self.profiles_url}?q=AnotherTset", **self.bearer)
+        self.assertEqual(response.status_code, 200)
+        users = response.json()["data"]["users"]
+        self.assertEqual(
+            [user["username"] for user in users],
+            [self.another_verified_user.username],
+        )
+
+        # Verify users are matched by username and the closest match comes first
+        new_user = TestUtil.new_user()
+        response = self.client.get(f"{self.profiles_url}?q=test-name")
+        users = response.json()["data"]["users"]
+        self.assertEqual(users[0]["username"], new_user.username)
+
+        # Verify unrelated searches find nobody
+        response = self.client.get(f"{self.profiles_url}?q=zzzz")
+        self.assertEqual(response.json()["data"]["users"], [])
+
     def test_retrieve_cities(self):
         city = self.city
 
@@ -135,7 +163,8 @@ class TestProfile(APITestCase):
                     "last_name": user_data["last_name"],
                     "username": slugify(
                         f"{user_data['first_name']} {user_data['last_name']}"
-                    ),
+                    )
+                    + f"-{base36(user.id)}",
                     "email": user.email,
                     "bio": user_data["bio"],
                     "avatar": user.get_avatar,
@@ -301,6 +330,7 @@ class TestProfile(APITestCase):
                             "post_slug": None,
                             "comment_slug": None,
                             "reply_slug": None,
+                            "actors_count": 1,
                             "is_read": False,
                         }
                     ],
@@ -308,6 +338,27 @@ class TestProfile(APITestCase):
             },
         )
 
+    def test_admin_notification_broadcast(self):
+        notification = Notification.objects.create(
+            ntype="ADMIN", text="A new update is coming!"
+        )
+
+        # Verify users get the broadcast without receiver rows, and can read it
+        self.assertEqual(notification.receivers.count(), 0)
+        response = self.client.get(self.notifications_url, **self.bearer)
+        items = response.json()["data"]["notifications"]
+        self.assertEqual([item["id"] for item in items], [str(notification.id)])
+        data = {"id": notification.id, "mark_all_as_read": False}
+        response = self.client.post(self.notifications_url, data=data, **self.bearer)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(notification.read_by.all()), [self.verified_user])
+
+        # Verify users who joined later don't get earlier broadcasts
+        new_user = TestUtil.new_user()
+        bearer = {"HTTP_AUTHORIZATION": f"Bearer {TestUtil.auth_token(new_user)}"}
+        response = self.client.get(self.notifications_url, **bearer)
+        self.assertEqual(response.json()["data"]["notifications"], [])
+
     def test_read_notification(self):
         notification = Notification.objects.create(
             ntype="ADMIN", text="A new update is coming!"
@@ -335,3 +386,88 @@ class TestProfile(APITestCase):
         self.assertEqual(
             response.json(), {"status": "success", "message": "Notification read"}
         )
+
+    def test_mark_all_notifications_as_read(self):
+        notifications = [
+            Notification.objects.create(ntype="ADMIN", text=f"Update {i}")
+            for i in range(3)
+        ]
+        for notification in notifications:
+            notification.receivers.add(self.verified_user)
+        notifications[0].read_by.add(self.verified_user)
+
+        # Verify every notification received so far is read after marking all
+        data = {"mark_all_as_read": True}
+        response = self.client.post(self.notifications_url, data=data, **self.bearer)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"status": "success", "message": "Notifications read"}
+        )
+        response = self.client.get(self.notifications_url, **self.bearer)
+        items = response.json()["data"]["notifications"]
+        self.assertEqual([item["is_read"] for item in items], [True, True, True])
+
+        # Verify the single reads covered by the mark are pruned
+        run_pending_jobs()
+        self.assertFalse(notifications[0].read_by.exists())
+
+        # Verify later notifications are unread until read on their own
+        notification = Notification.objects.create(ntype="ADMIN", text="Later")
+        notification.receivers.add(self.verified_user)
+        response = self.client.get(self.notifications_url, **self.bearer)
+        items = response.json()["data"]["notifications"]
+        self.assertEqual([item["is_read"] for item in items], [False, True, True, True])
+
+        data = {"id": notification.id, "mark_all_as_read": False}
+        self.client.post(self.notifications_url, data=data, **self.bearer)
+        response = self.client.get(self.notifications_url, **self.bearer)
+        self.assertTrue(response.json()["data"]["notifications"][0]["is_read"])
+
+    def test_unread_notifications_count(self):
+        post = Post.objects.create(author=self.verified_user, text="A post")
+
+        def unread_count():
+            response = self.client.get(self.unread_count_url, **self.bearer)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.json()["message"], "Unread notifications count fetched"
+            )
+            return response.json()["data"]["unread_count"]
+
+        self.assertEqual(unread_count(), 0)
+
+        # New notifications and ADMIN broadcasts are unread
+        response = self.client.post(
+            f"/api/v1/feed/reactions/POST/{post.slug}/",
+            data={"rtype": "LIKE"},
+            **self.other_user_bearer,
+        )
+        reaction_id = response.json()["data"]["id"]
+        comments_url = f"/api/v1/feed/posts/{post.slug}/comments/"
+        self.client.post(comments_url, data={"text": "One"}, **self.other_user_bearer)
+        Notification.objects.create(ntype="ADMIN", text="A new update is coming!")
+        self.assertEqual(unread_count(), 3)
+
+        # Reading a notification again doesn't count twice
+        notification = Notification.objects.get(ntype="COMMENT")
+        data = {"id": notification.id, "mark_all_as_read": False}
+        self.client.post(self.notifications_url, data=data, **self.bearer)
+        self.client.post(self.notifications_url, data=data, **self.bearer)
+        self.assertEqual(unread_count(), 2)
+        # Even by a concurrent read that saw it unread
+        async_to_sync(read_notification)(notification, self.verified_user.id)
+        self.assertEqual(unread_count(), 2)
+
+        # A read notification aggregating new activity is unread again
+        self.client.post(comments_url, data={"text": "Two"}, **self.other_user_bearer)
+        self.assertEqual(unread_count(), 3)
+
+        data = {"mark_all_as_read": True}
+        self.client.post(self.notifications_url, data=data, **self.bearer)
+        self.assertEqual(unread_count(), 0)
+
+        # Withdrawing a read notification leaves the count alone
+        self.client.delete(
+            f"/api/v1/feed/reactions/{reaction_id}/", **self.other_user_bearer
+        )
+        self.assertEqual(unread_count(), 0)
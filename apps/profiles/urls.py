@@ -12,6 +12,7 @@ urlpatterns = [
     path("friends/", views.FriendsView.as_view()),
     path("friends/requests/", views.FriendRequestsView.as_view()),
     path("notifications/", views.NotificationsView.as_view()),
+    path("notifications/unread-counts/", views.NotificationsUnreadCountView.as_view()),
 ]
 
 notification_socket_urlpatterns = [
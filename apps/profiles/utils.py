@@ -1,20 +1,42 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
-import json, os, websockets
+from django.db import connection, transaction
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from apps.common.socket_publisher import socket_publisher
+from datetime import datetime, timedelta, timezone as dt_timezone
+import json, os, uuid
 
 
 def get_notification_message(obj):
     """This function returns a notification message"""
     ntype = obj.ntype
-    message = f"{obj.sender.full_name} reacted to your post"
+    actors = obj.sender.full_name
+    others = obj.actors_count - 1
+    if others > 0:
+        actors = f"{actors} and {others} other{'s' if others > 1 else ''}"
+    message = f"{actors} reacted to your post"
     if ntype == "REACTION":
         if obj.comment_id:
-            message = f"{obj.sender.full_name} reacted to your comment"
+            message = f"{actors} reacted to your comment"
         elif obj.reply_id:
-            message = f"{obj.sender.full_name} reacted to your reply"
+            message = f"{actors} reacted to your reply"
     elif ntype == "COMMENT":
-        message = f"{obj.sender.full_name} commented on your post"
+        message = f"{actors} commented on your post"
     elif ntype == "REPLY":
-        message = f"{obj.sender.full_name} replied your comment"
+        message = f"{actors} replied your comment"
     return message
 
 
@@ -31,20 +53,356 @@ async def sort_notification_slugs(notification):
     return notification
 
 
+def received_by(user):
+    """
+    Filter for the notifications of a user: the ones they're a receiver of, plus
+    the ADMIN broadcasts since they joined, which have no receiver rows.
+    """
+    from apps.profiles.models import Notification
+
+    receiver_ids = Notification.receivers.through.objects.filter(
+        user_id=user.id
+    ).values("notification_id")
+    return Q(id__in=receiver_ids) | Q(ntype="ADMIN", created_at__gte=user.created_at)
+
+
+def is_read(user_id):
+    """
+    Whether a notification is read by the user: received before their read mark,
+    or read on its own since. Both subqueries run once per query, not per row.
+    """
+    from apps.profiles.models import Notification, NotificationReadMark
+
+    read_at = NotificationReadMark.objects.filter(user_id=user_id).values("read_at")
+    read_ids = Notification.read_by.through.objects.filter(user_id=user_id).values(
+        "notification_id"
+    )
+    return Case(
+        When(
+            Q(created_at__lte=Subquery(read_at[:1])) | Q(id__in=read_ids),
+            then=Value(True),
+        ),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+async def mark_notifications_read(user):
+    # One upsert of the user's read mark, however many notifications they have
+    from apps.profiles.models import NotificationReadMark
+
+    read_at = timezone.now()
+    await NotificationReadMark.objects.abulk_create(
+        [NotificationReadMark(user=user, read_at=read_at, unread_count=0)],
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["read_at", "unread_count", "updated_at"],
+    )
+    return read_at
+
+
+# Unread notification counts: maintained on the read mark, except for ADMIN broadcasts
+# which are counted at read time through their partial index
+@sync_to_async
+def read_notification(notification, user_id):
+    """
+    Reads a single notification, and takes it off the user's unread count
+    if this read was the one adding it, so concurrent reads only count once.
+    """
+    from apps.profiles.models import Notification, NotificationReadMark
+
+    with transaction.atomic():
+        _, created = Notification.read_by.through.objects.get_or_create(
+            notification_id=notification.id, user_id=user_id
+        )
+        if created and notification.ntype != "ADMIN":
+            NotificationReadMark.objects.filter(user_id=user_id).update(
+                unread_count=Greatest(F("unread_count") - 1, 0)
+            )
+
+
+async def unread_notifications_count(user_id):
+    from apps.accounts.models import User
+    from apps.profiles.models import Notification, NotificationReadMark
+
+    mark = await NotificationReadMark.objects.aget_or_none(user_id=user_id)
+    joined_at = User.objects.filter(id=user_id).values("created_at")
+    admin_unread = (
+        await Notification.objects.filter(
+            ntype="ADMIN", created_at__gte=Subquery(joined_at)
+        )
+        .annotate(is_read=is_read(user_id))
+        .filter(is_read=False)
+        .acount()
+    )
+    return (mark.unread_count if mark else 0) + admin_unread
+
+
+async def publish_unread_count(user_id):
+    # Queued pushes of a user's count are coalesced, so a burst sends the latest count
+    if os.environ.get("ENVIRONMENT") == "TESTING":
+        return
+    data = {
+        "status": "UNREAD_COUNT",
+        "unread_count": await unread_notifications_count(user_id),
+    }
+    await socket_publisher.publish(
+        notification_group(user_id),
+        {"type": "unread_count", "data": data},
+        key="unread_count",
+    )
+
+
+# Notification aggregation
+# Reactions to an object, comments on a post and replies to a comment made within the same
+# window share one notification row, holding the actors count and the latest actors.
+RECENT_ACTORS_LIMIT = 3
+
+
+class Aggregate:
+    """The notification row an activity (a reaction, comment or reply) is aggregated into."""
+
+    def __init__(self, ntype, obj):
+        from apps.feed.models import Comment, Reaction, Reply
+
+        self.ntype = ntype
+        self.obj = obj
+        if ntype == "REACTION":
+            target = obj.targeted_obj
+            # Points to the reacted object
+            self.field = f"{target.__class__.__name__.lower()}_id"
+            self.group_id = self.target_id = target.id
+            self.source = Reaction.objects.filter(**{self.field: target.id})
+            self.actor_field = "user_id"
+        elif ntype == "COMMENT":
+            # Points to the latest comment on the post
+            self.field, self.target_id = "comment_id", obj.id
+            self.group_id = obj.post_id
+            self.source = Comment.objects.filter(post_id=obj.post_id)
+            self.actor_field = "author_id"
+        else:
+            # Points to the latest reply to the comment
+            self.field, self.target_id = "reply_id", obj.id
+            self.group_id = obj.comment_id
+            self.source = Reply.objects.filter(comment_id=obj.comment_id)
+            self.actor_field = "author_id"
+        self.actor_id = getattr(obj, self.actor_field)
+
+        window = settings.NOTIFICATION_AGGREGATION_WINDOW
+        bucket = int(obj.created_at.timestamp()) // window
+        self.key = f"{ntype}:{self.group_id}:{bucket}"
+        self.starts_at = datetime.fromtimestamp(bucket * window, tz=dt_timezone.utc)
+        self.ends_at = self.starts_at + timedelta(seconds=window)
+
+
+@sync_to_async
+def aggregate_notification(ntype, obj, receiver_id):
+    """
+    Adds the activity to its notification with one statement: the row is inserted or
+    bumped (new actor first, count up, unread again), its receiver row added and the
+    receiver's unread count incremented, unless the notification was already unread.
+    Returns the notification id and whether it was created.
+    An actor that fell out of `recent_actors` is counted again, until the next withdrawal.
+    """
+    from apps.profiles.models import Notification, NotificationReadMark
+
+    aggregate = Aggregate(ntype, obj)
+    field = aggregate.field
+    table = Notification._meta.db_table
+    receivers_table = Notification.receivers.through._meta.db_table
+    read_by_table = Notification.read_by.through._meta.db_table
+    mark_table = NotificationReadMark._meta.db_table
+    sql = f"""
+        WITH unread AS (
+            SELECT n.id FROM {table} n
+            WHERE n.group_key = %(key)s
+            AND n.created_at > COALESCE(
+                (SELECT read_at FROM {mark_table} WHERE user_id = %(receiver)s),
+                '-infinity'
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM {read_by_table}
+                WHERE notification_id = n.id AND user_id = %(receiver)s
+            )
+        ), notification AS (
+            INSERT INTO {table} AS n (
+                id, created_at, updated_at, sender_id, ntype, {field},
+                group_key, actors_count, recent_actors
+            )
+            VALUES (
+                %(id)s, now(), now(), %(actor)s, %(ntype)s, %(target)s,
+                %(key)s, 1, %(actors)s::jsonb
+            )
+            ON CONFLICT (group_key) DO UPDATE SET
+                sender_id = EXCLUDED.sender_id,
+                {field} = EXCLUDED.{field},
+                actors_count = n.actors_count
+                    + (NOT n.recent_actors @> EXCLUDED.recent_actors)::int,
+                recent_actors = jsonb_path_query_array(
+                    EXCLUDED.recent_actors || (n.recent_actors - %(actor_str)s::text),
+                    '$[0 to {RECENT_ACTORS_LIMIT - 1}]'
+                ),
+                created_at = EXCLUDED.created_at,
+                updated_at = EXCLUDED.updated_at
+            RETURNING n.id, (n.xmax = 0) AS created
+        ), receiver AS (
+            INSERT INTO {receivers_table} (notification_id, user_id)
+            SELECT id, %(receiver)s FROM notification
+            ON CONFLICT DO NOTHING
+        ), reopened AS (
+            DELETE FROM {read_by_table}
+            WHERE notification_id IN (SELECT id FROM notification) AND user_id = %(receiver)s
+        ), counted AS (
+            INSERT INTO {mark_table} AS m (id, created_at, updated_at, user_id, unread_count)
+            SELECT %(mark_id)s, now(), now(), %(receiver)s, 1
+            WHERE NOT EXISTS (SELECT 1 FROM unread)
+            ON CONFLICT (user_id) DO UPDATE SET
+                unread_count = m.unread_count + 1, updated_at = EXCLUDED.updated_at
+        )
+        SELECT id, created FROM notification
+    """
+    params = {
+        "id": uuid.uuid4(),
+        "mark_id": uuid.uuid4(),
+        "actor": aggregate.actor_id,
+        "actor_str": str(aggregate.actor_id),
+        "actors": json.dumps([str(aggregate.actor_id)]),
+        "ntype": ntype,
+        "target": aggregate.target_id,
+        "key": aggregate.key,
+        "receiver": receiver_id,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+@sync_to_async
+def withdraw_notification(ntype, obj):
+    """
+    Removes an activity that's about to be deleted from its notification, recounting the
+    actors of the window from the source table. Deletes the notification if none is left.
+    Returns the notification id, status and receiver ids, or None if there's no notification.
+    """
+    from apps.profiles.models import Notification, NotificationReadMark
+
+    aggregate = Aggregate(ntype, obj)
+    with transaction.atomic():
+        notification = (
+            Notification.objects.select_for_update()
+            .filter(group_key=aggregate.key)
+            .first()
+        )
+        if not notification:
+            # Notifications from before aggregation, one per activity
+            notification = Notification.objects.filter(
+                group_key=None,
+                ntype=ntype,
+                sender_id=aggregate.actor_id,
+                **{aggregate.field: aggregate.target_id},
+            ).first()
+            if not notification:
+                return None
+        receiver_ids = list(notification.receivers.values_list("id", flat=True))
+        if aggregate.actor_id in receiver_ids:
+            # Activity on their own object, which was never notified
+            return None
+        actor_field = aggregate.actor_field
+        rows = (
+            aggregate.source.filter(
+                created_at__gte=aggregate.starts_at, created_at__lt=aggregate.ends_at
+            )
+            .exclude(id=obj.id)
+            .exclude(**{f"{actor_field}__in": receiver_ids})
+            .order_by("-created_at")
+        )
+        actors_count = 0
+        if notification.group_key:
+            actors_count = rows.aggregate(count=Count(actor_field, distinct=True))[
+                "count"
+            ]
+        if not actors_count:
+            # Off the counts of the receivers who hadn't read it, in one statement
+            read = Notification.read_by.through.objects.filter(
+                notification_id=notification.id, user_id=OuterRef("user_id")
+            )
+            NotificationReadMark.objects.filter(
+                Q(read_at=None) | Q(read_at__lt=notification.created_at),
+                user_id__in=receiver_ids,
+            ).exclude(Exists(read)).update(
+                unread_count=Greatest(F("unread_count") - 1, 0)
+            )
+            notification.delete()
+            return notification.id, "DELETED", receiver_ids
+
+        recent_actors, latest_id = [], None
+        for actor_id, row_id in rows.values_list(actor_field, "id").iterator():
+            latest_id = latest_id or row_id
+            if str(actor_id) not in recent_actors:
+                recent_actors.append(str(actor_id))
+                if len(recent_actors) == RECENT_ACTORS_LIMIT:
+                    break
+        notification.sender_id = recent_actors[0]
+        notification.actors_count = actors_count
+        notification.recent_actors = recent_actors
+        fields = ["sender", "actors_count", "recent_actors", "updated_at"]
+        if ntype != "REACTION":
+            setattr(notification, aggregate.field, latest_id)
+            fields.append(aggregate.field)
+        notification.save(update_fields=fields)
+    return notification.id, "UPDATED", receiver_ids
+
+
+async def publish_notification(notification_id, status, ntype, receiver_ids):
+    # Queued events of the same notification are coalesced, so a burst sends its latest state
+    if os.environ.get("ENVIRONMENT") == "TESTING":
+        return
+    from apps.profiles.models import Notification
+
+    if status == "DELETED":
+        notification = Notification(id=notification_id, ntype=ntype)
+    else:
+        notification = await Notification.objects.select_related(
+            "sender",
+            "sender__avatar",
+            "post",
+            "comment",
+            "comment__post",
+            "reply",
+            "reply__comment",
+            "reply__comment__post",
+        ).aget(id=notification_id)
+    await send_notification_in_socket(
+        notification, status, receiver_ids, key=str(notification_id)
+    )
+    for user_id in receiver_ids:
+        await publish_unread_count(user_id)
+
+
+# Notification socket groups: one per user, plus one for ADMIN broadcasts
+NOTIFICATIONS_BROADCAST_GROUP = "notifications_broadcast"
+
+
+def notification_group(user_id):
+    return f"notifications_{user_id}"
+
+
 # Send notification in websocket
 async def send_notification_in_socket(
-    secured: bool, host: str, notification: object, status: str = "CREATED"
+    notification: object,
+    status: str = "CREATED",
+    receiver_ids: list = None,
+    wait: bool = False,
+    key: str = None,
 ):
     if os.environ.get("ENVIRONMENT") == "TESTING":
         return
-    websocket_scheme = "wss://" if secured else "ws://"
-    uri = f"{websocket_scheme}{host}/api/v1/ws/notifications/"
     notification_data = {
         "id": str(notification.id),
         "status": status,
         "ntype": notification.ntype,
     }
-    if status == "CREATED":
+    if status in ("CREATED", "UPDATED"):
         notification = await sort_notification_slugs(notification)
 
         from apps.profiles.serializers import NotificationSerializer
@@ -53,10 +411,19 @@ async def send_notification_in_socket(
             "status": status
         }
 
-    headers = [
-        ("Authorization", settings.SOCKET_SECRET),
-    ]
-    async with websockets.connect(uri, extra_headers=headers) as websocket:
-        # Send a notification to the WebSocket server
-        await websocket.send(json.dumps(notification_data))
-        await websocket.close()
+    # Publish only to the groups of the receivers, through the channel layer
+    if notification.ntype == "ADMIN":
+        groups = [NOTIFICATIONS_BROADCAST_GROUP]
+    else:
+        if receiver_ids is None:
+            receiver_ids = [
+                id async for id in notification.receivers.values_list("id", flat=True)
+            ]
+        groups = [notification_group(id) for id in receiver_ids]
+
+    event = {"type": "notification_message", "notification_data": notification_data}
+    for group in groups:
+        if wait:
+            await socket_publisher.publish_now(group, event)
+        else:
+            await socket_publisher.publish(group, event, key=key)
@@ -6,10 +6,9 @@ from django.db.models import (
     Value,
     BooleanField,
     CharField,
-    Exists,
-    OuterRef,
 )
-from django.db.models.functions import Coalesce
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models.functions import Coalesce, Greatest
 from adrf.views import APIView
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from asgiref.sync import sync_to_async
@@ -21,13 +20,23 @@ from apps.common.responses import CustomResponse
 
 from apps.common.file_types import ALLOWED_IMAGE_TYPES
 from apps.accounts.models import User
+from apps.accounts.passwords import password_hasher
 from apps.common.utils import (
     IsAuthenticatedCustom,
     IsAuthenticatedOrGuestCustom,
     set_dict_attr,
 )
 from apps.common.paginators import CustomPagination
+from apps.common.jobs import aenqueue
 from apps.profiles.models import Friend, Notification
+from apps.profiles.utils import (
+    is_read,
+    mark_notifications_read,
+    publish_unread_count,
+    read_notification,
+    received_by,
+    unread_notifications_count,
+)
 from .serializers import (
     AcceptFriendRequestSerializer,
     CitiesResponseSerializer,
@@ -35,6 +44,8 @@ from .serializers import (
     NotificationSerializer,
     NotificationsResponseDataSerializer,
     NotificationsResponseSerializer,
+    NotificationsUnreadCountResponseSerializer,
+    NotificationsUnreadCountSerializer,
     ProfileCreateResponseDataSerializer,
     ProfileCreateResponseSerializer,
     ProfileResponseSerializer,
@@ -56,10 +67,30 @@ class ProfilesView(APIView):
     paginator_class.page_size = 15
     permission_classes = (IsAuthenticatedOrGuestCustom,)
 
-    async def get_queryset(self, current_user):
-        users = User.objects.select_related("avatar", "city")
+    search_fields = ("first_name", "last_name", "username")
+
+    def search(self, users, q):
+        # The % match uses the trigram indexes, then the closest names come first
+        match = Q()
+        for field in self.search_fields:
+            match |= Q(**{f"{field}__trigram_similar": q})
+        return (
+            users.filter(match)
+            .annotate(
+                similarity=Greatest(
+                    *(TrigramSimilarity(field, q) for field in self.search_fields)
+                )
+            )
+            .order_by("-similarity", "-created_at")
+        )
+
+    async def get_queryset(self, current_user, q=None):
+        users = User.objects.select_related("avatar", "city").order_by("-created_at")
         if current_user:
             users = users.exclude(id=current_user.id)
+        if q:
+            return self.search(users, q)
+        if current_user:
             if current_user.city:
                 # Order by the current user region or country
                 city = current_user.city
@@ -87,9 +118,7 @@ class ProfilesView(APIView):
                     )
                 )
                 # Order the users by the 'ordering_field' and "has_city" field in descending order
-                users = users.order_by("-has_city", "-ordering_field")
-
-        users = await sync_to_async(list)(users)
+                users = users.order_by("-has_city", "-ordering_field", "-created_at")
         return users
 
     @extend_schema(
@@ -103,13 +132,20 @@ class ProfilesView(APIView):
                 description="Retrieve a particular page of users. Defaults to 1",
                 required=False,
                 type=int,
-            )
+            ),
+            OpenApiParameter(
+                name="q",
+                description="Search users by first name, last name or username. Tolerates typos",
+                required=False,
+                type=str,
+            ),
         ],
     )
     async def get(self, request, *args, **kwargs):
         user = request.user
-        users = await self.get_queryset(user)
-        paginated_data = self.paginator_class.paginate_queryset(users, request)
+        q = request.GET.get("q", "").strip()
+        users = await self.get_queryset(user, q)
+        paginated_data = await self.paginator_class.apaginate_queryset(users, request)
         serializer = self.serializer_class(paginated_data)
         return CustomResponse.success(message="Users fetched", data=serializer.data)
 
@@ -261,7 +297,7 @@ class ProfileUpdateDeleteView(APIView):
         password = serializer.validated_data["password"]
 
         # Check if password is valid
-        if not user.check_password(password):
+        if not await password_hasher.check_password(user, password):
             raise RequestError(
                 err_code=ErrorCode.INVALID_CREDENTIALS,
                 err_msg="Invalid Entry",
@@ -292,8 +328,12 @@ class FriendsView(APIView):
                 When(requestee=user, then=F("requester")),
             )
         ).values_list("friend_id", flat=True)
-        users = User.objects.filter(id__in=friend_ids).select_related("avatar", "city")
-        return await sync_to_async(list)(users)
+        users = (
+            User.objects.filter(id__in=friend_ids)
+            .select_related("avatar", "city")
+            .order_by("-created_at")
+        )
+        return users
 
     @extend_schema(
         summary="Retrieve Friends",
@@ -312,7 +352,7 @@ class FriendsView(APIView):
     async def get(self, request):
         user = request.user
         friends = await self.get_queryset(user)
-        paginated_data = self.paginator_class.paginate_queryset(friends, request)
+        paginated_data = await self.paginator_class.apaginate_queryset(friends, request)
         serializer = self.serializer_class(paginated_data)
         return CustomResponse.success(message="Friends fetched", data=serializer.data)
 
@@ -342,12 +382,13 @@ class FriendRequestsView(APIView):
         friend_ids = Friend.objects.filter(
             requestee_id=user.id, status="PENDING"
         ).values_list("requester_id", flat=True)
-        friends = await sync_to_async(list)(
+        friends = (
             User.objects.filter(id__in=friend_ids)
             .annotate(city_name=F("city__name"))
             .select_related("avatar")
+            .order_by("-created_at")
         )
-        paginated_data = self.paginator_class.paginate_queryset(friends, request)
+        paginated_data = await self.paginator_class.apaginate_queryset(friends, request)
         serializer = self.serializer_class(paginated_data)
         return CustomResponse.success(
             message="Friend requests fetched", data=serializer.data
@@ -458,21 +499,20 @@ class NotificationsView(APIView):
     serializer_class = NotificationSerializer
     paginator_class = CustomPagination()
     paginator_class.page_size = 50
+    paginator_class.allow_cursor = True
     permission_classes = (IsAuthenticatedCustom,)
 
     async def get_queryset(self, current_user):
         current_user_id = current_user.id
         # Fetch current user notifications and set and post_slug, comment_slug is_read attribute for each notifications
-        notifications = await sync_to_async(list)(
-            Notification.objects.filter(receivers__id=current_user_id)
+        notifications = (
+            Notification.objects.filter(received_by(current_user))
             .select_related(
                 "sender",
                 "sender__avatar",
             )
             .annotate(
-                is_read=Exists(
-                    Notification.objects.filter(id=OuterRef("pk"), read_by=current_user)
-                ),
+                is_read=is_read(current_user_id),
                 post_slug=Coalesce(
                     Case(
                         When(post__isnull=False, then=F("post__slug")),
@@ -530,13 +570,23 @@ class NotificationsView(APIView):
                 """,
                 required=False,
                 type=int,
-            )
+            ),
+            OpenApiParameter(
+                name="cursor",
+                description="""
+                    Opt in to cursor pagination. Leave empty for the first page, then use the next or prev cursor from the response
+                """,
+                required=False,
+                type=str,
+            ),
         ],
     )
     async def get(self, request):
         user = request.user
         notifications = await self.get_queryset(user)
-        paginated_data = self.paginator_class.paginate_queryset(notifications, request)
+        paginated_data = await self.paginator_class.apaginate_queryset(
+            notifications, request
+        )
         serializer = NotificationsResponseDataSerializer(paginated_data)
         return CustomResponse.success(
             message="Notifications fetched", data=serializer.data
@@ -560,23 +610,49 @@ class NotificationsView(APIView):
 
         resp_message = "Notifications read"
         if mark_all_as_read:
-            # Mark all notifications as read
-            notifications = await sync_to_async(list)(
-                Notification.objects.filter(receivers__id=user.id)
+            # Move the user's read mark, then drop the single reads it now covers
+            read_at = await mark_notifications_read(user)
+            await aenqueue(
+                "prune_notification_reads",
+                {"user_id": str(user.id), "read_at": read_at.isoformat()},
             )
-            await user.notifications_read.aadd(*notifications)
         elif id:
             # Mark single notification as read
-            notification = await Notification.objects.filter(
-                receivers__id=user.id
-            ).aget_or_none(id=id)
+            notification = (
+                await Notification.objects.filter(received_by(user))
+                .annotate(is_read=is_read(user.id))
+                .aget_or_none(id=id)
+            )
             if not notification:
                 raise RequestError(
                     err_code=ErrorCode.NON_EXISTENT,
                     err_msg="User has no notification with that ID",
                     status_code=404,
                 )
-            await notification.read_by.aadd(user)
+            if not notification.is_read:
+                await read_notification(notification, user.id)
             resp_message = "Notification read"
 
+        await publish_unread_count(user.id)
         return CustomResponse.success(message=resp_message)
+
+
+class NotificationsUnreadCountView(APIView):
+    permission_classes = (IsAuthenticatedCustom,)
+
+    @extend_schema(
+        summary="Retrieve Auth User Unread Notifications Count",
+        description="""
+            This endpoint retrieves the number of unread notifications of the auth user, for badges.
+            The count is also pushed to the notifications socket whenever it changes:
+                {"status": "UNREAD_COUNT", "unread_count": 3}
+        """,
+        tags=tags,
+        responses=NotificationsUnreadCountResponseSerializer,
+    )
+    async def get(self, request):
+        unread_count = await unread_notifications_count(request.user.id)
+        serializer = NotificationsUnreadCountSerializer({"unread_count": unread_count})
+        return CustomResponse.success(
+            message="Unread notifications count fetched", data=serializer.data
+        )
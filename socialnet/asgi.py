@@ -18,18 +18,33 @@ os.environ.setdefault(
 
 django_asgi_app = get_asgi_application()
 
+from apps.chat.receipts import receipts_buffer
 from apps.chat.urls import chatsocket_urlpatterns
 from apps.profiles.urls import notification_socket_urlpatterns
 from apps.common.socket_auth import SocketAuthMiddleware
 
 socket_urlpatterns = chatsocket_urlpatterns + notification_socket_urlpatterns
 
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Buffered chat receipts are written before the server exits
+            await receipts_buffer.flush()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
 # AllowedHostsOriginValidator
 application = ProtocolTypeRouter(
     {
         "http": django_asgi_app,
         # Just HTTP for now. (We can add other protocols later.)
         "websocket": SocketAuthMiddleware(URLRouter(socket_urlpatterns)),
+        "lifespan": lifespan,
     }
 )
 
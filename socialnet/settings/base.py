@@ -40,6 +40,7 @@ DJANGO_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sites",
+    "django.contrib.postgres",
 ]
 
 SITE_ID = 1
@@ -108,6 +109,9 @@ SPECTACULAR_SETTINGS = {
                 URL: wss://{host}/api/v1/ws/notifications/
                 * Requires JWT authorization, so pass in the Bearer Token Authorization header.
                 * You can only read and not send notification messages into this socket.
+                * Unread counts are pushed here too whenever they change:
+                    * {"status": "UNREAD_COUNT", "unread_count": 3} - Unread notifications
+                    * {"status": "UNREAD_COUNT", "chat_id": "fe4e0235-80fc-4c94-b15e-3da63226f8ab", "unread_count": 3} - Unread messages of a chat
             Chats:
                 URL: wss://{host}/api/v1/ws/chats/{id}/
                 * Requires JWT authorization, so pass in the Bearer Token Authorization header.
@@ -117,6 +121,9 @@ SPECTACULAR_SETTINGS = {
                 * Fields when sending message through the socket: e.g {"status": "CREATED", "id": "fe4e0235-80fc-4c94-b15e-3da63226f8ab"}
                     * status - This must be either CREATED or UPDATED (string type)
                     * id - This is the ID of the message (uuid type)
+                * Send read and delivered receipts the same way: e.g {"status": "READ", "id": "fe4e0235-80fc-4c94-b15e-3da63226f8ab"}
+                    * status - READ or DELIVERED (a read message is delivered too)
+                    * Receipts are written shortly after, then members get {"status": "RECEIPT", "username": ..., "last_read_message_id": ..., "last_delivered_message_id": ...}
     """,
     "VERSION": "1.0.0",
     "SERVE_INCLUDE_SCHEMA": False,
@@ -178,12 +185,23 @@ CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [(config("REDIS_URL"))],
+            "hosts": [config("REDIS_URL")],
             "symmetric_encryption_keys": [SECRET_KEY],
         },
     },
 }
 
+# The "auth" cache holds the revoked access token IDs of stateless JWTs and the versions of cached
+# users (see apps.accounts.auth), it must be shared by every process
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "auth": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": config("AUTH_REDIS_URL", default=config("REDIS_URL")),
+        "KEY_PREFIX": "auth",
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -346,6 +364,16 @@ JAZZMIN_SETTINGS = {
 EMAIL_OTP_EXPIRE_SECONDS = config("EMAIL_OTP_EXPIRE_SECONDS")
 ACCESS_TOKEN_EXPIRE_MINUTES = config("ACCESS_TOKEN_EXPIRE_MINUTES")
 REFRESH_TOKEN_EXPIRE_MINUTES = config("REFRESH_TOKEN_EXPIRE_MINUTES")
+# Authenticated users are cached per process, and reloaded once changed in any (see apps.accounts.auth)
+AUTH_USER_CACHE_SECONDS = config("AUTH_USER_CACHE_SECONDS", default=60, cast=int)
+# Verify access tokens by signature and a denylist of revoked token IDs instead of the token table,
+# on cache misses
+AUTH_STATELESS_JWT = config("AUTH_STATELESS_JWT", default=False, cast=bool)
+# Password hashing runs on its own thread pool, excess requests get a 503 (see apps.accounts.passwords)
+PASSWORD_HASHER_WORKERS = config("PASSWORD_HASHER_WORKERS", default=4, cast=int)
+PASSWORD_HASHER_MAX_PENDING = config(
+    "PASSWORD_HASHER_MAX_PENDING", default=64, cast=int
+)
 FIRST_SUPERUSER_EMAIL = config("FIRST_SUPERUSER_EMAIL")
 FIRST_SUPERUSER_PASSWORD = config("FIRST_SUPERUSER_PASSWORD")
 FIRST_CLIENT_EMAIL = config("FIRST_CLIENT_EMAIL")
@@ -355,6 +383,34 @@ CLOUDINARY_API_KEY = config("CLOUDINARY_API_KEY")
 CLOUDINARY_API_SECRET = config("CLOUDINARY_API_SECRET")
 SOCKET_SECRET = config("SOCKET_SECRET")
 
+# Home timelines: posts are pushed to friends by the job queue, posts of authors with more friends
+# are read from their posts instead
+TIMELINE_FANOUT_MAX_FRIENDS = config(
+    "TIMELINE_FANOUT_MAX_FRIENDS", default=5000, cast=int
+)
+TIMELINE_SIZE = config("TIMELINE_SIZE", default=800, cast=int)
+
+# Reactions, comments and replies on the same object within this many seconds share one notification
+NOTIFICATION_AGGREGATION_WINDOW = config(
+    "NOTIFICATION_AGGREGATION_WINDOW", default=86400, cast=int
+)
+
+# Read and delivered receipts from chat sockets are written at most once per member in this many seconds
+CHAT_RECEIPTS_DELAY = config("CHAT_RECEIPTS_DELAY", default=2, cast=float)
+
+# Delta sync: tokens hold back changes newer than SYNC_LAG_SECONDS, as they may commit out of order,
+# and expire with the changes pruned after SYNC_RETENTION_DAYS
+SYNC_PAGE_SIZE = config("SYNC_PAGE_SIZE", default=500, cast=int)
+SYNC_LAG_SECONDS = config("SYNC_LAG_SECONDS", default=5, cast=int)
+SYNC_RETENTION_DAYS = config("SYNC_RETENTION_DAYS", default=30, cast=int)
+
+# Background jobs (see apps.common.jobs), failed jobs are retried after 30s, 60s, 120s...
+# and the jobs of a worker that died are run again once their lease is over
+JOBS_BATCH_SIZE = config("JOBS_BATCH_SIZE", default=50, cast=int)
+JOBS_MAX_ATTEMPTS = config("JOBS_MAX_ATTEMPTS", default=5, cast=int)
+JOBS_BACKOFF_SECONDS = config("JOBS_BACKOFF_SECONDS", default=30, cast=int)
+JOBS_LEASE_SECONDS = config("JOBS_LEASE_SECONDS", default=300, cast=int)
+
 # TODO
 # You can set a file limit to your cloudinary so that the presigned data can only accept a particular file size range to upload image. You can also add file type validations
 # Only create notifications for recent comments and replies after 1 hour